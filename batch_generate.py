@@ -0,0 +1,266 @@
+"""
+توليد دفعة من ملف JSONL مباشرة عبر ImageGenerator و ImageSaver دون المرور بالـ API
+
+الاستخدام:
+    python batch_generate.py prompts.jsonl [--results results.jsonl] [--concurrency 4]
+
+كل سطر في الملف طلب توليد بحقول ImageRequest نفسها (prompt إلزامي). يُحفظ التقدم
+في ملف جانبي (checkpoint) بعد كل عنصر، فإعادة تشغيل الأمر نفسه تكمل من حيث توقف
+وتعيد محاولة الأسطر التي فشل توليدها أو حفظها فقط.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from image_generator import ImageGenerator
+from utils.config import Config
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.encoders import OutputEncoder
+from utils.save_image import ImageSaver
+from utils.schemas import ImageRequest
+from utils.thumbnails import ThumbnailCache
+from utils.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+REQUEST_FIELDS = (
+    "negative_prompt", "width", "height", "num_inference_steps",
+    "guidance_scale", "seed", "model"
+)
+
+class BatchCheckpoint:
+    """
+    تقدم الدفعة: أول سطر غير مكتمل (watermark) والأسطر المكتملة بعده
+
+    العناصر تكتمل بغير ترتيبها مع التزامن، فلا يكفي حفظ رقم آخر سطر فقط.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done_above: set = set()
+
+    def load(self) -> "BatchCheckpoint":
+        """تحميل التقدم السابق إن وُجد"""
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.watermark = data.get("watermark", 0)
+            self.done_above = set(data.get("done_above", []))
+        return self
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done_above
+
+    def mark_done(self, index: int):
+        """تسجيل اكتمال سطر وتقديم watermark فوق الأسطر المتصلة"""
+        self.done_above.add(index)
+        while self.watermark in self.done_above:
+            self.done_above.discard(self.watermark)
+            self.watermark += 1
+
+    def save(self):
+        """كتابة ذرية (ملف مؤقت ثم استبدال)"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"watermark": self.watermark, "done_above": sorted(self.done_above)}, f)
+        os.replace(temp_path, self.path)
+
+def read_requests(input_path: str) -> Iterator[Tuple[int, Any]]:
+    """
+    قراءة الملف سطراً سطراً دون تحميله كاملاً؛ السطر الفارغ يُعاد None والتالف يُعاد كخطأ
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                yield index, None
+                continue
+            try:
+                yield index, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield index, ValueError(f"سطر JSON غير صالح: {str(e)}")
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """النسبة المئوية من قائمة قيم"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def process_item(
+    generator: ImageGenerator,
+    saver: ImageSaver,
+    config: Config,
+    index: int,
+    item: Any
+) -> Dict[str, Any]:
+    """
+    توليد وحفظ عنصر واحد وإرجاع سطر النتيجة
+
+    retryable في النتيجة الفاشلة يميز أخطاء التوليد والحفظ (يعاد تنفيذها عند الاستئناف)
+    عن أخطاء السطر نفسه كـ JSON التالف والحقول غير الصالحة (لن تنجح أبداً).
+    """
+    started_at = time.monotonic()
+    result = {"line": index, "success": False}
+
+    try:
+        if isinstance(item, Exception):
+            raise item
+        if not isinstance(item, dict):
+            raise ValueError("كل سطر يجب أن يكون كائن JSON")
+        # التحقق بنموذج الـ API نفسه حتى تتطابق الحقول والأنواع مع /generate
+        request = ImageRequest(**item)
+        if not request.prompt.strip():
+            raise ValueError("الحقل prompt مطلوب")
+
+        encoder = saver.encoder.with_overrides(
+            image_format=request.output_format,
+            quality=request.output_quality,
+            lossless=request.output_lossless,
+            effort=request.output_effort
+        )
+    except ValueError as e:
+        result.update({"error": str(e), "retryable": False})
+        result["latency_ms"] = round((time.monotonic() - started_at) * 1000, 1)
+        return result
+
+    try:
+        params = {key: getattr(request, key) for key in REQUEST_FIELDS if getattr(request, key) is not None}
+        deadline = Deadline(config.timeout_seconds)
+
+        pipeline = await generator.generate_image(request.prompt, deadline=deadline, return_pipeline=True, **params)
+        if not pipeline:
+            raise RuntimeError("فشل في توليد الصورة")
+
+        image_id = str(uuid.uuid4())
+        served_model = pipeline.model or request.model
+        filename = await saver.save_image(
+            image_data=pipeline,
+            prompt=request.prompt,
+            image_id=image_id,
+            deadline=deadline,
+            model=served_model,
+            encoder=encoder
+        )
+        if not filename:
+            raise RuntimeError("فشل في حفظ الصورة")
+
+        result.update({
+            "success": True,
+            "image_id": image_id,
+            "filename": filename,
+            "prompt": request.prompt,
+            "model": served_model
+        })
+
+    except DeadlineExceeded as e:
+        result.update({"error": f"انتهت المهلة عند الخطوة: {e.step}", "retryable": True})
+    except Exception as e:
+        result.update({"error": str(e), "retryable": True})
+
+    result["latency_ms"] = round((time.monotonic() - started_at) * 1000, 1)
+    return result
+
+async def run_batch(
+    input_path: str,
+    results_path: str,
+    checkpoint_path: str,
+    concurrency: int,
+    config: Config
+) -> Dict[str, Any]:
+    """
+    تشغيل الدفعة وإرجاع ملخص الإنتاجية وزمن الاستجابة
+    """
+    checkpoint = BatchCheckpoint(checkpoint_path).load()
+    worker_pool = WorkerPool.from_config(config)
+    generator = ImageGenerator(config, worker_pool=worker_pool)
+    saver = ImageSaver(
+        output_dir=config.output_dir,
+        worker_pool=worker_pool,
+        encoder=OutputEncoder.from_config(config),
+        thumbnails=ThumbnailCache.from_config(config, worker_pool)
+    )
+
+    pending = read_requests(input_path)
+    latencies: List[float] = []
+    counters = {"completed": 0, "failed": 0, "skipped": 0}
+    started_at = time.monotonic()
+
+    await generator.start()
+
+    with open(results_path, 'a', encoding='utf-8') as results_file:
+        async def worker():
+            # العمال يتشاركون المكرر نفسه فلا يُقرأ من الملف إلا ما يمكن تنفيذه
+            for index, item in pending:
+                if checkpoint.is_done(index):
+                    counters["skipped"] += 1
+                    continue
+                if item is None:
+                    # الأسطر الفارغة تُسجل مكتملة حتى لا توقف تقدم watermark
+                    checkpoint.mark_done(index)
+                    continue
+
+                result = await process_item(generator, saver, config, index, item)
+                counters["completed" if result["success"] else "failed"] += 1
+                latencies.append(result["latency_ms"])
+
+                # النتيجة أولاً ثم التقدم، حتى لا يُفقد سطر نتيجة عند الإيقاف
+                results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                results_file.flush()
+                if not result.get("retryable"):
+                    # فشل التوليد العابر لا يُسجل مكتملاً فيعيد الاستئناف محاولته
+                    checkpoint.mark_done(index)
+                    checkpoint.save()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        finally:
+            await generator.close()
+            worker_pool.shutdown()
+            saver.close()
+
+    elapsed = time.monotonic() - started_at
+    processed = counters["completed"] + counters["failed"]
+    return {
+        **counters,
+        "processed": processed,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="توليد دفعة صور من ملف JSONL مع إمكانية الاستئناف")
+    parser.add_argument("input", help="ملف JSONL بطلب توليد في كل سطر")
+    parser.add_argument("--results", help="ملف النتائج JSONL (افتراضياً <input>.results.jsonl)")
+    parser.add_argument("--checkpoint", help="ملف التقدم (افتراضياً <input>.checkpoint.json)")
+    parser.add_argument("--concurrency", type=int, help="عدد العناصر المتزامنة (افتراضياً batch_concurrency)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = Config()
+    base = os.path.splitext(args.input)[0]
+
+    summary = asyncio.run(run_batch(
+        input_path=args.input,
+        results_path=args.results or f"{base}.results.jsonl",
+        checkpoint_path=args.checkpoint or f"{base}.checkpoint.json",
+        concurrency=args.concurrency or config.batch_concurrency,
+        config=config
+    ))
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(0 if summary["failed"] == 0 else 1)
+
+if __name__ == "__main__":
+    main()
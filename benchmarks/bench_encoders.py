@@ -0,0 +1,81 @@
+"""
+مصفوفة قياس لصيغ الإخراج: حجم الملف وزمن الترميز لكل صيغة ومعاملاتها
+
+الاستخدام:
+    python benchmarks/bench_encoders.py [--size 1024] [--iterations 5]
+
+الصورة المرجعية تدرج لوني مع ضوضاء خفيفة حتى تقارب مخرجات النموذج، لأن
+الضوضاء الخالصة أو الألوان المسطحة تعطي نتائج مضللة للضغط.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from utils.encoders import OutputEncoder, is_supported
+
+MATRIX = [
+    ("png", {"effort": 1}),
+    ("png", {"effort": 6}),
+    ("png", {"effort": 9}),
+    ("jpeg", {"quality": 85}),
+    ("jpeg", {"quality": 95}),
+    ("jpeg", {"quality": 90, "effort": 0}),
+    ("webp", {"quality": 80}),
+    ("webp", {"quality": 90, "effort": 9}),
+    ("webp", {"lossless": True, "effort": 3}),
+    ("avif", {"quality": 60}),
+    ("avif", {"quality": 80, "effort": 3}),
+]
+
+def make_source_image(size: int) -> Image.Image:
+    """تدرج لوني مع ضوضاء خفيفة"""
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 24)
+    return Image.merge('RGB', (gradient, noise, gradient.rotate(90)))
+
+def measure(image: Image.Image, encoder: OutputEncoder, iterations: int):
+    """متوسط زمن الترميز بالميلي ثانية وحجم الناتج بالبايت"""
+    params = encoder.save_params()
+    prepared = encoder.prepare(image)
+    size = 0
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        buffer = io.BytesIO()
+        prepared.save(buffer, format=encoder.pil_format, **params)
+        size = buffer.tell()
+    return (time.perf_counter() - started_at) * 1000 / iterations, size
+
+def main():
+    parser = argparse.ArgumentParser(description="حجم الملف وزمن الترميز لكل صيغة إخراج")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    image = make_source_image(args.size)
+    rows = []
+    for image_format, options in MATRIX:
+        if not is_supported(image_format):
+            rows.append((image_format, "(غير مدعوم في Pillow المثبت)", None, None))
+            continue
+        encoder = OutputEncoder(image_format=image_format, **options)
+        label = ", ".join(f"{key}={value}" for key, value in encoder.save_params().items())
+        rows.append((image_format, label, *measure(image, encoder, args.iterations)))
+
+    # المرجع هو الإعداد الافتراضي (PNG بمستوى ضغط 6)
+    baseline = next(size for image_format, label, _, size in rows if label == "compress_level=6")
+
+    print(f"{'format':<8} {'options':<48} {'encode ms':>10} {'KB/img':>10} {'vs png-6':>9}")
+    for image_format, label, encode_ms, size in rows:
+        if size is None:
+            print(f"{image_format:<8} {label:<48}")
+            continue
+        print(f"{image_format:<8} {label:<48} {encode_ms:>10.1f} {size / 1024:>10.1f} {size / baseline:>8.2f}x")
+
+if __name__ == "__main__":
+    main()
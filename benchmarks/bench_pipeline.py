@@ -0,0 +1,111 @@
+"""
+قياس تكلفة معالجة الصورة الواحدة: المسار القديم (فك ترميز مزدوج ونسخ وإعادة قراءة الملف)
+مقابل ImagePipeline (فك ترميز واحد و hash من المخزن في الذاكرة)
+
+الاستخدام:
+    python benchmarks/bench_pipeline.py [--size 1024] [--iterations 20]
+
+كل مسار يعمل في عملية مستقلة حتى تكون قيمة ذروة الذاكرة (ru_maxrss) خاصة به.
+"""
+import argparse
+import hashlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.image_pipeline import ImagePipeline
+from utils.save_image import _render_image_file
+
+def make_source_image(size: int) -> bytes:
+    """صورة PNG بمحتوى عشوائي تقارب حجم مخرجات النموذج"""
+    image = Image.frombytes('RGB', (size, size), os.urandom(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def legacy_path(image_data: bytes, filepath: str, prompt: str):
+    """المسار السابق كما كان في ImageGenerator و ImageSaver"""
+    # _validate_image
+    Image.open(io.BytesIO(image_data)).size
+
+    # save_image
+    image = Image.open(io.BytesIO(image_data))
+    watermarked = image.copy()
+    layer = Image.new('RGBA', watermarked.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    font = ImageFont.load_default()
+    text = "Generated by Prompt2Image"
+    text_width = draw.textlength(text, font=font)
+    x = watermarked.width - text_width - 10
+    y = watermarked.height - 30
+    draw.rectangle([x - 5, y - 5, x + text_width + 5, y + 25], fill=(0, 0, 0, 128))
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, 200))
+    watermarked = Image.alpha_composite(watermarked.convert('RGBA'), layer).convert('RGB')
+    watermarked.save(filepath, format='PNG', quality=95)
+
+    # _calculate_file_hash
+    with open(filepath, 'rb') as f:
+        hashlib.md5(f.read()).hexdigest()
+
+def pipeline_path(image_data: bytes, filepath: str, prompt: str):
+    """المسار الحالي عبر ImagePipeline"""
+    pipeline = ImagePipeline(image_data)
+    pipeline.probe()
+    _render_image_file(pipeline, filepath, True, prompt)
+
+VARIANTS = {
+    "legacy": legacy_path,
+    "pipeline": pipeline_path
+}
+
+def run_variant(name: str, size: int, iterations: int):
+    """تشغيل مسار واحد وطباعة النتائج بصيغة سطر واحد"""
+    image_data = make_source_image(size)
+    func = VARIANTS[name]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "bench.png")
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(iterations):
+            func(image_data, filepath, "benchmark prompt")
+        cpu_ms = (time.process_time() - cpu_start) * 1000 / iterations
+        wall_ms = (time.perf_counter() - wall_start) * 1000 / iterations
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"{name},{size},{cpu_ms:.1f},{wall_ms:.1f},{peak_rss / 1024:.1f},{(peak_rss - baseline_rss) / 1024:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس ذروة الذاكرة ووقت المعالج لكل صورة")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--variant", choices=list(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.size, args.iterations)
+        return
+
+    print(f"{'variant':<10} {'size':>6} {'cpu ms/img':>11} {'wall ms/img':>12} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    for name in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--variant", name,
+             "--size", str(args.size), "--iterations", str(args.iterations)],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        variant, size, cpu_ms, wall_ms, peak_rss, growth = output.split(",")
+        print(f"{variant:<10} {size:>6} {cpu_ms:>11} {wall_ms:>12} {peak_rss:>12} {growth:>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+قياس تكلفة العلامة المائية: المسار القديم (طبقة شفافة بحجم الصورة ودمج كامل الإطار)
+مقابل البلاطة المخزنة ودمج منطقة الزاوية فقط
+
+الاستخدام:
+    python benchmarks/bench_watermark.py [--sizes 512 1024 2048] [--iterations 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.save_image import ImageSaver
+
+def legacy_watermark(image: Image.Image, prompt: str) -> Image.Image:
+    """المسار السابق كما كان في ImageSaver._add_watermark"""
+    watermarked = image if image.mode == 'RGBA' else image.convert('RGBA')
+    layer = Image.new('RGBA', watermarked.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    try:
+        font = ImageFont.truetype("arial.ttf", 16)
+    except OSError:
+        font = ImageFont.load_default()
+    text = "Generated by Prompt2Image"
+    text_width = draw.textlength(text, font=font)
+    x = watermarked.width - text_width - 10
+    y = watermarked.height - 30
+    draw.rectangle([x - 5, y - 5, x + text_width + 5, y + 25], fill=(0, 0, 0, 128))
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, 200))
+    watermarked.alpha_composite(layer)
+    return watermarked.convert('RGB')
+
+VARIANTS = {
+    "legacy": legacy_watermark,
+    "tile": ImageSaver._add_watermark
+}
+
+def measure(func, size: int, iterations: int) -> float:
+    """متوسط زمن العلامة المائية بالميلي ثانية (نسخة جديدة من الصورة لكل تكرار)"""
+    source = Image.frombytes('RGB', (size, size), os.urandom(size * size * 3))
+    func(source.copy(), "warmup")
+
+    total = 0.0
+    for _ in range(iterations):
+        image = source.copy()
+        started_at = time.perf_counter()
+        func(image, "benchmark prompt")
+        total += time.perf_counter() - started_at
+    return total * 1000 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس زمن العلامة المائية حسب حجم الصورة")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} " + " ".join(f"{name + ' ms':>10}" for name in VARIANTS) + f" {'speedup':>8}")
+    for size in args.sizes:
+        timings = {name: measure(func, size, args.iterations) for name, func in VARIANTS.items()}
+        speedup = timings["legacy"] / timings["tile"] if timings["tile"] else float("inf")
+        print(f"{size:>6} " + " ".join(f"{timings[name]:>10.2f}" for name in VARIANTS) + f" {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,34 @@
 import asyncio
 import aiohttp
-import io
 import logging
-from typing import Optional, Dict, Any
-from PIL import Image
+from typing import Optional, Dict, Any, Tuple, Union, List, AsyncIterator
 import time
 import json
 
+from utils.http_client import HTTPClientPool
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.result_cache import ResultCache
+from utils.worker_pool import WorkerPool, WorkerPoolFull
+from utils.image_pipeline import ImagePipeline
+from utils.progress import ProgressCallback, report
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.adaptive_limiter import AdaptiveLimiter
+from utils.circuit_breaker import CircuitBreaker, AllBackendsOpen
+from utils.hedging import HedgePolicy
+from utils.retry import RetryPolicy, UpstreamRejected
+from utils.keep_warm import ModelHealth
+from utils.backends import create_backend
+
 logger = logging.getLogger(__name__)
 
+def _probe_pipeline(pipeline: ImagePipeline) -> Tuple[Tuple[int, int], Optional[str]]:
+    """
+    قراءة ترويسة الصورة فقط (تعمل داخل مجمع المعالجة)
+    """
+    return pipeline.probe()
+
 class ImageGenerator:
-    def __init__(self, config):
+    def __init__(self, config, worker_pool: Optional[WorkerPool] = None):
         self.config = config
         self.api_url = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
         self.headers = {
@@ -18,6 +36,33 @@ class ImageGenerator:
             "Content-Type": "application/json",
         }
         
+        # جلسة HTTP مشتركة لإعادة استخدام الاتصالات
+        self.http_client = HTTPClientPool.from_config(config)
+        
+        # خلفية التوليد (HuggingFace أو نسخ HTTP مستضافة ذاتياً أو خلفية محلية للاختبار)
+        self.backend = create_backend(config, self.http_client)
+        
+        # كاش النتائج للطلبات ذات seed محدد
+        self.result_cache = ResultCache(
+            cache_dir=config.result_cache_dir,
+            max_entries=config.result_cache_max_entries,
+            max_memory_mb=config.result_cache_max_memory_mb,
+            enable_disk=config.result_cache_disk,
+            max_disk_mb=config.result_cache_max_disk_mb
+        )
+        
+        # مجمع المعالجة لفك ترميز الصور خارج حلقة الأحداث
+        self.worker_pool = worker_pool or WorkerPool.from_config(config)
+        
+        # حد تزامن تكيفي لكل نموذج يتبع ما تتحمله خدمة التوليد فعلياً
+        self.limiter = AdaptiveLimiter.from_config(config)
+        
+        # حد التزامن وطابور الانتظار لكل نموذج أمام خدمة التوليد
+        self.admission = AdmissionController.from_config(
+            config,
+            limit_provider=self.limiter.limit if config.adaptive_concurrency else None
+        )
+        
         # نماذج متاحة
         self.models = {
             "stable-diffusion-xl": "stabilityai/stable-diffusion-xl-base-1.0",
@@ -27,6 +72,19 @@ class ImageGenerator:
             "realistic": "runwayml/stable-diffusion-v1-5"
         }
         
+        # حالة كل نموذج (دافئ أو بارد) وآخر زمن استجابة
+        self.health = ModelHealth()
+        self._model_names = {model_id: name for name, model_id in self.models.items()}
+        
+        # قاطع دائرة لكل نموذج لتحويل الطلبات إلى البدائل عند الفشل المتكرر
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        
+        # سياسة إعادة المحاولة وانتظار تحميل النموذج
+        self.retry_policy = RetryPolicy.from_config(config)
+        
+        # طلبات تحوط اختيارية لتقليل زمن الاستجابة في الحالات البطيئة
+        self.hedging = HedgePolicy.from_config(config)
+        
         # إعدادات افتراضية
         self.default_settings = {
             "width": 512,
@@ -36,6 +94,25 @@ class ImageGenerator:
             "negative_prompt": "blurry, bad quality, distorted, ugly, low resolution"
         }
     
+    async def start(self):
+        """
+        تهيئة جلسة HTTP المشتركة عند بدء التطبيق
+        """
+        await self.backend.start()
+    
+    async def close(self):
+        """
+        إغلاق جلسة HTTP المشتركة عند إيقاف التطبيق
+        """
+        await self.backend.close()
+        await self.http_client.close()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات مجمع اتصالات HTTP
+        """
+        return self.http_client.get_stats()
+    
     async def generate_image(
         self, 
         prompt: str, 
@@ -44,117 +121,339 @@ class ImageGenerator:
         height: int = 512,
         num_inference_steps: int = 20,
         guidance_scale: float = 7.5,
-        model: str = "stable-diffusion-xl"
-    ) -> Optional[bytes]:
+        model: str = "stable-diffusion-xl",
+        deadline: Optional[Deadline] = None,
+        seed: Optional[int] = None,
+        return_pipeline: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        enhance: bool = True
+    ) -> Optional[Union[bytes, ImagePipeline]]:
         """
-        توليد صورة من وصف نصي
+        توليد صورة من وصف نصي ضمن ميزانية زمنية محددة
+        
+        عند تحديد seed تكون النتيجة قابلة لإعادة الإنتاج ويتم حفظها في الكاش.
+        مع return_pipeline=True يتم إرجاع ImagePipeline لتمريره إلى ImageSaver دون إعادة قراءة الصورة،
+        ويحمل pipeline.model اسم النموذج الذي خدم الطلب فعلياً (قد يكون بديلاً)
         """
+        if deadline is None:
+            deadline = Deadline(self.config.timeout_seconds)
+        
         try:
             logger.info(f"بدء توليد صورة: {prompt[:50]}...")
             
-            # تحسين الوصف
-            enhanced_prompt = self._enhance_prompt(prompt)
+            # تحسين الوصف (إلا إذا كان محسناً مسبقاً كما في التنويعات)
+            enhanced_prompt = self._enhance_prompt(prompt) if enhance else prompt
+            
+            negative_prompt = negative_prompt or self.default_settings["negative_prompt"]
             
             # إعداد البيانات
             payload = {
                 "inputs": enhanced_prompt,
                 "parameters": {
-                    "negative_prompt": negative_prompt or self.default_settings["negative_prompt"],
+                    "negative_prompt": negative_prompt,
                     "width": width,
                     "height": height,
                     "num_inference_steps": num_inference_steps,
                     "guidance_scale": guidance_scale,
-                    "seed": int(time.time())  # للحصول على نتائج متنوعة
+                    # بدون seed محدد نستخدم الوقت للحصول على نتائج متنوعة
+                    "seed": seed if seed is not None else int(time.time())
                 }
             }
             
-            # تحديد النموذج المطلوب
-            api_url = f"https://api-inference.huggingface.co/models/{self.models.get(model, self.models['stable-diffusion-xl'])}"
-            
-            # إرسال الطلب
-            async with aiohttp.ClientSession() as session:
-                image_data = await self._make_request(session, api_url, payload)
+            # النموذج المطلوب أولاً ثم بدائله عندما يكون قاطعه مفتوحاً أو يفشل فشلاً عابراً (5xx أو مهلة)
+            chain = self._model_chain(model)
+            rejected = []
+            for position, candidate in enumerate(chain):
+                model_id = self.models[candidate]
                 
-                if image_data:
-                    # التحقق من صحة الصورة
-                    if await self._validate_image(image_data):
-                        logger.info("تم توليد الصورة بنجاح")
-                        return image_data
-                    else:
-                        logger.error("الصورة المولدة غير صالحة")
-                        return None
-                else:
-                    logger.error("فشل في توليد الصورة")
+                # البحث في الكاش عند تحديد seed
+                cache_key = None
+                if seed is not None and self.config.enable_result_cache:
+                    cache_key = ResultCache.make_key(
+                        model_id, enhanced_prompt, negative_prompt,
+                        width, height, num_inference_steps, guidance_scale, seed
+                    )
+                    cached = await self.result_cache.get_async(cache_key)
+                    if cached is not None:
+                        logger.info("تم استرجاع الصورة من الكاش")
+                        report(progress, "cache_hit", model=candidate)
+                        return self._result(ImagePipeline(cached), candidate, return_pipeline)
+                
+                breaker = self._breaker(candidate)
+                if not breaker.allow():
+                    logger.warning(f"قاطع الدائرة مفتوح للنموذج {candidate}، الانتقال للبديل")
+                    rejected.append(breaker)
+                    continue
+                
+                if candidate != model:
+                    report(progress, "fallback", model=candidate)
+                
+                try:
+                    pipeline = await self._generate_hedged(candidate, chain[position + 1:], payload, deadline, progress)
+                except DeadlineExceeded:
+                    breaker.record_failure()
+                    raise
+                except UpstreamRejected as e:
+                    # خطأ في الطلب نفسه لا في النموذج: لا يُحسب على القاطع ولا يُرسل للبدائل
+                    breaker.cancel()
+                    logger.error(f"فشل في توليد الصورة: {str(e)}")
                     return None
-                    
+                except Exception:
+                    breaker.cancel()
+                    raise
+                
+                if pipeline is None:
+                    breaker.record_failure()
+                    continue
+                
+                # قد يفوز طلب التحوط المرسل إلى نموذج بديل
+                served = pipeline.model or candidate
+                self._breaker(served).record_success()
+                if served != candidate:
+                    breaker.cancel()
+                elif cache_key is not None:
+                    await self.result_cache.put_async(cache_key, pipeline.raw)
+                return self._result(pipeline, served, return_pipeline)
+            
+            # لم يُرسل أي طلب: الرفض الفوري مع أقرب موعد لإعادة فتح قاطع
+            if len(rejected) == len(chain):
+                raise AllBackendsOpen(chain, min(breaker.retry_after() for breaker in rejected))
+            
+            logger.error("فشل في توليد الصورة")
+            return None
+        
+        except (DeadlineExceeded, WorkerPoolFull, AdmissionRejected, AllBackendsOpen):
+            raise
         except Exception as e:
             logger.error(f"خطأ في توليد الصورة: {str(e)}")
             return None
     
-    async def _make_request(self, session: aiohttp.ClientSession, url: str, payload: Dict[str, Any]) -> Optional[bytes]:
+    async def _generate_hedged(
+        self,
+        model: str,
+        fallbacks: List[str],
+        payload: Dict[str, Any],
+        deadline: Deadline,
+        progress: Optional[ProgressCallback] = None
+    ) -> Optional[ImagePipeline]:
         """
-        إرسال طلب HTTP
+        محاولة النموذج مع طلب تحوط عند التأخر، إلى النموذج نفسه أو أول بديل متاح
         """
-        max_retries = 3
-        retry_delay = 2
+        hedge_model = model
+        if self.config.hedge_target == "fallback":
+            hedge_model = next((name for name in fallbacks if self._breaker(name).state != CircuitBreaker.OPEN), model)
         
-        for attempt in range(max_retries):
+        async def attempt(name: str) -> Optional[ImagePipeline]:
+            pipeline = await self._generate_with_model(self.models[name], payload, deadline, progress)
+            if pipeline is not None:
+                pipeline.model = name
+            return pipeline
+        
+        return await self.hedging.run(
+            self.models[model],
+            lambda: attempt(model),
+            lambda: attempt(hedge_model),
+            on_hedge=lambda: report(progress, "hedge_sent", model=hedge_model)
+        )
+    
+    async def _generate_with_model(
+        self,
+        model_id: str,
+        payload: Dict[str, Any],
+        deadline: Deadline,
+        progress: Optional[ProgressCallback] = None
+    ) -> Optional[ImagePipeline]:
+        """
+        طلب الصورة من نموذج واحد والتحقق منها
+        """
+        async with self.admission.slot(model_id, deadline) as slot:
+            image_data = await self._make_request(model_id, payload, deadline, progress, slot=slot)
+        
+        if not image_data:
+            logger.error(f"فشل في توليد الصورة بالنموذج {model_id}")
+            return None
+        
+        # التحقق من صحة الصورة
+        deadline.check("validate")
+        pipeline = ImagePipeline(image_data)
+        if not await self._validate_image(pipeline):
+            logger.error("الصورة المولدة غير صالحة")
+            return None
+        
+        logger.info("تم توليد الصورة بنجاح")
+        report(progress, "validated", width=pipeline.size[0], height=pipeline.size[1])
+        return pipeline
+    
+    @staticmethod
+    def _result(pipeline: ImagePipeline, model: str, return_pipeline: bool) -> Union[bytes, ImagePipeline]:
+        """تسجيل النموذج الذي خدم الطلب وإرجاع النتيجة بالشكل المطلوب"""
+        pipeline.model = model
+        return pipeline if return_pipeline else pipeline.raw
+    
+    def _model_chain(self, model: str) -> List[str]:
+        """
+        النموذج المطلوب متبوعاً بسلسلة البدائل المعرفة في الإعدادات
+        """
+        if model not in self.models:
+            model = "stable-diffusion-xl"
+        
+        chain = [model]
+        for fallback in self.config.model_fallbacks.get(model, []):
+            if fallback in self.models and fallback not in chain:
+                chain.append(fallback)
+        return chain
+    
+    def _breaker(self, model: str) -> CircuitBreaker:
+        """قاطع الدائرة الخاص بالنموذج"""
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker.from_config(model, self.config)
+            self.breakers[model] = breaker
+        return breaker
+    
+    def get_breaker_stats(self) -> Dict[str, Any]:
+        """
+        حالة قواطع الدائرة لكل نموذج
+        """
+        return {model: breaker.get_stats() for model, breaker in self.breakers.items()}
+    
+    async def _make_request(
+        self,
+        model_id: str,
+        payload: Dict[str, Any],
+        deadline: Deadline,
+        progress: Optional[ProgressCallback] = None,
+        slot=None
+    ) -> Optional[bytes]:
+        """
+        إرسال طلب HTTP مع احترام الميزانية الزمنية في المحاولات والانتظار
+        
+        نتيجة كل محاولة تُبلغ للحد التكيفي: النجاح وزمنه يرفعان الحد، و 503 أو
+        "loading" أو انتهاء المهلة تخفضه. مدة الانتظار تأتي من estimated_time
+        أو Retry-After عند وجودهما، وانتظار التحميل لا يستهلك محاولة.
+        خانة القبول (slot) تُحرر أثناء الانتظار لأنه لا يوجد طلب جارٍ لخدمة التوليد.
+        """
+        policy = self.retry_policy
+        model_name = self._model_names.get(model_id, model_id)
+        attempt = 0
+        loading_waits = 0
+        
+        while True:
+            deadline.check("upstream_request")
+            timeout = aiohttp.ClientTimeout(total=deadline.remaining())
+            report(progress, "upstream_sent", attempt=attempt + 1)
+            
+            # الانتظار يتم بعد إغلاق الاستجابة حتى لا يبقى الاتصال محجوزاً
+            wait = None
+            rejected = None
+            started_at = time.monotonic()
+            
             try:
-                async with session.post(url, headers=self.headers, json=payload) as response:
-                    if response.status == 200:
-                        content_type = response.headers.get('content-type', '')
-                        
-                        if 'image' in content_type:
-                            return await response.read()
-                        else:
-                            # قد يكون الرد JSON مع رسالة خطأ
-                            text = await response.text()
-                            logger.error(f"استجابة غير متوقعة: {text}")
-                            
-                            # إذا كان النموذج يحتاج وقت للتحميل
-                            if "loading" in text.lower():
-                                logger.info("النموذج يتم تحميله... انتظار...")
-                                await asyncio.sleep(20)  # انتظار 20 ثانية
-                                continue
-                            
+                async with self.backend.post(model_id, payload, timeout) as response:
+                    content_type = response.headers.get('content-type', '')
+                    
+                    if response.status == 200 and 'image' in content_type:
+                        image_data = await response.read()
+                        latency = time.monotonic() - started_at
+                        self.limiter.on_success(model_id, latency)
+                        self.health.mark_warm(model_name, latency)
+                        return image_data
+                    
+                    text = await response.text()
+                    
+                    # النموذج يتم تحميله (قد يأتي مع 200 أو 503)
+                    if response.status in (200, 503) and "loading" in text.lower():
+                        loading_waits += 1
+                        if loading_waits > policy.max_loading_waits:
+                            logger.error("تجاوز النموذج الحد الأقصى لمرات انتظار التحميل")
                             return None
+                        
+                        delay = policy.loading_delay(RetryPolicy.parse_estimated_time(text))
+                        logger.info(f"النموذج يتم تحميله... انتظار {delay:.1f} ثانية")
+                        self.limiter.on_overload(model_id, "loading")
+                        self.health.mark_cold(model_name)
+                        report(progress, "model_loading", estimated_wait=round(delay, 1))
+                        wait = (delay, "model_loading")
                     
-                    elif response.status == 503:
-                        logger.warning(f"الخدمة غير متاحة، محاولة {attempt + 1}/{max_retries}")
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
+                    elif response.status in (429, 503):
+                        attempt += 1
+                        logger.warning(f"الخدمة غير متاحة ({response.status})، محاولة {attempt}/{policy.max_attempts}")
+                        self.limiter.on_overload(model_id, str(response.status))
+                        if attempt >= policy.max_attempts:
+                            return None
                         
+                        hint = RetryPolicy.parse_retry_after(response.headers.get('Retry-After'))
+                        if hint is None:
+                            hint = RetryPolicy.parse_estimated_time(text)
+                        delay = policy.retry_delay(attempt - 1, hint)
+                        report(progress, "retrying", reason="service_unavailable", attempt=attempt,
+                               delay=round(delay, 1))
+                        wait = (delay, "retry_backoff")
+                    
+                    elif response.status == 200:
+                        # قد يكون الرد JSON مع رسالة خطأ
+                        logger.error(f"استجابة غير متوقعة: {text}")
+                        return None
+                    
+                    elif 400 <= response.status < 500:
+                        # يُرفع بعد إغلاق الاستجابة حتى لا يُحسب فشلاً على نسخة الخدمة
+                        rejected = UpstreamRejected(response.status, text[:200])
+                    
                     else:
-                        error_text = await response.text()
-                        logger.error(f"خطأ HTTP {response.status}: {error_text}")
+                        logger.error(f"خطأ HTTP {response.status}: {text}")
                         return None
             
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                logger.error(f"خطأ في الطلب، محاولة {attempt + 1}/{max_retries}: {str(e)}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
-        
-        return None
+                if isinstance(e, asyncio.TimeoutError):
+                    self.limiter.on_overload(model_id, "timeout")
+                if deadline.expired():
+                    raise DeadlineExceeded("upstream_request", deadline.budget)
+                attempt += 1
+                logger.error(f"خطأ في الطلب، محاولة {attempt}/{policy.max_attempts}: {str(e)}")
+                if attempt >= policy.max_attempts:
+                    return None
+                
+                delay = policy.backoff(attempt - 1)
+                report(progress, "retrying", reason="request_error", attempt=attempt, delay=round(delay, 1))
+                wait = (delay, "retry_backoff")
+            
+            if rejected is not None:
+                raise rejected
+            
+            # الانتظار الذي يتجاوز الميزانية يفشل فوراً بدل النوم حتى انتهائها
+            if slot is None:
+                await deadline.sleep(*wait)
+            else:
+                async with slot.paused():
+                    await deadline.sleep(*wait)
     
-    async def _validate_image(self, image_data: bytes) -> bool:
+    async def _validate_image(self, image_data: Union[bytes, ImagePipeline]) -> bool:
         """
-        التحقق من صحة الصورة
+        التحقق من صحة الصورة (من الترويسة فقط)
         """
         try:
-            # تحويل البيانات إلى صورة
-            image = Image.open(io.BytesIO(image_data))
+            pipeline = image_data if isinstance(image_data, ImagePipeline) else ImagePipeline(image_data)
+            
+            # قراءة الترويسة داخل مجمع المعالجة
+            size, image_format = await self.worker_pool.run(_probe_pipeline, pipeline)
+            pipeline.size, pipeline.source_format = size, image_format
             
             # التحقق من أبعاد الصورة
-            if image.size[0] < 50 or image.size[1] < 50:
+            if size[0] < 50 or size[1] < 50:
                 logger.error("الصورة صغيرة جداً")
                 return False
             
             # التحقق من تنسيق الصورة
-            if image.format not in ['PNG', 'JPEG', 'JPG']:
-                logger.error(f"تنسيق الصورة غير مدعوم: {image.format}")
+            if image_format not in ['PNG', 'JPEG', 'JPG']:
+                logger.error(f"تنسيق الصورة غير مدعوم: {image_format}")
                 return False
             
             return True
-            
+        
+        except WorkerPoolFull:
+            raise
         except Exception as e:
             logger.error(f"خطأ في التحقق من الصورة: {str(e)}")
             return False
@@ -184,24 +483,86 @@ class ImageGenerator:
         
         return enhanced
     
-    async def generate_variations(self, prompt: str, count: int = 4) -> list:
+    async def generate_variations(self, prompt: str, count: int = 4, **kwargs) -> list:
         """
-        توليد عدة صور متنوعة للوصف نفسه
+        توليد عدة صور متنوعة للوصف نفسه (بالتوازي، والنتائج بترتيب التنويع)
         """
         variations = []
         
-        for i in range(count):
-            # تنويع الوصف قليلاً
-            varied_prompt = self._add_variation(prompt, i)
+        async for item in self.iter_variations(prompt, count, **kwargs):
+            if item["image_data"]:
+                variations.append(item)
+        
+        variations.sort(key=lambda item: item["index"])
+        return [{"prompt": item["prompt"], "image_data": item["image_data"]} for item in variations]
+    
+    async def iter_variations(
+        self,
+        prompt: str,
+        count: int = 4,
+        negative_prompt: Optional[str] = None,
+        width: int = 512,
+        height: int = 512,
+        num_inference_steps: int = 20,
+        guidance_scale: float = 7.5,
+        model: str = "stable-diffusion-xl",
+        seed: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        concurrency: Optional[int] = None,
+        return_pipeline: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        توليد التنويعات بالتوازي ضمن حد للتزامن، وإرجاع كل نتيجة فور اكتمالها
+        
+        تحسين الوصف والميزانية الزمنية مشتركان بين كل التنويعات. كل عنصر يحوي
+        index و prompt و image_data (أو None مع error عند الفشل).
+        """
+        if deadline is None:
+            deadline = Deadline(self.config.timeout_seconds)
+        
+        semaphore = asyncio.Semaphore(concurrency or self.config.variations_concurrency)
+        
+        # تحسين الوصف مرة واحدة للمجموعة
+        enhanced_prompt = self._enhance_prompt(prompt)
+        negative_prompt = negative_prompt or self.default_settings["negative_prompt"]
+        
+        async def run(index: int) -> Dict[str, Any]:
+            varied_prompt = self._add_variation(enhanced_prompt, index)
+            item = {"index": index, "prompt": varied_prompt, "image_data": None, "error": None}
             
-            image_data = await self.generate_image(varied_prompt)
-            if image_data:
-                variations.append({
-                    "prompt": varied_prompt,
-                    "image_data": image_data
-                })
+            async with semaphore:
+                try:
+                    item["image_data"] = await self.generate_image(
+                        varied_prompt,
+                        negative_prompt=negative_prompt,
+                        width=width,
+                        height=height,
+                        num_inference_steps=num_inference_steps,
+                        guidance_scale=guidance_scale,
+                        model=model,
+                        deadline=deadline,
+                        seed=seed + index if seed is not None else None,
+                        return_pipeline=return_pipeline,
+                        enhance=False
+                    )
+                    if not item["image_data"]:
+                        item["error"] = "فشل في توليد الصورة"
+                except (DeadlineExceeded, WorkerPoolFull, AdmissionRejected, AllBackendsOpen) as e:
+                    item["error"] = str(e)
+            
+            return item
         
-        return variations
+        tasks = [asyncio.ensure_future(run(index)) for index in range(count)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # إلغاء التنويعات المتبقية إذا توقف المستهلك (مثل انقطاع العميل)
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
     
     def _add_variation(self, prompt: str, index: int) -> str:
         """
@@ -229,12 +590,68 @@ class ImageGenerator:
     
     async def test_connection(self) -> bool:
         """
-        اختبار الاتصال بـ API
+        اختبار الاتصال بـ API عبر فحص حالة النموذج (دون توليد صورة)
         """
         try:
-            test_prompt = "a simple test image"
-            image_data = await self.generate_image(test_prompt)
-            return image_data is not None
+            return await self.probe_model("stable-diffusion-xl") is not None
         except Exception as e:
             logger.error(f"فشل اختبار الاتصال: {str(e)}")
+            return False
+    
+    async def probe_model(self, model: str) -> Optional[bool]:
+        """
+        فحص خفيف لحالة تحميل النموذج لدى الخدمة
+        
+        يعيد True إذا كان محمّلاً، و False إذا كان بارداً، و None إذا تعذر الفحص
+        """
+        timeout = aiohttp.ClientTimeout(total=self.config.keep_warm_probe_timeout)
+        self.health.mark_probed(model)
+        
+        try:
+            started_at = time.monotonic()
+            loaded = await self.backend.probe(self.models[model], timeout)
+            
+            if loaded is None:
+                self.health.mark_error(model, "probe_failed")
+                return None
+            
+            if loaded:
+                self.health.mark_warm(model, time.monotonic() - started_at)
+                return True
+            
+            self.health.mark_cold(model)
+            return False
+        
+        except Exception as e:
+            self.health.mark_error(model, str(e) or type(e).__name__)
+            logger.error(f"فشل فحص حالة النموذج {model}: {str(e)}")
+            return None
+    
+    async def warm_model(self, model: str) -> bool:
+        """
+        طلب توليد صغير (خطوة واحدة) لتحميل النموذج البارد قبل طلبات المستخدمين
+        """
+        payload = {
+            "inputs": "warmup",
+            "parameters": {"num_inference_steps": 1, "width": 256, "height": 256},
+            # الخدمة تُبقي الطلب مفتوحاً حتى يكتمل التحميل بدل رد "loading"
+            "options": {"wait_for_model": True}
+        }
+        timeout = aiohttp.ClientTimeout(total=self.config.keep_warm_warmup_timeout)
+        
+        try:
+            started_at = time.monotonic()
+            async with self.backend.post(self.models[model], payload, timeout) as response:
+                await response.read()
+                if response.status != 200:
+                    self.health.mark_error(model, f"HTTP {response.status}")
+                    return False
+            
+            self.health.mark_warm(model, time.monotonic() - started_at)
+            logger.info(f"تم تسخين النموذج: {model}")
+            return True
+        
+        except Exception as e:
+            self.health.mark_error(model, str(e) or type(e).__name__)
+            logger.error(f"فشل تسخين النموذج {model}: {str(e)}")
             return False
\ No newline at end of file
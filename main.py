@@ -1,16 +1,31 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
 import os
 from datetime import datetime
 import uuid
-from typing import Optional
+import json
+import hashlib
+import asyncio
+import time
+from typing import Optional, Dict, Any, List
 import logging
 
 from image_generator import ImageGenerator
 from utils.save_image import ImageSaver
 from utils.config import Config
+from utils.schemas import ImageRequest, VariationsRequest, JobRequest, ImageResponse
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.single_flight import SingleFlight
+from utils.worker_pool import WorkerPool, WorkerPoolFull
+from utils.encoders import OutputEncoder, IMAGE_EXTENSIONS
+from utils.thumbnails import ThumbnailCache
+from utils.http_cache import CachedStaticFiles, cached_file_response, strong_etag
+from utils.job_queue import JobQueue, QueueFull
+from utils.progress import ProgressBroker, ProgressCallback, report
+from utils.admission import AdmissionRejected
+from utils.circuit_breaker import AllBackendsOpen
+from utils.keep_warm import KeepWarmScheduler
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
@@ -33,29 +48,50 @@ if not os.path.exists("static"):
     os.makedirs("static")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/output", StaticFiles(directory="output"), name="output")
+# الصور لا تتغير بعد حفظها: ETag من hash المحتوى وترويسات immutable ودعم Range
+app.mount(
+    "/output",
+    CachedStaticFiles(directory="output", etag_lookup=lambda filename: image_saver.get_file_hash(filename)),
+    name="output"
+)
 
 # إعداد المولدات
 config = Config()
-image_generator = ImageGenerator(config)
-image_saver = ImageSaver()
-
-# نماذج البيانات
-class ImageRequest(BaseModel):
-    prompt: str
-    negative_prompt: Optional[str] = None
-    width: Optional[int] = 512
-    height: Optional[int] = 512
-    num_inference_steps: Optional[int] = 20
-    guidance_scale: Optional[float] = 7.5
-
-class ImageResponse(BaseModel):
-    success: bool
-    message: str
-    image_id: Optional[str] = None
-    image_url: Optional[str] = None
-    filename: Optional[str] = None
-    prompt: Optional[str] = None
+worker_pool = WorkerPool.from_config(config)
+image_generator = ImageGenerator(config, worker_pool=worker_pool)
+thumbnails = ThumbnailCache.from_config(config, worker_pool, output_dir="output")
+image_saver = ImageSaver(worker_pool=worker_pool, encoder=OutputEncoder.from_config(config), thumbnails=thumbnails)
+
+# إبقاء النماذج المستخدمة دافئة وتتبع حالتها لـ /health
+keep_warm = KeepWarmScheduler.from_config(image_generator, config)
+
+# دمج الطلبات المتطابقة المتزامنة
+generation_flight = SingleFlight()
+
+# المهام الخلفية طويلة العمر
+background_jobs = []
+
+# دورة حياة التطبيق
+@app.on_event("startup")
+async def startup_event():
+    """تهيئة الموارد المشتركة عند بدء التشغيل"""
+    await image_generator.start()
+    await job_queue.start()
+    keep_warm.start()
+    
+    if config.storage_rescan_seconds > 0:
+        background_jobs.append(asyncio.create_task(storage_rescan_loop()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """تحرير الموارد المشتركة عند الإيقاف"""
+    for task in background_jobs:
+        task.cancel()
+    await job_queue.stop()
+    await keep_warm.stop()
+    await image_generator.close()
+    worker_pool.shutdown()
+    image_saver.close()
 
 # المسارات
 @app.get("/")
@@ -66,39 +102,192 @@ async def root():
         "description": "توليد صور من وصف نصي باستخدام الذكاء الاصطناعي",
         "endpoints": {
             "generate": "/generate - إنشاء صورة جديدة",
+            "health": "/health - حالة الخدمة والنماذج",
+            "variations": "/generate/variations - عدة تنويعات بالتوازي (NDJSON)",
+            "batch": "/generate/batch - دفعة طلبات بتزامن محدود (NDJSON)",
+            "jobs": "/jobs - إنشاء مهمة توليد غير متزامنة",
             "gallery": "/gallery - عرض جميع الصور",
             "docs": "/docs - وثائق API"
         }
     }
 
+@app.get("/health")
+async def health_check():
+    """حالة الخدمة وحالة كل نموذج (دافئ أو بارد) دون طلبات خارجية"""
+    status = keep_warm.get_status()
+    warm_models = [name for name, model in status["models"].items() if model["state"] == "warm"]
+    
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "warm_models": warm_models,
+        **status
+    }
+
+# دوال التوليد المساعدة
+def _request_encoder(request: ImageRequest) -> OutputEncoder:
+    """مرمّز الإخراج للطلب، مع رفض الصيغة أو المعاملات غير الصالحة"""
+    try:
+        return image_saver.encoder.with_overrides(
+            image_format=request.output_format,
+            quality=request.output_quality,
+            lossless=request.output_lossless,
+            effort=request.output_effort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _request_key(request: ImageRequest) -> str:
+    """مفتاح موحد لمعاملات الطلب لدمج الطلبات المتطابقة"""
+    params = {
+        "prompt": " ".join(request.prompt.split()),
+        "negative_prompt": " ".join(request.negative_prompt.split()) if request.negative_prompt else None,
+        "width": request.width,
+        "height": request.height,
+        "num_inference_steps": request.num_inference_steps,
+        "guidance_scale": request.guidance_scale,
+        "seed": request.seed,
+        "model": request.model,
+        # الطلبات المدمجة تشترك في الملف نفسه، فيجب أن تتطابق صيغته أيضاً
+        "output": _request_encoder(request).describe()
+    }
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+async def _generate_and_save(
+    request: ImageRequest,
+    deadline: Deadline,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """توليد الصورة وحفظها (يتم تنفيذها مرة واحدة لكل مجموعة طلبات متطابقة)"""
+    encoder = _request_encoder(request)
+    
+    # توليد معرف فريد للصورة
+    image_id = str(uuid.uuid4())
+    
+    # توليد الصورة
+    image_data = await image_generator.generate_image(
+        prompt=request.prompt,
+        negative_prompt=request.negative_prompt,
+        width=request.width,
+        height=request.height,
+        num_inference_steps=request.num_inference_steps,
+        guidance_scale=request.guidance_scale,
+        model=request.model,
+        deadline=deadline,
+        seed=request.seed,
+        return_pipeline=True,
+        progress=progress
+    )
+    
+    if not image_data:
+        raise HTTPException(status_code=500, detail="فشل في توليد الصورة")
+    
+    # قد يخدم الطلب نموذج بديل إذا كان قاطع النموذج المطلوب مفتوحاً
+    served_model = getattr(image_data, "model", None) or request.model
+    
+    # حفظ الصورة
+    filename = await image_saver.save_image(
+        image_data=image_data,
+        prompt=request.prompt,
+        image_id=image_id,
+        deadline=deadline,
+        model=served_model,
+        progress=progress,
+        encoder=encoder
+    )
+    
+    return {"image_id": image_id, "filename": filename, "model": served_model}
+
+async def _run_generation(
+    request: ImageRequest,
+    deadline: Deadline,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """تنفيذ التوليد مع دمج الطلبات المتطابقة ضمن ميزانية الطلب"""
+    key = _request_key(request)
+    
+    # الطلب المدمج لا يرى خطوات الطلب القائد، فنبلغه بالدمج فقط
+    if generation_flight.is_in_flight(key):
+        report(progress, "coalesced")
+    
+    # الطلبات المتطابقة المتزامنة تشترك في استدعاء وملف واحد
+    try:
+        return await asyncio.wait_for(
+            generation_flight.do(
+                key,
+                lambda: _generate_and_save(request, deadline, progress)
+            ),
+            timeout=deadline.remaining()
+        )
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("coalesced_wait", deadline.budget)
+
+async def _run_job(job) -> Dict[str, Any]:
+    """تنفيذ مهمة من طابور المهام"""
+    request = job.payload
+    deadline = Deadline(config.job_timeout_seconds)
+    
+    try:
+        result = await _run_generation(request, deadline, progress_broker.reporter(job.id))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"انتهت مهلة توليد الصورة عند الخطوة: {e.step}")
+    
+    await log_generation(image_id=result["image_id"], prompt=request.prompt, filename=result["filename"])
+    
+    return {
+        "image_id": result["image_id"],
+        "image_url": f"/output/{result['filename']}",
+        "filename": result["filename"],
+        "prompt": request.prompt,
+        "model": result["model"]
+    }
+
+# طابور المهام غير المتزامنة
+job_queue = JobQueue(
+    handler=_run_job,
+    workers=config.job_workers,
+    max_queue=config.job_queue_size,
+    result_ttl=config.job_result_ttl_seconds
+)
+
+# بث أحداث تقدم المهام للمشتركين
+progress_broker = ProgressBroker()
+
+def _publish_job_event(job, event: str, data: Dict[str, Any]):
+    """نشر تغير حالة المهمة في قناة تقدمها"""
+    progress_broker.publish(job.id, event, **data)
+
+job_queue.listeners.append(_publish_job_event)
+
+async def _finished_job_events(job):
+    """الحدث النهائي لمهمة منتهية أُخرجت قناة تقدمها"""
+    yield {"event": job.status, "timestamp": job.finished_at, "result": job.result, "error": job.error}
+
+def _job_event_source(job_id: str):
+    """
+    مصدر أحداث المهمة، أو None إذا لم تكن موجودة (دون إنشاء قناة لمعرف مجهول)
+    """
+    job = job_queue.get(job_id)
+    if progress_broker.has_channel(job_id) or (job is not None and not job.finished):
+        return progress_broker.stream(job_id)
+    if job is not None:
+        return _finished_job_events(job)
+    return None
+
 @app.post("/generate", response_model=ImageResponse)
 async def generate_image(request: ImageRequest, background_tasks: BackgroundTasks):
     """توليد صورة من وصف نصي"""
+    # ميزانية زمنية شاملة للطلب
+    deadline = Deadline(config.timeout_seconds)
+    
     try:
         logger.info(f"بدء توليد صورة للوصف: {request.prompt}")
         
-        # توليد معرف فريد للصورة
-        image_id = str(uuid.uuid4())
+        result = await _run_generation(request, deadline)
         
-        # توليد الصورة
-        image_data = await image_generator.generate_image(
-            prompt=request.prompt,
-            negative_prompt=request.negative_prompt,
-            width=request.width,
-            height=request.height,
-            num_inference_steps=request.num_inference_steps,
-            guidance_scale=request.guidance_scale
-        )
-        
-        if not image_data:
-            raise HTTPException(status_code=500, detail="فشل في توليد الصورة")
-        
-        # حفظ الصورة
-        filename = await image_saver.save_image(
-            image_data=image_data,
-            prompt=request.prompt,
-            image_id=image_id
-        )
+        image_id = result["image_id"]
+        filename = result["filename"]
         
         # تسجيل العملية في الخلفية
         background_tasks.add_task(
@@ -116,55 +305,356 @@ async def generate_image(request: ImageRequest, background_tasks: BackgroundTask
             image_id=image_id,
             image_url=f"/output/{filename}",
             filename=filename,
-            prompt=request.prompt
+            prompt=request.prompt,
+            model=result["model"]
         )
-        
+    
+    except DeadlineExceeded as e:
+        logger.warning(f"انتهت مهلة توليد الصورة: {str(e)}")
+        raise HTTPException(status_code=504, detail=f"انتهت مهلة توليد الصورة عند الخطوة: {e.step}")
+    except WorkerPoolFull as e:
+        logger.warning(f"تم رفض الطلب: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="الخادم مشغول بمعالجة صور أخرى، حاول لاحقاً",
+            headers={"Retry-After": "5"}
+        )
+    except AdmissionRejected as e:
+        logger.warning(f"تم رفض الطلب: {str(e)}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail="خدمة التوليد تحت ضغط عالٍ، حاول لاحقاً",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except AllBackendsOpen as e:
+        logger.warning(f"تم رفض الطلب: {str(e)}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail="خدمة التوليد غير متاحة مؤقتاً، حاول لاحقاً",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"خطأ في توليد الصورة: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في توليد الصورة: {str(e)}")
 
+@app.post("/generate/variations")
+async def generate_variations(request: VariationsRequest):
+    """توليد عدة تنويعات بالتوازي مع بث كل نتيجة فور اكتمالها (NDJSON)"""
+    if not 1 <= request.count <= config.max_variations:
+        raise HTTPException(status_code=400, detail=f"عدد التنويعات يجب أن يكون بين 1 و {config.max_variations}")
+    
+    encoder = _request_encoder(request)
+    
+    # ميزانية زمنية واحدة لكل التنويعات
+    deadline = Deadline(config.timeout_seconds)
+    logger.info(f"بدء توليد {request.count} تنويعات للوصف: {request.prompt}")
+    
+    async def stream_variations():
+        completed = 0
+        failed = 0
+        
+        async for item in image_generator.iter_variations(
+            request.prompt,
+            count=request.count,
+            negative_prompt=request.negative_prompt,
+            width=request.width,
+            height=request.height,
+            num_inference_steps=request.num_inference_steps,
+            guidance_scale=request.guidance_scale,
+            model=request.model,
+            seed=request.seed,
+            deadline=deadline,
+            return_pipeline=True
+        ):
+            line = {"index": item["index"], "prompt": item["prompt"]}
+            filename = None
+            
+            if item["image_data"]:
+                image_id = str(uuid.uuid4())
+                served_model = getattr(item["image_data"], "model", None) or request.model
+                try:
+                    filename = await image_saver.save_image(
+                        image_data=item["image_data"],
+                        prompt=request.prompt,
+                        image_id=image_id,
+                        deadline=deadline,
+                        model=served_model,
+                        encoder=encoder
+                    )
+                except (DeadlineExceeded, WorkerPoolFull) as e:
+                    item["error"] = str(e)
+            
+            if filename:
+                completed += 1
+                line.update({
+                    "success": True,
+                    "image_id": image_id,
+                    "image_url": f"/output/{filename}",
+                    "filename": filename,
+                    "model": served_model
+                })
+            else:
+                failed += 1
+                line.update({"success": False, "error": item["error"] or "فشل في حفظ الصورة"})
+            
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        
+        yield json.dumps({"done": True, "completed": completed, "failed": failed}) + "\n"
+    
+    return StreamingResponse(
+        stream_variations(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+def _parse_batch_body(body: bytes, content_type: str) -> List[Any]:
+    """
+    قراءة عناصر الدفعة من مصفوفة JSON أو NDJSON (سطر لكل طلب)
+    
+    السطر التالف في NDJSON يتحول إلى خطأ لعنصره فقط ولا يوقف الدفعة
+    """
+    if "ndjson" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"سطر JSON غير صالح: {str(e)}"))
+        return items
+    
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("يجب أن يكون جسم الطلب مصفوفة JSON من طلبات التوليد")
+    return items
+
+async def _process_batch_item(index: int, item: Any) -> Dict[str, Any]:
+    """توليد عنصر واحد من الدفعة وتحويل أي فشل إلى سطر خطأ خاص به"""
+    try:
+        if isinstance(item, Exception):
+            raise item
+        request = ImageRequest(**item)
+    except Exception as e:
+        return {"index": index, "success": False, "status_code": 422, "error": str(e)}
+    
+    # ميزانية زمنية مستقلة لكل عنصر
+    deadline = Deadline(config.timeout_seconds)
+    
+    try:
+        result = await _run_generation(request, deadline)
+    except DeadlineExceeded as e:
+        return {"index": index, "success": False, "status_code": 504, "error": f"انتهت المهلة عند الخطوة: {e.step}"}
+    except WorkerPoolFull as e:
+        return {"index": index, "success": False, "status_code": 503, "error": str(e)}
+    except (AdmissionRejected, AllBackendsOpen) as e:
+        return {"index": index, "success": False, "status_code": e.status_code, "error": str(e)}
+    except HTTPException as e:
+        return {"index": index, "success": False, "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        logger.error(f"خطأ في عنصر الدفعة {index}: {str(e)}")
+        return {"index": index, "success": False, "status_code": 500, "error": str(e)}
+    
+    await log_generation(image_id=result["image_id"], prompt=request.prompt, filename=result["filename"])
+    
+    return {
+        "index": index,
+        "success": True,
+        "image_id": result["image_id"],
+        "image_url": f"/output/{result['filename']}",
+        "filename": result["filename"],
+        "prompt": request.prompt,
+        "model": result["model"]
+    }
+
+@app.post("/generate/batch")
+async def generate_batch(request: Request):
+    """توليد دفعة من الطلبات بتزامن محدود مع بث نتيجة كل عنصر فور اكتماله (NDJSON)"""
+    try:
+        items = _parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="الدفعة فارغة")
+    if len(items) > config.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"الحد الأقصى للدفعة {config.batch_max_items} عنصر")
+    
+    logger.info(f"بدء دفعة توليد من {len(items)} عنصر")
+    
+    async def stream_batch():
+        started_at = time.monotonic()
+        pending = iter(enumerate(items))
+        results: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            # العمال يتشاركون المكرر نفسه فلا يتجاوز التزامن عددهم
+            for index, item in pending:
+                await results.put(await _process_batch_item(index, item))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(min(config.batch_concurrency, len(items)))]
+        completed = 0
+        failed = 0
+        
+        try:
+            for _ in range(len(items)):
+                line = await results.get()
+                if line["success"]:
+                    completed += 1
+                else:
+                    failed += 1
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            
+            yield json.dumps({
+                "done": True,
+                "total": len(items),
+                "completed": completed,
+                "failed": failed,
+                "elapsed_seconds": round(time.monotonic() - started_at, 2)
+            }) + "\n"
+        finally:
+            # إيقاف العمال إذا انقطع العميل قبل اكتمال الدفعة
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    return StreamingResponse(
+        stream_batch(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """إنشاء مهمة توليد غير متزامنة وإرجاع معرفها فوراً"""
+    # رفض صيغة الإخراج غير الصالحة قبل دخول الطابور
+    _request_encoder(request)
+    
+    try:
+        job = job_queue.submit(request, priority=request.priority)
+    except QueueFull as e:
+        logger.warning(f"تم رفض المهمة: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail="طابور المهام ممتلئ، حاول لاحقاً",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    logger.info(f"تمت إضافة مهمة للطابور: {job.id}")
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """حالة المهمة ونتيجتها"""
+    job = job_queue.get(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    
+    return {
+        "success": job.status != "failed",
+        **job.to_dict()
+    }
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """بث أحداث تقدم المهمة عبر Server-Sent Events"""
+    events = _job_event_source(job_id)
+    if events is None:
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    
+    async def event_stream():
+        async for message in events:
+            if message is None:
+                # تعليق لإبقاء الاتصال مفتوحاً عبر الوكلاء
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['event']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """بث أحداث تقدم المهمة عبر WebSocket"""
+    events = _job_event_source(job_id)
+    if events is None:
+        await websocket.close(code=4404)
+        return
+    
+    await websocket.accept()
+    try:
+        async for message in events:
+            if message is None:
+                message = {"event": "keep-alive"}
+            await websocket.send_json(message)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"انقطع مشترك WebSocket للمهمة: {job_id}")
+
 @app.get("/gallery")
-async def get_gallery():
-    """عرض جميع الصور المولدة"""
+async def get_gallery(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    model: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None
+):
+    """عرض الصور المولدة (الأحدث أولاً) مع تقسيم الصفحات بالمؤشر"""
     try:
-        images = []
-        output_dir = "output"
-        
-        if os.path.exists(output_dir):
-            for filename in os.listdir(output_dir):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    file_path = os.path.join(output_dir, filename)
-                    stat = os.stat(file_path)
-                    
-                    images.append({
-                        "filename": filename,
-                        "url": f"/output/{filename}",
-                        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "size": stat.st_size
-                    })
-        
-        # ترتيب حسب تاريخ الإنشاء (الأحدث أولاً)
-        images.sort(key=lambda x: x["created_at"], reverse=True)
+        page = image_saver.get_gallery_page(
+            limit=limit,
+            cursor=cursor,
+            model=model,
+            width=width,
+            height=height
+        )
         
         return {
             "success": True,
-            "count": len(images),
-            "images": images
+            "count": len(page["images"]),
+            "images": page["images"],
+            "next_cursor": page["next_cursor"]
         }
-        
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"خطأ في عرض المعرض: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في عرض المعرض: {str(e)}")
 
 @app.get("/image/{filename}")
-async def get_image(filename: str):
-    """عرض صورة محددة"""
-    file_path = os.path.join("output", filename)
+async def get_image(request: Request, filename: str, w: Optional[int] = Query(None, gt=0)):
+    """عرض صورة محددة، أو نسخة مصغرة منها بعرض w"""
+    original_path = os.path.join("output", filename)
     
-    if not os.path.exists(file_path):
+    # ملفات غير الصور في مجلد الإخراج (مثل metadata.jsonl) ليست للنشر
+    if not filename.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(original_path):
         raise HTTPException(status_code=404, detail="الصورة غير موجودة")
     
-    return FileResponse(file_path)
+    # النسخة المصغرة من القرص، أو توليدها مرة واحدة في مجمع المعالجة
+    file_path = original_path
+    if w is not None:
+        file_path = await thumbnails.get(original_path, filename, w)
+    
+    # ETag قوي من hash المحفوظ للأصل؛ النسخ المصغرة تستخدم وقت التعديل والحجم
+    etag = None
+    file_hash = image_saver.get_file_hash(filename) if file_path == original_path else None
+    if file_hash:
+        etag = strong_etag(file_hash)
+    
+    return cached_file_response(file_path, request.headers, etag=etag)
 
 @app.delete("/image/{filename}")
 async def delete_image(filename: str):
@@ -172,17 +662,25 @@ async def delete_image(filename: str):
     try:
         file_path = os.path.join("output", filename)
         
-        if not os.path.exists(file_path):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="الصورة غير موجودة")
         
-        os.remove(file_path)
+        # الحذف عبر ImageSaver للحفاظ على الفهارس، أو مباشرة للملفات بدون بيانات وصفية
+        image_id = image_saver.find_image_id(filename)
+        if image_id is not None:
+            image_saver.delete_image(image_id)
+        else:
+            os.remove(file_path)
+            thumbnails.delete(filename)
         logger.info(f"تم حذف الصورة: {filename}")
         
         return {
             "success": True,
             "message": f"تم حذف الصورة {filename} بنجاح"
         }
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"خطأ في حذف الصورة: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في حذف الصورة: {str(e)}")
@@ -191,21 +689,27 @@ async def delete_image(filename: str):
 async def get_stats():
     """إحصائيات الاستخدام"""
     try:
-        output_dir = "output"
-        total_images = 0
-        total_size = 0
-        
-        if os.path.exists(output_dir):
-            for filename in os.listdir(output_dir):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    file_path = os.path.join(output_dir, filename)
-                    total_images += 1
-                    total_size += os.path.getsize(file_path)
+        # قراءة مباشرة من العدادات دون مسح مجلد الإخراج
+        storage = image_saver.get_storage_info()
         
         return {
-            "total_images": total_images,
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "average_size_mb": round((total_size / total_images) / (1024 * 1024), 2) if total_images > 0 else 0
+            "total_images": storage["total_files"],
+            "total_size_mb": storage["total_size_mb"],
+            "average_size_mb": storage["average_size_mb"],
+            "by_model": storage["by_model"],
+            "by_day": storage["by_day"],
+            "http_pool": image_generator.get_pool_stats(),
+            "backend": image_generator.backend.get_stats(),
+            "result_cache": image_generator.result_cache.get_stats(),
+            "single_flight": generation_flight.get_stats(),
+            "worker_pool": worker_pool.get_stats(),
+            "admission": image_generator.admission.get_stats(),
+            "upstream_concurrency": image_generator.limiter.get_stats(),
+            "circuit_breakers": image_generator.get_breaker_stats(),
+            "hedging": image_generator.hedging.get_stats(),
+            "jobs": job_queue.get_stats(),
+            "progress": progress_broker.get_stats(),
+            "thumbnails": thumbnails.get_stats()
         }
         
     except Exception as e:
@@ -213,6 +717,15 @@ async def get_stats():
         raise HTTPException(status_code=500, detail=f"خطأ في الحصول على الإحصائيات: {str(e)}")
 
 # المهام الخلفية
+async def storage_rescan_loop():
+    """إعادة مسح مجلد الإخراج دورياً لتصحيح عدادات التخزين"""
+    while True:
+        await asyncio.sleep(config.storage_rescan_seconds)
+        try:
+            await image_saver.reconcile_storage()
+        except Exception as e:
+            logger.error(f"خطأ في إعادة مسح التخزين: {str(e)}")
+
 async def log_generation(image_id: str, prompt: str, filename: str):
     """تسجيل عملية التوليد"""
     try:
@@ -10,6 +10,25 @@ from main import app
 from image_generator import ImageGenerator
 from utils.config import Config
 from utils.save_image import ImageSaver
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.result_cache import ResultCache
+from utils.single_flight import SingleFlight
+from utils.worker_pool import WorkerPool, WorkerPoolFull
+from utils.image_pipeline import ImagePipeline
+from utils.metadata_store import MetadataStore
+from utils.job_queue import Job, JobQueue, QueueFull
+from utils.progress import ProgressBroker
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.adaptive_limiter import AdaptiveLimiter
+from utils.circuit_breaker import CircuitBreaker, AllBackendsOpen
+from utils.hedging import HedgePolicy
+from utils.retry import RetryPolicy, UpstreamRejected
+from utils.keep_warm import KeepWarmScheduler
+from utils.backends import HTTPReplicaBackend, StubBackend
+from utils.http_client import HTTPClientPool
+from utils.encoders import OutputEncoder, is_supported
+from utils.thumbnails import ThumbnailCache
+from utils.http_cache import parse_range, etag_matches, RangeNotSatisfiable
 
 # إنشاء عميل الاختبار
 client = TestClient(app)
@@ -73,6 +92,258 @@ class TestPrompt2ImageAPI:
         
         assert response.status_code == 422
     
+    @patch('main.image_generator.generate_image')
+    def test_generate_image_deadline_exceeded(self, mock_generate):
+        """اختبار إرجاع 504 عند تجاوز المهلة"""
+        mock_generate.side_effect = DeadlineExceeded("upstream_request", 60)
+        
+        response = client.post("/generate", json={"prompt": "A beautiful sunset"})
+        
+        assert response.status_code == 504
+    
+    @patch('main.image_generator.generate_image')
+    @patch('main.image_saver.save_image')
+    def test_generate_variations_stream(self, mock_save, mock_generate):
+        """اختبار بث نتائج التنويعات سطراً لكل تنويع مع عزل الفشل"""
+        mock_generate.side_effect = [b"image_a", None, b"image_c"]
+        mock_save.return_value = "variation.png"
+        
+        response = client.post("/generate/variations", json={"prompt": "A forest", "count": 3})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 4
+        assert sorted(line["index"] for line in lines[:3]) == [0, 1, 2]
+        assert lines[-1] == {"done": True, "completed": 2, "failed": 1}
+    
+    @patch('main.image_generator.generate_image')
+    @patch('main.image_saver.save_image')
+    def test_generate_batch_json_array(self, mock_save, mock_generate):
+        """اختبار دفعة JSON مع عزل فشل العناصر عن بقية الدفعة"""
+        async def fake_generate(prompt, **kwargs):
+            return None if prompt == "broken" else b"image"
+        
+        mock_generate.side_effect = fake_generate
+        mock_save.return_value = "batch.png"
+        
+        response = client.post("/generate/batch", json=[
+            {"prompt": "A red chair", "seed": 1},
+            {"width": 512},
+            {"prompt": "broken"},
+            {"prompt": "A blue chair", "seed": 2}
+        ])
+        
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        results = {line["index"]: line for line in lines[:-1]}
+        assert results[0]["success"] is True
+        assert results[1]["status_code"] == 422
+        assert results[2]["status_code"] == 500
+        assert results[3]["filename"] == "batch.png"
+        assert lines[-1]["total"] == 4
+        assert lines[-1]["completed"] == 2
+    
+    @patch('main.image_generator.generate_image')
+    @patch('main.image_saver.save_image')
+    def test_generate_batch_ndjson(self, mock_save, mock_generate):
+        """اختبار دفعة NDJSON مع سطر تالف"""
+        mock_generate.return_value = b"image"
+        mock_save.return_value = "batch.png"
+        body = '{"prompt": "A lamp", "seed": 3}\nnot json\n{"prompt": "A desk", "seed": 4}\n'
+        
+        response = client.post(
+            "/generate/batch",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 4
+        assert lines[-1]["completed"] == 2
+        assert lines[-1]["failed"] == 1
+    
+    def test_generate_batch_invalid_body(self):
+        """اختبار رفض جسم ليس مصفوفة"""
+        response = client.post("/generate/batch", json={"prompt": "A lamp"})
+        assert response.status_code == 400
+    
+    def test_get_image_thumbnail(self):
+        """اختبار تقديم نسخة مصغرة عبر ?w="""
+        from PIL import Image
+        import io
+        filename = "thumbnail_api_test.png"
+        Image.new('RGB', (600, 300), color='teal').save(os.path.join("output", filename))
+        
+        try:
+            response = client.get(f"/image/{filename}?w=256")
+            
+            assert response.status_code == 200
+            assert Image.open(io.BytesIO(response.content)).size == (256, 128)
+            assert client.get(f"/image/{filename}?w=0").status_code == 422
+        finally:
+            client.delete(f"/image/{filename}")
+        
+        assert not os.path.exists(os.path.join("output", "thumbs", "thumbnail_api_test_w256.webp"))
+    
+    def test_get_image_conditional_and_range(self):
+        """اختبار ETag من hash المحتوى و 304 و Range على /image و /output"""
+        filename = "http_cache_test.png"
+        file_path = os.path.join("output", filename)
+        with open(file_path, "wb") as f:
+            f.write(bytes(range(256)) * 4)
+        
+        try:
+            with patch('main.image_saver.get_file_hash', return_value="abc123"):
+                for url in (f"/image/{filename}", f"/output/{filename}"):
+                    response = client.get(url)
+                    assert response.status_code == 200
+                    assert response.headers["etag"] == '"abc123"'
+                    assert "immutable" in response.headers["cache-control"]
+                    
+                    assert client.get(url, headers={"If-None-Match": 'W/"abc123"'}).status_code == 304
+                    
+                    partial = client.get(url, headers={"Range": "bytes=10-19"})
+                    assert partial.status_code == 206
+                    assert partial.content == bytes(range(10, 20))
+                    assert partial.headers["content-range"] == "bytes 10-19/1024"
+                    
+                    assert client.get(url, headers={"Range": "bytes=5000-"}).status_code == 416
+        finally:
+            os.remove(file_path)
+    
+    def test_output_mount_serves_images_only(self):
+        """اختبار أن /output و /image لا يقدمان ملفات غير الصور مثل metadata.jsonl"""
+        file_path = os.path.join("output", "metadata.jsonl")
+        created = not os.path.exists(file_path)
+        if created:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write("{}\n")
+        
+        try:
+            response = client.get("/output/metadata.jsonl")
+            assert response.status_code == 404
+            assert "immutable" not in response.headers.get("cache-control", "")
+            
+            response = client.get("/image/metadata.jsonl")
+            assert response.status_code == 404
+            assert "immutable" not in response.headers.get("cache-control", "")
+            assert client.delete("/image/metadata.jsonl").status_code == 404
+            assert os.path.exists(file_path)
+        finally:
+            if created:
+                os.remove(file_path)
+    
+    def test_generate_image_invalid_output_format(self):
+        """اختبار رفض صيغة إخراج غير مدعومة قبل التوليد"""
+        with patch('main.image_generator.generate_image') as mock_generate:
+            response = client.post("/generate", json={"prompt": "A forest", "output_format": "bmp"})
+            
+            assert response.status_code == 400
+            mock_generate.assert_not_called()
+    
+    def test_generate_variations_invalid_count(self):
+        """اختبار رفض عدد تنويعات خارج الحد"""
+        response = client.post("/generate/variations", json={"prompt": "A forest", "count": 100})
+        assert response.status_code == 400
+    
+    @patch('main.image_generator.generate_image')
+    def test_generate_image_admission_rejected(self, mock_generate):
+        """اختبار إرجاع 429 مع Retry-After عند امتلاء طابور القبول"""
+        mock_generate.side_effect = AdmissionRejected("stable-diffusion-xl", "queue_full", 429, 7)
+        
+        response = client.post("/generate", json={"prompt": "A crowded market"})
+        
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+    
+    @patch('main.image_generator.generate_image')
+    def test_generate_image_all_backends_open(self, mock_generate):
+        """اختبار إرجاع 503 مع Retry-After عندما تكون قواطع كل النماذج مفتوحة"""
+        mock_generate.side_effect = AllBackendsOpen(["stable-diffusion-xl"], 12)
+        
+        response = client.post("/generate", json={"prompt": "An empty studio"})
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "12"
+    
+    @patch('main.image_generator.generate_image')
+    @patch('main.image_saver.save_image')
+    def test_job_lifecycle(self, mock_save, mock_generate):
+        """اختبار إنشاء مهمة غير متزامنة ومتابعة حالتها"""
+        mock_generate.return_value = b"fake_image_data"
+        mock_save.return_value = "job_image.png"
+        
+        with TestClient(app) as lifespan_client:
+            response = lifespan_client.post("/jobs", json={"prompt": "A quiet harbor"})
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+            
+            for _ in range(50):
+                data = lifespan_client.get(f"/jobs/{job_id}").json()
+                if data["status"] == "completed":
+                    break
+                import time
+                time.sleep(0.01)
+            
+            assert data["status"] == "completed"
+            assert data["result"]["filename"] == "job_image.png"
+    
+    @patch('main.image_generator.generate_image')
+    @patch('main.image_saver.save_image')
+    def test_job_events_stream(self, mock_save, mock_generate):
+        """اختبار بث أحداث تقدم المهمة عبر SSE"""
+        mock_generate.return_value = b"fake_image_data"
+        mock_save.return_value = "stream_image.png"
+        
+        with TestClient(app) as lifespan_client:
+            job_id = lifespan_client.post("/jobs", json={"prompt": "A streaming river"}).json()["job_id"]
+            
+            with lifespan_client.stream("GET", f"/jobs/{job_id}/events") as response:
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("text/event-stream")
+                body = "".join(response.iter_text())
+            
+            assert "event: queued" in body
+            assert "event: completed" in body
+            assert "stream_image.png" in body
+    
+    def test_job_not_found(self):
+        """اختبار الاستعلام عن مهمة غير موجودة"""
+        response = client.get("/jobs/missing-job")
+        assert response.status_code == 404
+    
+    def test_job_events_unknown_job(self):
+        """اختبار 404 لأحداث مهمة مجهولة دون إنشاء قناة لها"""
+        from main import progress_broker
+        
+        assert client.get("/jobs/missing-job/events").status_code == 404
+        assert not progress_broker.has_channel("missing-job")
+    
+    def test_job_events_evicted_channel(self):
+        """اختبار إرسال الحالة النهائية وإغلاق البث لمهمة منتهية أُخرجت قناتها"""
+        from main import job_queue, progress_broker
+        from fastapi.websockets import WebSocketDisconnect
+        
+        job = Job({"prompt": "An old job"})
+        job.status, job.finished_at, job.result = "completed", 1.0, {"filename": "old.png"}
+        job_queue.jobs[job.id] = job
+        
+        try:
+            with client.stream("GET", f"/jobs/{job.id}/events") as response:
+                body = "".join(response.iter_text())
+            assert "event: completed" in body
+            assert "old.png" in body
+            
+            with client.websocket_connect(f"/jobs/{job.id}/ws") as websocket:
+                assert websocket.receive_json()["event"] == "completed"
+                with pytest.raises(WebSocketDisconnect):
+                    websocket.receive_json()
+            
+            assert not progress_broker.has_channel(job.id)
+        finally:
+            del job_queue.jobs[job.id]
+    
     def test_gallery_endpoint(self):
         """اختبار endpoint المعرض"""
         with patch('os.path.exists') as mock_exists:
@@ -89,6 +360,11 @@ class TestPrompt2ImageAPI:
                     assert data["success"] is True
                     assert "images" in data
     
+    def test_gallery_invalid_cursor(self):
+        """اختبار رفض مؤشر صفحة غير صالح"""
+        response = client.get("/gallery", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+    
     def test_stats_endpoint(self):
         """اختبار endpoint الإحصائيات"""
         with patch('os.path.exists') as mock_exists:
@@ -184,6 +460,212 @@ class TestImageGenerator:
         
         is_valid = await self.generator._validate_image(invalid_data)
         assert is_valid is False
+    
+    @pytest.mark.asyncio
+    async def test_shared_http_session(self):
+        """اختبار إعادة استخدام جلسة HTTP المشتركة"""
+        session = self.generator.http_client.get_session()
+        assert self.generator.http_client.get_session() is session
+        
+        stats = self.generator.get_pool_stats()
+        assert stats["session_open"] is True
+        assert stats["sessions_created"] == 1
+        assert stats["limit_per_host"] == self.config.http_pool_limit_per_host
+        
+        await self.generator.close()
+        assert self.generator.get_pool_stats()["session_open"] is False
+    
+    def test_http_session_released_on_new_loop(self):
+        """اختبار إغلاق جلسة الحلقة السابقة عند إنشاء جلسة على حلقة جديدة"""
+        pool = HTTPClientPool()
+        
+        async def acquire():
+            return pool.get_session()
+        
+        first = asyncio.run(acquire())
+        second = asyncio.run(acquire())
+        
+        assert second is not first
+        assert first.closed
+        assert pool.get_stats()["sessions_created"] == 2
+        asyncio.run(pool.close())
+    
+    @pytest.mark.asyncio
+    async def test_generate_image_expired_deadline(self):
+        """اختبار رفض التوليد عند نفاد الميزانية الزمنية"""
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            await self.generator.generate_image("A cat", deadline=Deadline(0))
+        
+        assert exc_info.value.step == "upstream_request"
+        await self.generator.close()
+    
+    @pytest.mark.asyncio
+    async def test_generate_image_cache_hit(self):
+        """اختبار إرجاع النتيجة من الكاش دون طلب خارجي"""
+        self.generator.result_cache.enable_disk = False
+        enhanced = self.generator._enhance_prompt("A cat")
+        key = ResultCache.make_key(
+            self.generator.models["stable-diffusion-xl"], enhanced,
+            self.generator.default_settings["negative_prompt"], 512, 512, 20, 7.5, 42
+        )
+        self.generator.result_cache.put(key, b"cached_image")
+        
+        # الميزانية المنتهية تثبت عدم وجود طلب خارجي
+        image_data = await self.generator.generate_image("A cat", seed=42, deadline=Deadline(0))
+        
+        assert image_data == b"cached_image"
+        assert self.generator.result_cache.get_stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_make_request_honors_upstream_hints(self):
+        """اختبار احترام estimated_time و Retry-After دون استهلاك محاولة عند التحميل"""
+        class FakeResponse:
+            def __init__(self, status, body=b"", headers=None):
+                self.status = status
+                self.body = body
+                self.headers = headers or {}
+            
+            async def __aenter__(self):
+                return self
+            
+            async def __aexit__(self, *args):
+                return False
+            
+            async def text(self):
+                return self.body.decode()
+            
+            async def read(self):
+                return self.body
+        
+        loading = b'{"error": "Model is currently loading", "estimated_time": 7.5}'
+        responses = [
+            FakeResponse(503, loading),
+            FakeResponse(503, loading),
+            FakeResponse(503, b"busy", {"Retry-After": "3"}),
+            FakeResponse(200, b"image_bytes", {"content-type": "image/png"})
+        ]
+        self.generator.backend = Mock()
+        self.generator.backend.post = Mock(side_effect=responses)
+        
+        self.generator.retry_policy = RetryPolicy(max_attempts=2, jitter=0.0)
+        deadline = Deadline(60)
+        deadline.sleep = AsyncMock()
+        
+        result = await self.generator._make_request("test/model", {}, deadline)
+        
+        assert result == b"image_bytes"
+        delays = [call.args for call in deadline.sleep.await_args_list]
+        assert delays == [(7.5, "model_loading"), (7.5, "model_loading"), (3.0, "retry_backoff")]
+    
+    def test_retry_after_parsing(self):
+        """اختبار قراءة Retry-After بالثواني وبصيغة التاريخ"""
+        assert RetryPolicy.parse_retry_after("12") == 12.0
+        assert RetryPolicy.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert RetryPolicy.parse_retry_after("soon") is None
+        assert RetryPolicy.parse_estimated_time("not json") is None
+        
+        policy = RetryPolicy(base_delay=2, max_delay=5, jitter=0.0)
+        assert policy.backoff(0) == 2
+        assert policy.backoff(5) == 5
+    
+    @pytest.mark.asyncio
+    async def test_variations_run_concurrently(self):
+        """اختبار تنفيذ التنويعات بالتوازي ضمن حد التزامن مع تحسين الوصف مرة واحدة"""
+        active = 0
+        peak = 0
+        
+        async def fake_generate(prompt, **kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+            assert kwargs["enhance"] is False
+            return prompt.encode()
+        
+        with patch.object(self.generator, "generate_image", side_effect=fake_generate), \
+             patch.object(self.generator, "_enhance_prompt", wraps=self.generator._enhance_prompt) as mock_enhance:
+            variations = await self.generator.generate_variations("A cat", count=4, concurrency=2)
+        
+        assert peak == 2
+        assert mock_enhance.call_count == 1
+        assert [item["prompt"] for item in variations] == [
+            self.generator._add_variation(self.generator._enhance_prompt("A cat"), i) for i in range(4)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_keep_warm_warms_cold_models(self):
+        """اختبار تسخين النموذج البارد فقط وتحديث حالته"""
+        async def fake_probe(model):
+            if model == "anime":
+                self.generator.health.mark_cold(model)
+                return False
+            self.generator.health.mark_warm(model, 0.05)
+            return True
+        
+        async def fake_warm(model):
+            self.generator.health.mark_warm(model, 3.0)
+            return True
+        
+        scheduler = KeepWarmScheduler(self.generator, ["stable-diffusion-xl", "anime", "unknown"])
+        with patch.object(self.generator, "probe_model", side_effect=fake_probe), \
+             patch.object(self.generator, "warm_model", side_effect=fake_warm) as mock_warm:
+            await scheduler.run_once()
+        
+        mock_warm.assert_awaited_once_with("anime")
+        status = scheduler.get_status()
+        assert status["models"]["anime"]["state"] == "warm"
+        assert status["models"]["anime"]["last_latency_ms"] == 3000.0
+        assert status["keep_warm"]["models"] == ["stable-diffusion-xl", "anime"]
+    
+    @pytest.mark.asyncio
+    async def test_generate_image_fallback_model(self):
+        """اختبار التحويل إلى النموذج البديل وفتح قاطع النموذج الفاشل"""
+        sdxl = self.generator.models["stable-diffusion-xl"]
+        
+        async def fake_generate(model_id, payload, deadline, progress=None):
+            return None if model_id == sdxl else ImagePipeline(b"fallback_image")
+        
+        with patch.object(self.generator, "_generate_with_model", side_effect=fake_generate) as mock_generate:
+            for _ in range(self.config.breaker_min_requests):
+                result = await self.generator.generate_image("A cat", return_pipeline=True)
+                assert result.model == "stable-diffusion-2"
+            
+            # القاطع مفتوح الآن فيذهب الطلب للبديل مباشرة
+            mock_generate.reset_mock()
+            await self.generator.generate_image("A cat")
+            assert mock_generate.call_count == 1
+        
+        assert self.generator.get_breaker_stats()["stable-diffusion-xl"]["state"] == "open"
+    
+    @pytest.mark.asyncio
+    async def test_generate_image_upstream_rejection_is_terminal(self):
+        """اختبار أن رفض الطلب (4xx) لا يُرسل للنماذج البديلة ولا يُحسب على القاطع"""
+        assert len(self.generator._model_chain("stable-diffusion-xl")) > 1
+        
+        with patch.object(self.generator, "_make_request", side_effect=UpstreamRejected(400, "bad input")) as mock_request:
+            result = await self.generator.generate_image("A cat")
+        
+        assert result is None
+        assert mock_request.call_count == 1
+        assert self.generator.get_breaker_stats()["stable-diffusion-xl"]["failures"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_generate_image_all_breakers_open(self):
+        """اختبار رفع AllBackendsOpen بأقرب موعد إعادة فتح عندما تكون كل القواطع مفتوحة"""
+        chain = self.generator._model_chain("stable-diffusion-xl")
+        for position, name in enumerate(chain):
+            breaker = self.generator._breaker(name)
+            breaker.open_seconds = 12 + position * 10
+            breaker._open()
+        
+        with patch.object(self.generator, "_generate_with_model") as mock_generate:
+            with pytest.raises(AllBackendsOpen) as exc_info:
+                await self.generator.generate_image("A cat")
+            mock_generate.assert_not_called()
+        
+        assert exc_info.value.status_code == 503
+        assert 1 <= exc_info.value.retry_after <= 12
 
 class TestImageSaver:
     """اختبارات حافظ الصور"""
@@ -226,6 +708,27 @@ class TestImageSaver:
         assert '!' not in filename
         assert '@' not in filename
     
+    def test_watermark_touches_corner_only(self):
+        """اختبار أن العلامة المائية تغير منطقة الزاوية فقط وتُرسم مرة واحدة"""
+        from PIL import Image
+        from utils.save_image import _watermark_tile, WATERMARK_FONT, WATERMARK_FONT_SIZE, WATERMARK_MARGIN
+        
+        image = Image.new('RGB', (1024, 1024), color='blue')
+        watermarked = ImageSaver._add_watermark(image, "A long prompt")
+        tile = _watermark_tile(WATERMARK_FONT, WATERMARK_FONT_SIZE)
+        
+        assert watermarked.mode == 'RGB' and watermarked.size == (1024, 1024)
+        corner = watermarked.getpixel((1024 - WATERMARK_MARGIN - 2, 1024 - WATERMARK_MARGIN - 2))
+        assert corner != (0, 0, 255)
+        
+        # كل ما خارج منطقة البلاطة يبقى كما هو
+        left = 1024 - WATERMARK_MARGIN - tile.width
+        top = 1024 - WATERMARK_MARGIN - tile.height
+        assert watermarked.crop((0, 0, 1024, top)).getcolors() == [(1024 * top, (0, 0, 255))]
+        assert watermarked.crop((0, 0, left, 1024)).getcolors() == [(left * 1024, (0, 0, 255))]
+        
+        assert _watermark_tile(WATERMARK_FONT, WATERMARK_FONT_SIZE) is tile
+    
     @pytest.mark.asyncio
     async def test_save_image_success(self):
         """اختبار حفظ صورة بنجاح"""
@@ -249,19 +752,183 @@ class TestImageSaver:
         assert filename.endswith('.png')
         assert os.path.exists(os.path.join(self.temp_dir, filename))
     
-    def test_get_storage_info(self):
+    @pytest.mark.asyncio
+    async def test_save_image_webp_encoder(self):
+        """اختبار الحفظ بصيغة WebP بامتدادها الصحيح وتسجيل الصيغة في البيانات الوصفية"""
+        from PIL import Image
+        import io
+        
+        img = Image.new('RGB', (128, 128), color='red')
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='PNG')
+        
+        filename = await self.saver.save_image(
+            image_data=img_bytes.getvalue(),
+            prompt="Test prompt",
+            image_id="webp-123",
+            encoder=OutputEncoder(image_format="webp", quality=80)
+        )
+        
+        assert filename.endswith('.webp')
+        with Image.open(os.path.join(self.temp_dir, filename)) as saved:
+            assert saved.format == 'WEBP'
+        assert self.saver.get_image_metadata("webp-123")["format"] == "webp"
+    
+    def test_output_encoder_params(self):
+        """اختبار معاملات كل صيغة ورفض الصيغ والقيم غير الصالحة"""
+        from PIL import Image
+        
+        assert OutputEncoder().save_params() == {"compress_level": 6}
+        
+        jpeg = OutputEncoder(image_format="jpg", quality=85, effort=0)
+        assert jpeg.extension == ".jpg"
+        assert jpeg.save_params() == {"quality": 85, "optimize": False, "progressive": True}
+        assert jpeg.prepare(Image.new('RGBA', (4, 4))).mode == 'RGB'
+        
+        webp = OutputEncoder().with_overrides(image_format="webp", lossless=True, effort=9)
+        assert webp.save_params()["method"] == 6 and webp.save_params()["lossless"] is True
+        
+        with pytest.raises(ValueError):
+            OutputEncoder(image_format="bmp")
+        with pytest.raises(ValueError):
+            OutputEncoder(quality=0)
+    
+    @pytest.mark.skipif(not is_supported("avif"), reason="Pillow المثبت بدون libavif")
+    def test_output_encoder_avif(self):
+        """اختبار ترميز AVIF عندما يدعمه Pillow المثبت"""
+        from PIL import Image
+        import io
+        
+        encoder = OutputEncoder(image_format="avif", quality=60, effort=3)
+        assert encoder.save_params() == {"quality": 60, "speed": 7}
+        
+        buffer = io.BytesIO()
+        Image.new('RGB', (16, 16), color='red').save(buffer, format=encoder.pil_format, **encoder.save_params())
+        assert Image.open(io.BytesIO(buffer.getvalue())).format == "AVIF"
+    
+    def test_output_encoder_avif_unsupported(self):
+        """اختبار رفض avif في التحقق والرجوع إلى png عند التشغيل إذا لم يدعمه Pillow"""
+        config = Config()
+        config.output_format = "avif"
+        
+        with patch("utils.encoders.is_supported", side_effect=lambda image_format: image_format != "avif"), \
+                patch("utils.config.is_supported", side_effect=lambda image_format: image_format != "avif"):
+            assert OutputEncoder.from_config(config).image_format == "png"
+            assert any("avif" in error for error in config.validate()["errors"])
+    
+    @pytest.mark.asyncio
+    async def test_save_image_from_pipeline(self):
+        """اختبار الحفظ من مسار معالجة مع hash من المخزن المرمّز"""
+        from PIL import Image
+        import io
+        import hashlib
+        
+        img = Image.new('RGB', (256, 256), color='green')
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='PNG')
+        
+        pipeline = ImagePipeline(img_bytes.getvalue())
+        assert pipeline.probe() == ((256, 256), 'PNG')
+        
+        filename = await self.saver.save_image(
+            image_data=pipeline,
+            prompt="Pipeline prompt",
+            image_id="pipeline-123"
+        )
+        
+        with open(os.path.join(self.temp_dir, filename), 'rb') as f:
+            expected_hash = hashlib.md5(f.read()).hexdigest()
+        
+        assert self.saver.metadata["pipeline-123"]["file_hash"] == expected_hash
+        assert pipeline.image is None
+    
+    def test_gallery_pagination(self):
+        """اختبار تقسيم صفحات المعرض بالمؤشر والتصفية حسب النموذج"""
+        for i in range(5):
+            model = "anime" if i % 2 == 0 else "realistic"
+            self.saver._save_image_metadata(f"img{i}.png", "Test", f"id-{i}", (512, 512), "hash", model=model)
+        
+        first_page = self.saver.get_gallery_page(limit=2)
+        assert [image["image_id"] for image in first_page["images"]] == ["id-4", "id-3"]
+        assert first_page["next_cursor"] is not None
+        
+        collected = []
+        cursor = None
+        while True:
+            page = self.saver.get_gallery_page(limit=2, cursor=cursor)
+            collected.extend(image["image_id"] for image in page["images"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert collected == ["id-4", "id-3", "id-2", "id-1", "id-0"]
+        
+        anime = self.saver.get_gallery_page(model="anime")
+        assert [image["image_id"] for image in anime["images"]] == ["id-4", "id-2", "id-0"]
+        
+        self.saver.delete_image("id-4")
+        assert self.saver.get_gallery_page(limit=1)["images"][0]["image_id"] == "id-3"
+        assert self.saver.find_image_id("img3.png") == "id-3"
+    
+    @pytest.mark.asyncio
+    async def test_get_storage_info(self):
         """اختبار معلومات التخزين"""
-        # إنشاء ملف وهمي
+        # إنشاء ملف وهمي خارج ImageSaver (يظهر بعد إعادة المسح)
         test_file = os.path.join(self.temp_dir, "test.png")
         with open(test_file, 'w') as f:
             f.write("test content")
         
+        drift = await self.saver.reconcile_storage()
+        assert drift["drift_files"] == 1
+        
         storage_info = self.saver.get_storage_info()
         
         assert "total_files" in storage_info
         assert storage_info["total_files"] >= 1
         assert "total_size_mb" in storage_info
     
+    @pytest.mark.asyncio
+    async def test_reconcile_keeps_concurrent_updates(self):
+        """اختبار عدم ضياع تحديثات العدادات التي تحدث أثناء المسح في الخلفية"""
+        original_run = self.saver.worker_pool.run
+        
+        async def run_with_concurrent_save(func, *args):
+            result = await original_run(func, *args)
+            # حفظ ينتهي بعد مسح المجلد وقبل استبدال العدادات
+            self.saver._save_image_metadata("late.png", "Test", "id-late", (512, 512), "hash", file_size=700)
+            return result
+        
+        with patch.object(self.saver.worker_pool, "run", side_effect=run_with_concurrent_save):
+            await self.saver.reconcile_storage()
+        
+        info = self.saver.get_storage_info()
+        assert info["total_files"] == 1
+        assert info["total_size_bytes"] == 700
+    
+    def test_storage_counters_incremental(self):
+        """اختبار تحديث العدادات عند الحفظ والحذف دون مسح المجلد"""
+        self.saver._save_image_metadata("a.png", "Test", "id-a", (512, 512), "hash", model="anime", file_size=1000)
+        self.saver._save_image_metadata("b.png", "Test", "id-b", (512, 512), "hash", model="realistic", file_size=500)
+        
+        with patch('os.listdir') as mock_listdir:
+            info = self.saver.get_storage_info()
+            mock_listdir.assert_not_called()
+        
+        assert info["total_files"] == 2
+        assert info["total_size_bytes"] == 1500
+        assert info["by_model"]["anime"] == {"files": 1, "bytes": 1000}
+        assert sum(day["files"] for day in info["by_day"].values()) == 2
+        
+        self.saver.delete_image("id-a")
+        info = self.saver.get_storage_info()
+        assert info["total_size_bytes"] == 500
+        assert "anime" not in info["by_model"]
+        
+        # العدادات تُبنى من سجل البيانات الوصفية عند إعادة التشغيل
+        self.saver.close()
+        reloaded = ImageSaver(self.temp_dir)
+        assert reloaded.get_storage_info()["total_size_bytes"] == 500
+        reloaded.close()
+    
     def test_delete_image_success(self):
         """اختبار حذف صورة بنجاح"""
         # إضافة بيانات وهمية
@@ -306,6 +973,599 @@ class TestImageSaver:
         assert deleted_count >= 1
         assert "old-id" not in self.saver.metadata
 
+class TestResultCache:
+    """اختبارات كاش النتائج"""
+    
+    def setup_method(self):
+        """إعداد الاختبارات"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResultCache(self.temp_dir, max_entries=2)
+    
+    def teardown_method(self):
+        """تنظيف الاختبارات"""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_make_key_deterministic(self):
+        """اختبار ثبات المفتاح وتغيره مع seed"""
+        args = ("model", "prompt", "neg", 512, 512, 20, 7.5)
+        
+        assert ResultCache.make_key(*args, 1) == ResultCache.make_key(*args, 1)
+        assert ResultCache.make_key(*args, 1) != ResultCache.make_key(*args, 2)
+    
+    def test_memory_lru_eviction(self):
+        """اختبار إخراج الأقدم من الذاكرة"""
+        self.cache.enable_disk = False
+        self.cache.put("a", b"1")
+        self.cache.put("b", b"2")
+        self.cache.get("a")
+        self.cache.put("c", b"3")
+        
+        assert self.cache.get("b") is None
+        assert self.cache.get("a") == b"1"
+        assert self.cache.get_stats()["evictions"] == 1
+    
+    def test_disk_tier(self):
+        """اختبار الاسترجاع من القرص بعد تفريغ الذاكرة"""
+        self.cache.put("key", b"image")
+        self.cache.clear()
+        
+        assert self.cache.get("key") == b"image"
+        assert self.cache.get("missing") is None
+        
+        stats = self.cache.get_stats()
+        assert stats["disk_hits"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["miss_rate"] == 0.5
+    
+    @pytest.mark.asyncio
+    async def test_async_disk_io_off_event_loop(self):
+        """اختبار أن قراءة وكتابة القرص في الواجهة غير المتزامنة تجري خارج خيط حلقة الأحداث"""
+        import threading
+        loop_thread = threading.get_ident()
+        threads = []
+        
+        read_disk, write_disk = self.cache._read_disk, self.cache._write_disk
+        
+        def tracked_read(key):
+            threads.append(threading.get_ident())
+            return read_disk(key)
+        
+        def tracked_write(key, data):
+            threads.append(threading.get_ident())
+            write_disk(key, data)
+        
+        self.cache._read_disk, self.cache._write_disk = tracked_read, tracked_write
+        
+        await self.cache.put_async("key", b"image")
+        self.cache.clear()
+        
+        assert await self.cache.get_async("key") == b"image"
+        assert await self.cache.get_async("key") == b"image"
+        assert await self.cache.get_async("missing") is None
+        assert len(threads) == 3
+        assert loop_thread not in threads
+        
+        stats = self.cache.get_stats()
+        assert stats["disk_hits"] == 1
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+    
+    def test_disk_tier_size_limit(self):
+        """اختبار حذف الأقدم استخداماً عند تجاوز حد القرص"""
+        cache = ResultCache(self.temp_dir, max_entries=1, max_disk_mb=1)
+        cache.max_disk_bytes = 10
+        
+        cache.put("old", b"12345")
+        os.utime(cache._disk_path("old"), (1, 1))
+        cache.put("new", b"67890")
+        cache.put("newest", b"abc")
+        
+        assert not os.path.exists(cache._disk_path("old"))
+        assert os.path.exists(cache._disk_path("newest"))
+        assert cache.get_stats()["disk_evictions"] == 1
+    
+    def test_disk_tier_outside_output_dir(self):
+        """اختبار أن كاش القرص (صور بلا علامة مائية) خارج مجلد الإخراج المنشور"""
+        config = Config()
+        generator = ImageGenerator(config)
+        
+        cache_path = os.path.abspath(generator.result_cache.cache_dir)
+        output_path = os.path.abspath(config.output_dir)
+        assert os.path.commonpath([cache_path, output_path]) != output_path
+        
+        config.result_cache_dir = os.path.join(config.output_dir, "cache")
+        assert "Result cache directory must be outside output_dir" in config.validate()["errors"]
+
+class TestSingleFlight:
+    """اختبارات دمج الطلبات المتطابقة"""
+    
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_call(self):
+        """اختبار مشاركة الطلبات المتزامنة في استدعاء واحد"""
+        flight = SingleFlight()
+        calls = []
+        
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"image_id": "shared-id", "filename": "shared.png"}
+        
+        results = await asyncio.gather(*[flight.do("key", factory) for _ in range(5)])
+        
+        assert len(calls) == 1
+        assert all(result["image_id"] == "shared-id" for result in results)
+        assert flight.get_stats()["upstream_calls_saved"] == 4
+        assert flight.get_stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_all_waiters(self):
+        """اختبار وصول الخطأ لجميع المنتظرين"""
+        flight = SingleFlight()
+        
+        async def factory():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+        
+        results = await asyncio.gather(
+            flight.do("key", factory), flight.do("key", factory),
+            return_exceptions=True
+        )
+        
+        assert all(isinstance(result, ValueError) for result in results)
+
+class TestWorkerPool:
+    """اختبارات مجمع المعالجة"""
+    
+    @pytest.mark.asyncio
+    async def test_run_in_thread_pool(self):
+        """اختبار تنفيذ مهمة خارج حلقة الأحداث"""
+        pool = WorkerPool(max_workers=2, max_queue=2)
+        
+        try:
+            result = await pool.run(sum, [1, 2, 3])
+            
+            assert result == 6
+            stats = pool.get_stats()
+            assert stats["completed"] == 1
+            assert stats["pending"] == 0
+        finally:
+            pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self):
+        """اختبار الرفض عند امتلاء الطابور"""
+        import time
+        pool = WorkerPool(max_workers=1, max_queue=1)
+        
+        try:
+            results = await asyncio.gather(
+                *[pool.run(time.sleep, 0.05) for _ in range(3)],
+                return_exceptions=True
+            )
+            
+            assert sum(isinstance(result, WorkerPoolFull) for result in results) == 1
+            assert pool.get_stats()["rejected"] == 1
+            assert pool.get_stats()["peak_pending"] == 2
+        finally:
+            pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_run_in_process_pool(self):
+        """اختبار التنفيذ في مجمع العمليات"""
+        pool = WorkerPool(mode="process", max_workers=1, max_queue=1)
+        
+        try:
+            assert await pool.run(pow, 2, 10) == 1024
+        finally:
+            pool.shutdown()
+
+class TestMetadataStore:
+    """اختبارات سجل البيانات الوصفية"""
+    
+    def setup_method(self):
+        """إعداد الاختبارات"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def teardown_method(self):
+        """تنظيف الاختبارات"""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_append_and_reload(self):
+        """اختبار إعادة بناء البيانات من السجل"""
+        store = MetadataStore(self.temp_dir)
+        store.put("a", {"filename": "a.png"})
+        store.put("b", {"filename": "b.png"})
+        store.delete("a")
+        store.close()
+        
+        entries = MetadataStore(self.temp_dir).load()
+        
+        assert entries == {"b": {"filename": "b.png"}}
+    
+    def test_truncated_tail_is_repaired(self):
+        """اختبار تجاهل السطر غير المكتمل بعد انقطاع مفاجئ"""
+        store = MetadataStore(self.temp_dir)
+        store.put("a", {"filename": "a.png"})
+        store.close()
+        with open(store.log_path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "put", "id": "b", "da')
+        
+        store = MetadataStore(self.temp_dir)
+        assert store.load() == {"a": {"filename": "a.png"}}
+        store.put("c", {"filename": "c.png"})
+        store.close()
+        
+        assert set(MetadataStore(self.temp_dir).load()) == {"a", "c"}
+    
+    def test_import_legacy_json(self):
+        """اختبار استيراد metadata.json عند أول تشغيل"""
+        with open(os.path.join(self.temp_dir, "metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump({"old-id": {"filename": "old.png"}}, f)
+        
+        saver = ImageSaver(self.temp_dir)
+        
+        assert "old-id" in saver.metadata
+        assert os.path.exists(saver.metadata_store.log_path)
+        saver.close()
+    
+    def test_compaction(self):
+        """اختبار ضغط السجل عند تراكم التحديثات"""
+        store = MetadataStore(self.temp_dir, min_compact_records=5)
+        entries = {"a": {"filename": "a.png"}}
+        for _ in range(6):
+            store.put("a", entries["a"])
+        
+        assert store.maybe_compact(entries) is True
+        assert store.get_stats()["log_records"] == 1
+        assert MetadataStore(self.temp_dir).load() == entries
+
+class TestJobQueue:
+    """اختبارات طابور المهام"""
+    
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        """اختبار تنفيذ المهام الأعلى أولوية أولاً"""
+        order = []
+        
+        async def handler(job):
+            order.append(job.payload)
+            return {"done": job.payload}
+        
+        queue = JobQueue(handler, workers=1, max_queue=10)
+        queue.submit("low", priority=0)
+        queue.submit("high", priority=5)
+        job = queue.submit("normal", priority=1)
+        
+        for _ in range(100):
+            if job.finished and len(order) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        
+        assert order == ["high", "normal", "low"]
+        assert queue.get(job.id).result == {"done": "normal"}
+    
+    @pytest.mark.asyncio
+    async def test_queue_full(self):
+        """اختبار الرفض مع Retry-After عند امتلاء الطابور"""
+        async def handler(job):
+            await asyncio.sleep(1)
+        
+        queue = JobQueue(handler, workers=1, max_queue=1)
+        queue.submit("a")
+        await asyncio.sleep(0.01)  # العامل يسحب المهمة الأولى
+        queue.submit("b")
+        
+        with pytest.raises(QueueFull) as exc_info:
+            queue.submit("c")
+        
+        assert exc_info.value.retry_after >= 1
+        assert queue.get_stats()["rejected"] == 1
+        await queue.stop()
+    
+    def test_evict_expired_skips_unfinished(self):
+        """اختبار حذف المهام المنتهية بترتيب انتهائها دون المساس بمهمة قيد التنفيذ"""
+        import time
+        
+        async def handler(job):
+            return {}
+        
+        queue = JobQueue(handler, workers=1, result_ttl=60)
+        running, expired, fresh = Job("running"), Job("expired"), Job("fresh")
+        running.status = "running"
+        expired.status, expired.finished_at = "completed", time.time() - 120
+        fresh.status, fresh.finished_at = "failed", time.time()
+        for job in (running, expired, fresh):
+            queue.jobs[job.id] = job
+        for job in (expired, fresh):
+            queue._finished.append((job.finished_at, job.id))
+        
+        queue._evict_expired()
+        
+        assert set(queue.jobs) == {running.id, fresh.id}
+        assert list(queue._finished) == [(fresh.finished_at, fresh.id)]
+
+class TestAdmissionController:
+    """اختبارات التحكم بالقبول"""
+    
+    @pytest.mark.asyncio
+    async def test_queue_and_handoff(self):
+        """اختبار الانتظار في الطابور ثم تسلم الخانة عند تحريرها"""
+        admission = AdmissionController(max_concurrency=1, max_queue=1, initial_service_time=0.01)
+        await admission.acquire("sdxl")
+        
+        waiter = asyncio.create_task(admission.acquire("sdxl", Deadline(5)))
+        await asyncio.sleep(0.01)
+        assert admission.get_stats()["models"]["sdxl"]["queue_depth"] == 1
+        
+        # الطابور ممتلئ
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await admission.acquire("sdxl", Deadline(5))
+        assert exc_info.value.status_code == 429
+        
+        admission.release("sdxl", 0.01)
+        await asyncio.wait_for(waiter, timeout=1)
+        
+        stats = admission.get_stats()["models"]["sdxl"]
+        assert stats["active"] == 1
+        assert stats["rejected_queue_full"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_reject_when_wait_exceeds_deadline(self):
+        """اختبار الرفض بـ 503 عندما يتجاوز الانتظار المقدر الوقت المتبقي"""
+        admission = AdmissionController(max_concurrency=1, max_queue=10, initial_service_time=30)
+        
+        async with admission.slot("sdxl"):
+            with pytest.raises(AdmissionRejected) as exc_info:
+                await admission.acquire("sdxl", Deadline(5))
+        
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.retry_after >= 30
+        assert admission.get_stats()["models"]["sdxl"]["active"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_slot_released_while_paused(self):
+        """اختبار تحرير الخانة أثناء انتظار تحميل النموذج وإعادة حجزها بعده"""
+        admission = AdmissionController(max_concurrency=1, max_queue=10, initial_service_time=0.01)
+        
+        async with admission.slot("sdxl") as slot:
+            async with slot.paused():
+                # طلب آخر يأخذ الخانة أثناء الانتظار
+                async with admission.slot("sdxl", Deadline(5)):
+                    assert admission.get_stats()["models"]["sdxl"]["active"] == 1
+            assert admission.get_stats()["models"]["sdxl"]["active"] == 1
+        
+        stats = admission.get_stats()["models"]["sdxl"]
+        assert stats["active"] == 0
+        assert stats["paused"] == 1
+        
+        # فشل الانتظار (مثل انتهاء المهلة) لا يعيد الحجز ولا يحرر الخانة مرتين
+        with pytest.raises(DeadlineExceeded):
+            async with admission.slot("sdxl") as slot:
+                async with slot.paused():
+                    raise DeadlineExceeded("model_loading", 5)
+        assert admission.get_stats()["models"]["sdxl"]["active"] == 0
+
+class TestAdaptiveLimiter:
+    """اختبارات حد التزامن التكيفي"""
+    
+    def test_additive_increase_multiplicative_decrease(self):
+        """اختبار الزيادة التدريجية مع النجاح والتخفيض عند الحمل الزائد"""
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=8, initial_limit=2)
+        for _ in range(10):
+            limiter.on_success("sdxl", 1.0)
+        assert limiter.limit("sdxl") > 2
+        
+        before = limiter.limit("sdxl")
+        limiter.on_overload("sdxl", "503")
+        limiter.on_overload("sdxl", "503")  # ضمن مهلة التهدئة
+        
+        assert limiter.limit("sdxl") == before // 2
+        assert limiter.get_stats()["endpoints"]["sdxl"]["decreases"] == 1
+    
+    def test_latency_spike_decreases(self):
+        """اختبار التخفيض عند ارتفاع زمن الاستجابة عن خط الأساس"""
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=8, initial_limit=4, min_samples=3)
+        for _ in range(3):
+            limiter.on_success("sdxl", 0.001)
+        before = limiter.limit("sdxl")
+        limiter.on_success("sdxl", 10.0)
+        
+        assert limiter.limit("sdxl") < before
+        assert limiter.get_stats()["endpoints"]["sdxl"]["latency_spikes"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_admission_follows_limit(self):
+        """اختبار قبول المنتظرين عند ارتفاع الحد التكيفي"""
+        limiter = AdaptiveLimiter(min_limit=1, max_limit=4, initial_limit=1)
+        admission = AdmissionController(max_concurrency=4, max_queue=4, initial_service_time=0.01,
+                                        limit_provider=limiter.limit)
+        await admission.acquire("sdxl")
+        waiters = [asyncio.create_task(admission.acquire("sdxl", Deadline(5))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert admission.get_stats()["models"]["sdxl"]["queue_depth"] == 2
+        
+        for _ in range(3):
+            limiter.on_success("sdxl", 0.01)
+        admission.release("sdxl", 0.01)
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout=1)
+        
+        assert admission.get_stats()["models"]["sdxl"]["active"] == 2
+
+class TestCircuitBreaker:
+    """اختبارات قاطع الدائرة"""
+    
+    def test_opens_on_error_rate(self):
+        """اختبار الفتح عند تجاوز نسبة الفشل"""
+        breaker = CircuitBreaker("sdxl", failure_threshold=0.5, min_requests=4)
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow() is False
+    
+    def test_half_open_probe(self):
+        """اختبار السماح بطلب تجريبي واحد بعد مهلة الفتح ثم الإغلاق عند نجاحه"""
+        breaker = CircuitBreaker("sdxl", min_requests=1, open_seconds=0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        
+        assert breaker.allow() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow() is False
+        
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+class TestHedgePolicy:
+    """اختبارات طلبات التحوط"""
+    
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_cancels_primary(self):
+        """اختبار فوز طلب التحوط وإلغاء المحاولة البطيئة"""
+        policy = HedgePolicy(enabled=True, max_ratio=1.0, min_samples=1)
+        policy.record_latency("sdxl", 0.01)
+        cancelled = []
+        
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+                return "slow"
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        
+        async def fast():
+            return "fast"
+        
+        result = await policy.run("sdxl", slow, fast)
+        
+        assert result == "fast"
+        assert cancelled == [True]
+        stats = policy.get_stats()
+        assert stats["hedges_fired"] == 1
+        assert stats["hedges_won"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_hedge_rate_cap(self):
+        """اختبار عدم التحوط عند تجاوز النسبة المسموحة"""
+        policy = HedgePolicy(enabled=True, max_ratio=0.0, min_samples=1)
+        policy.record_latency("sdxl", 0.001)
+        hedge = AsyncMock(return_value="hedge")
+        
+        async def primary():
+            await asyncio.sleep(0.02)
+            return "primary"
+        
+        assert await policy.run("sdxl", primary, hedge) == "primary"
+        hedge.assert_not_called()
+        assert policy.get_stats()["hedges_capped"] == 1
+
+class TestBackends:
+    """اختبارات خلفيات التوليد"""
+    
+    def test_replica_least_outstanding_and_ejection(self):
+        """اختبار اختيار النسخة الأقل انشغالاً واستبعاد النسخة الفاشلة"""
+        backend = HTTPReplicaBackend(
+            ["http://replica-a", "http://replica-b"], HTTPClientPool, failure_threshold=2
+        )
+        replica_a, replica_b = backend.replicas
+        replica_a.outstanding = 3
+        assert backend.select() is replica_b
+        
+        backend._record(replica_b, ok=False)
+        backend._record(replica_b, ok=False)
+        
+        assert backend.select() is replica_a
+        assert backend.get_stats()["replicas"][1]["healthy"] is False
+    
+    @pytest.mark.asyncio
+    async def test_replica_probe_statuses(self):
+        """اختبار أن فحص النسخ يعيد False عند حالة غير ناجحة و None عند تعذر الوصول"""
+        backend = HTTPReplicaBackend(["http://replica-a"], HTTPClientPool)
+        replica = backend.replicas[0]
+        
+        def session_with(status=None, error=None):
+            response = Mock(status=status)
+            request = AsyncMock()
+            request.__aenter__.return_value = response
+            request.__aenter__.side_effect = error
+            session = Mock()
+            session.get.return_value = request
+            return Mock(return_value=session)
+        
+        with patch.object(replica.http_client, "get_session", session_with(status=503)):
+            assert await backend.probe("model", timeout=None) is False
+        with patch.object(replica.http_client, "get_session", session_with(error=OSError("refused"))):
+            assert await backend.probe("model", timeout=None) is None
+        with patch.object(replica.http_client, "get_session", session_with(status=200)):
+            assert await backend.probe("model", timeout=None) is True
+        
+        assert replica.stats["failures"] == 2
+    
+    def test_inference_backend_is_abstract(self):
+        """اختبار أن الخلفية الأساسية لا تُنشأ دون post و probe"""
+        from utils.backends import InferenceBackend
+        
+        with pytest.raises(TypeError):
+            InferenceBackend()
+    
+    @pytest.mark.asyncio
+    async def test_stub_backend_full_stack(self):
+        """اختبار توليد وحفظ صورة حتمية عبر الخلفية المحلية دون شبكة"""
+        config = Config()
+        config.inference_backend = "stub"
+        config.enable_result_cache = False
+        generator = ImageGenerator(config)
+        assert isinstance(generator.backend, StubBackend)
+        
+        first = await generator.generate_image("A lighthouse", width=64, height=64, seed=7)
+        second = await generator.generate_image("A lighthouse", width=64, height=64, seed=7)
+        
+        assert first == second
+        assert ImagePipeline(first).probe()[0] == (64, 64)
+        assert generator.backend.get_stats()["requests"] == 2
+        assert generator.health.state("stable-diffusion-xl") == "warm"
+
+class TestProgressBroker:
+    """اختبارات بث أحداث التقدم"""
+    
+    @pytest.mark.asyncio
+    async def test_late_subscriber_gets_history(self):
+        """اختبار حصول المشترك المتأخر على الأحداث السابقة حتى الحدث النهائي"""
+        broker = ProgressBroker()
+        progress = broker.reporter("job-1")
+        progress("queued", queue_position=1)
+        progress("upstream_sent", attempt=1)
+        
+        received = []
+        
+        async def consume():
+            async for message in broker.stream("job-1", keepalive=0.05):
+                received.append(message["event"] if message else None)
+        
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.01)
+        progress("completed", result={"filename": "a.png"})
+        await asyncio.wait_for(consumer, timeout=1)
+        
+        assert received == ["queued", "upstream_sent", "completed"]
+        assert broker.get_stats()["subscribers"] == 0
+    
+    def test_channel_limit(self):
+        """اختبار إخراج أقدم القنوات عند تجاوز الحد"""
+        broker = ProgressBroker(max_channels=2)
+        for channel_id in ("a", "b", "c"):
+            broker.publish(channel_id, "queued")
+        
+        assert not broker.has_channel("a")
+        assert broker.has_channel("c")
+
 class TestConfig:
     """اختبارات الإعدادات"""
     
@@ -369,6 +1629,205 @@ class TestConfig:
         finally:
             os.unlink(temp_file.name)
 
+class TestThumbnailCache:
+    """اختبارات النسخ المصغرة"""
+    
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.thumbnails = ThumbnailCache(self.temp_dir, sizes=[128, 256], eager_sizes=[128])
+    
+    def teardown_method(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _write_image(self, filename, size):
+        from PIL import Image
+        path = os.path.join(self.temp_dir, filename)
+        Image.new('RGB', size, color='purple').save(path, format='PNG')
+        return path
+    
+    @pytest.mark.asyncio
+    async def test_generate_once_then_serve_from_disk(self):
+        """اختبار توليد النسخة عند أول طلب وتقديمها من القرص بعد ذلك"""
+        from PIL import Image
+        source = self._write_image("photo.png", (512, 384))
+        
+        first = await self.thumbnails.get(source, "photo.png", 200)
+        second = await self.thumbnails.get(source, "photo.png", 256)
+        
+        assert first == second == self.thumbnails.path_for("photo.png", 256)
+        with Image.open(first) as thumbnail:
+            assert thumbnail.size == (256, 192)
+            assert thumbnail.format == 'WEBP'
+        assert self.thumbnails.stats["generated"] == 1
+        assert self.thumbnails.stats["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_small_image_served_as_original(self):
+        """اختبار تقديم الأصل عندما لا يكون أعرض من المقاس المطلوب"""
+        source = self._write_image("small.png", (100, 100))
+        
+        assert await self.thumbnails.get(source, "small.png", 128) == source
+        assert not os.path.exists(self.thumbnails.path_for("small.png", 128))
+        
+        # عرض الأصل محفوظ فلا يُرسل الطلب التالي لمجمع المعالجة
+        with patch.object(self.thumbnails.worker_pool, "run") as mock_run:
+            assert await self.thumbnails.get(source, "small.png", 256) == source
+            mock_run.assert_not_called()
+        assert self.thumbnails.stats["originals"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_eager_thumbnails_on_save_and_delete(self):
+        """اختبار توليد النسخ المصغرة مع الحفظ وحذفها مع الصورة"""
+        from PIL import Image
+        import io
+        
+        saver = ImageSaver(self.temp_dir, thumbnails=self.thumbnails)
+        buffer = io.BytesIO()
+        Image.new('RGB', (512, 512), color='orange').save(buffer, format='PNG')
+        
+        filename = await saver.save_image(buffer.getvalue(), "A sunset", "thumb-123")
+        thumbnail_path = self.thumbnails.path_for(filename, 128)
+        
+        assert os.path.exists(thumbnail_path)
+        page = saver.get_gallery_page()
+        assert page["images"][0]["thumbnail_url"] == f"/image/{filename}?w=128"
+        
+        assert saver.delete_image("thumb-123")
+        assert not os.path.exists(thumbnail_path)
+        saver.close()
+
+class TestHttpCache:
+    """اختبارات ترويسات التخزين المؤقت ونطاقات البايتات"""
+    
+    def test_parse_range(self):
+        """اختبار نطاقات البايتات المدعومة"""
+        assert parse_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_range("bytes=900-", 1000) == (900, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=0-5000", 1000) == (0, 999)
+        
+        # النطاقات المتعددة أو غير المفهومة تعيد الملف كاملاً
+        assert parse_range("bytes=0-1,5-6", 1000) is None
+        assert parse_range("items=0-1", 1000) is None
+        
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+    
+    def test_etag_matches(self):
+        """اختبار مقارنة If-None-Match"""
+        assert etag_matches('"a", W/"b"', '"b"')
+        assert etag_matches("*", '"x"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+class TestBatchCLI:
+    """اختبارات أداة التوليد الدفعي من ملف JSONL"""
+    
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.temp_dir, "prompts.jsonl")
+        self.results_path = os.path.join(self.temp_dir, "results.jsonl")
+        self.checkpoint_path = os.path.join(self.temp_dir, "prompts.checkpoint.json")
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": "A red cube", "width": 64, "height": 64, "seed": 1}) + "\n")
+            f.write("not json\n")
+            f.write("\n")
+            f.write(json.dumps({"prompt": "A blue sphere", "width": 64, "height": 64, "seed": 2}) + "\n")
+        
+        self.config = Config()
+        self.config.inference_backend = "stub"
+        self.config.enable_result_cache = False
+        self.config.output_dir = os.path.join(self.temp_dir, "output")
+    
+    def teardown_method(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _read_results(self):
+        with open(self.results_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    
+    def test_checkpoint_watermark(self):
+        """اختبار تقدم watermark عند اكتمال الأسطر بغير ترتيبها"""
+        from batch_generate import BatchCheckpoint
+        checkpoint = BatchCheckpoint(self.checkpoint_path)
+        checkpoint.mark_done(2)
+        checkpoint.mark_done(0)
+        assert checkpoint.watermark == 1
+        assert checkpoint.is_done(2) and not checkpoint.is_done(1)
+        
+        checkpoint.mark_done(1)
+        checkpoint.save()
+        
+        reloaded = BatchCheckpoint(self.checkpoint_path).load()
+        assert reloaded.watermark == 3
+        assert reloaded.done_above == set()
+    
+    @pytest.mark.asyncio
+    async def test_run_batch_writes_results_and_summary(self):
+        """اختبار كتابة سطر نتيجة لكل طلب وملخص الإنتاجية"""
+        from batch_generate import run_batch
+        summary = await run_batch(self.input_path, self.results_path, self.checkpoint_path, 2, self.config)
+        
+        results = {item["line"]: item for item in self._read_results()}
+        assert set(results) == {0, 1, 3}
+        assert results[0]["success"] and results[3]["success"]
+        assert os.path.exists(os.path.join(self.config.output_dir, results[0]["filename"]))
+        assert results[1]["success"] is False
+        
+        assert summary["completed"] == 2
+        assert summary["failed"] == 1
+        assert summary["latency_ms"]["p50"] is not None
+    
+    @pytest.mark.asyncio
+    async def test_run_batch_retries_failed_lines(self):
+        """اختبار تسجيل الأسطر غير الصالحة مكتملة وإعادة محاولة فشل التوليد فقط عند الاستئناف"""
+        from batch_generate import run_batch, BatchCheckpoint
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": "A red cube", "width": "wide"}) + "\n")
+            f.write(json.dumps({"prompt": "A broken upstream", "width": 64, "height": 64}) + "\n")
+            f.write(json.dumps({"prompt": "A blue sphere", "width": 64, "height": 64, "seed": 2}) + "\n")
+        
+        original = ImageGenerator.generate_image
+        
+        async def flaky_generate(generator, prompt, **kwargs):
+            if prompt.startswith("A broken"):
+                return None
+            return await original(generator, prompt, **kwargs)
+        
+        with patch.object(ImageGenerator, "generate_image", flaky_generate):
+            summary = await run_batch(self.input_path, self.results_path, self.checkpoint_path, 1, self.config)
+            
+            assert summary["failed"] == 2
+            results = {item["line"]: item for item in self._read_results()}
+            assert "width" in results[0]["error"] and results[0]["retryable"] is False
+            assert results[1]["retryable"] is True
+            checkpoint = BatchCheckpoint(self.checkpoint_path).load()
+            assert checkpoint.is_done(0) and not checkpoint.is_done(1) and checkpoint.is_done(2)
+            
+            summary = await run_batch(self.input_path, self.results_path, self.checkpoint_path, 1, self.config)
+        
+        assert summary["skipped"] == 2
+        assert summary["failed"] == 1
+        assert [item["line"] for item in self._read_results()][-1] == 1
+    
+    @pytest.mark.asyncio
+    async def test_run_batch_resumes_from_checkpoint(self):
+        """اختبار تخطي الأسطر المكتملة عند إعادة التشغيل"""
+        from batch_generate import run_batch, BatchCheckpoint
+        checkpoint = BatchCheckpoint(self.checkpoint_path)
+        checkpoint.mark_done(0)
+        checkpoint.mark_done(1)
+        checkpoint.save()
+        
+        summary = await run_batch(self.input_path, self.results_path, self.checkpoint_path, 2, self.config)
+        
+        assert summary["skipped"] == 2
+        assert summary["completed"] == 1
+        assert [item["line"] for item in self._read_results()] == [3]
+        assert BatchCheckpoint(self.checkpoint_path).load().watermark == 4
+
 # اختبارات التكامل
 class TestIntegration:
     """اختبارات التكامل"""
@@ -0,0 +1,130 @@
+import time
+import logging
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class _EndpointState:
+    """حالة الحد التكيفي لنقطة نهاية واحدة"""
+    def __init__(self, initial_limit: float):
+        self.limit = initial_limit
+        self.baseline_latency: Optional[float] = None
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.stats = {
+            "successes": 0,
+            "overloads": 0,
+            "latency_spikes": 0,
+            "increases": 0,
+            "decreases": 0
+        }
+
+class AdaptiveLimiter:
+    """
+    حد تزامن تكيفي (AIMD) لكل نقطة نهاية لخدمة التوليد
+
+    يزيد الحد بمقدار ثابت لكل نافذة من الطلبات الناجحة، ويقسمه عند 503 أو
+    "loading" أو ارتفاع زمن الاستجابة عن خط الأساس، مع مهلة تهدئة حتى لا
+    تؤدي موجة أخطاء واحدة إلى عدة تخفيضات متتالية.
+    """
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 4,
+        initial_limit: int = 2,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        min_samples: int = 5
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.initial_limit = max(min_limit, min(initial_limit, max_limit))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.min_samples = min_samples
+        self._endpoints: Dict[str, _EndpointState] = {}
+
+    @classmethod
+    def from_config(cls, config) -> "AdaptiveLimiter":
+        """إنشاء الحد التكيفي من إعدادات التطبيق"""
+        return cls(
+            min_limit=config.upstream_min_concurrency,
+            max_limit=config.admission_max_concurrency,
+            initial_limit=config.upstream_initial_concurrency,
+            latency_tolerance=config.upstream_latency_tolerance
+        )
+
+    def _state(self, key: str) -> _EndpointState:
+        state = self._endpoints.get(key)
+        if state is None:
+            state = _EndpointState(float(self.initial_limit))
+            self._endpoints[key] = state
+        return state
+
+    def limit(self, key: str) -> int:
+        """الحد الحالي لعدد الطلبات الجارية"""
+        return int(self._state(key).limit)
+
+    def on_success(self, key: str, latency: float):
+        """تسجيل استجابة ناجحة وزمنها"""
+        state = self._state(key)
+        state.stats["successes"] += 1
+
+        spike = (
+            state.baseline_latency is not None
+            and state.samples >= self.min_samples
+            and latency > self.latency_tolerance * state.baseline_latency
+        )
+
+        if spike:
+            state.stats["latency_spikes"] += 1
+            self._decrease(key, state, "latency")
+        else:
+            # زيادة بمقدار increase لكل نافذة كاملة من الطلبات
+            previous = int(state.limit)
+            state.limit = min(float(self.max_limit), state.limit + self.increase / max(state.limit, 1.0))
+            if int(state.limit) > previous:
+                state.stats["increases"] += 1
+
+        # خط الأساس متوسط متحرك بطيء حتى لا تبتلعه القفزات
+        if state.baseline_latency is None:
+            state.baseline_latency = latency
+        else:
+            state.baseline_latency = 0.9 * state.baseline_latency + 0.1 * latency
+        state.samples += 1
+
+    def on_overload(self, key: str, reason: str):
+        """تسجيل إشارة حمل زائد من الخدمة (503، loading، انتهاء مهلة)"""
+        state = self._state(key)
+        state.stats["overloads"] += 1
+        self._decrease(key, state, reason)
+
+    def _decrease(self, key: str, state: _EndpointState, reason: str):
+        now = time.monotonic()
+        cooldown = max(1.0, state.baseline_latency or 0.0)
+        if now - state.last_decrease < cooldown:
+            return
+
+        state.limit = max(float(self.min_limit), state.limit * self.decrease_factor)
+        state.last_decrease = now
+        state.stats["decreases"] += 1
+        logger.warning(f"تم خفض حد التزامن لـ {key} إلى {int(state.limit)} ({reason})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        الحد الحالي وخط الأساس لكل نقطة نهاية
+        """
+        return {
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "endpoints": {
+                key: {
+                    **state.stats,
+                    "limit": int(state.limit),
+                    "baseline_latency_seconds": round(state.baseline_latency, 3) if state.baseline_latency else None
+                }
+                for key, state in self._endpoints.items()
+            }
+        }
@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Callable
+
+from utils.deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """
+    رفض الطلب مبكراً بسبب الحمل الزائد
+    """
+    def __init__(self, model: str, reason: str, status_code: int, retry_after: int):
+        self.model = model
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"تم رفض الطلب للنموذج {model} ({reason})، أعد المحاولة بعد {retry_after} ثانية")
+
+class _ModelGate:
+    """حالة التحكم بالقبول لنموذج واحد"""
+    def __init__(self, initial_service_time: float):
+        self.active = 0
+        self.waiters: deque = deque()
+        self.avg_service_time = initial_service_time
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "timed_out": 0,
+            "paused": 0
+        }
+
+class _Slot:
+    """مدير سياق لخانة تنفيذ مقبولة"""
+    def __init__(self, controller: "AdmissionController", model: str, deadline: Optional[Deadline]):
+        self.controller = controller
+        self.model = model
+        self.deadline = deadline
+        self.started_at = 0.0
+        self.service_time = 0.0
+        self.held = False
+
+    async def __aenter__(self):
+        await self.controller.acquire(self.model, self.deadline)
+        self.started_at = time.monotonic()
+        self.held = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.held:
+            self.held = False
+            self.controller.release(self.model, self.service_time + time.monotonic() - self.started_at)
+        return False
+
+    @contextlib.asynccontextmanager
+    async def paused(self):
+        """
+        تحرير الخانة أثناء انتظار لا يشغل خدمة التوليد (تحميل النموذج أو Retry-After)
+        ثم إعادة حجزها؛ مدة الانتظار لا تُحسب في متوسط زمن الخدمة
+        """
+        self.service_time += time.monotonic() - self.started_at
+        self.held = False
+        self.controller.release(self.model)
+        self.controller._gate(self.model).stats["paused"] += 1
+        yield
+        await self.controller.acquire(self.model, self.deadline)
+        self.started_at = time.monotonic()
+        self.held = True
+
+class AdmissionController:
+    """
+    حد تزامن لكل نموذج مع طابور انتظار محدود
+
+    يُرفض الطلب فوراً (429) إذا امتلأ الطابور، أو (503) إذا كان الانتظار المقدر
+    أطول من الوقت المتبقي في ميزانيته، بدل أن يتراكم على خدمة التوليد.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 16,
+        initial_service_time: float = 20.0,
+        limit_provider: Optional[Callable[[str], int]] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.initial_service_time = initial_service_time
+        # مصدر اختياري لحد متغير لكل نموذج (مثل AdaptiveLimiter.limit)
+        self.limit_provider = limit_provider
+        self._gates: Dict[str, _ModelGate] = {}
+
+    @classmethod
+    def from_config(cls, config, limit_provider: Optional[Callable[[str], int]] = None) -> "AdmissionController":
+        """إنشاء المتحكم من إعدادات التطبيق"""
+        return cls(
+            max_concurrency=config.admission_max_concurrency,
+            max_queue=config.admission_max_queue,
+            limit_provider=limit_provider
+        )
+
+    def _gate(self, model: str) -> _ModelGate:
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = _ModelGate(self.initial_service_time)
+            self._gates[model] = gate
+        return gate
+
+    def concurrency(self, model: str) -> int:
+        """حد التزامن الحالي للنموذج"""
+        if self.limit_provider is None:
+            return self.max_concurrency
+        return max(1, min(self.max_concurrency, self.limit_provider(model)))
+
+    def estimate_wait(self, model: str) -> float:
+        """تقدير زمن انتظار طلب جديد بالثواني"""
+        gate = self._gate(model)
+        limit = self.concurrency(model)
+        if gate.active < limit and not gate.waiters:
+            return 0.0
+        return (len(gate.waiters) + 1) * gate.avg_service_time / limit
+
+    def slot(self, model: str, deadline: Optional[Deadline] = None) -> _Slot:
+        """
+        الاستخدام: async with admission.slot(model, deadline): ...
+        """
+        return _Slot(self, model, deadline)
+
+    async def acquire(self, model: str, deadline: Optional[Deadline] = None):
+        """حجز خانة تنفيذ أو الانتظار في الطابور أو الرفض"""
+        gate = self._gate(model)
+
+        if gate.active < self.concurrency(model) and not gate.waiters:
+            gate.active += 1
+            gate.stats["admitted"] += 1
+            return
+
+        estimated_wait = self.estimate_wait(model)
+        retry_after = max(1, math.ceil(estimated_wait))
+
+        if len(gate.waiters) >= self.max_queue:
+            gate.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(model, "queue_full", 429, retry_after)
+
+        if deadline is not None and estimated_wait >= deadline.remaining():
+            gate.stats["rejected_deadline"] += 1
+            raise AdmissionRejected(model, "deadline", 503, retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        gate.waiters.append(waiter)
+        gate.stats["queued"] += 1
+
+        try:
+            timeout = deadline.remaining() if deadline is not None else None
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._abandon(model, gate, waiter)
+            gate.stats["timed_out"] += 1
+            raise DeadlineExceeded("admission_queue", deadline.budget)
+        except asyncio.CancelledError:
+            self._abandon(model, gate, waiter)
+            raise
+
+        gate.stats["admitted"] += 1
+
+    def _abandon(self, model: str, gate: _ModelGate, waiter: asyncio.Future):
+        """إزالة منتظر انسحب؛ وإن كان قد مُنح الخانة فتُمرر لغيره"""
+        if waiter.done() and not waiter.cancelled():
+            self._release_gate(model, gate)
+            return
+        waiter.cancel()
+        try:
+            gate.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, model: str, service_time: Optional[float] = None):
+        """تحرير خانة وتحديث متوسط زمن الخدمة"""
+        gate = self._gate(model)
+        if service_time is not None:
+            gate.avg_service_time = 0.8 * gate.avg_service_time + 0.2 * service_time
+        self._release_gate(model, gate)
+
+    def _release_gate(self, model: str, gate: _ModelGate):
+        # قبول المنتظرين بقدر الخانات المتاحة وفق الحد الحالي (قد يكون ارتفع أو انخفض)
+        gate.active -= 1
+        limit = self.concurrency(model)
+        while gate.waiters and gate.active < limit:
+            waiter = gate.waiters.popleft()
+            if not waiter.done():
+                gate.active += 1
+                waiter.set_result(True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        عمق الطابور والرفض لكل نموذج
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "models": {
+                model: {
+                    **gate.stats,
+                    "active": gate.active,
+                    "concurrency_limit": self.concurrency(model),
+                    "queue_depth": len(gate.waiters),
+                    "avg_service_seconds": round(gate.avg_service_time, 2),
+                    "estimated_wait_seconds": round(self.estimate_wait(model), 2)
+                }
+                for model, gate in self._gates.items()
+            }
+        }
@@ -0,0 +1,326 @@
+import abc
+import asyncio
+import hashlib
+import io
+import time
+import logging
+from typing import Optional, Dict, Any, List
+
+import aiohttp
+from PIL import Image, ImageDraw
+
+from utils.http_client import HTTPClientPool
+
+logger = logging.getLogger(__name__)
+
+class InferenceBackend(abc.ABC):
+    """
+    واجهة خدمة التوليد: كل خلفية تحدد العنوان وصيغة الطلب والاتصالات
+
+    post() تعيد مدير سياق يعطي استجابة بواجهة aiohttp (status و headers و text و read)
+    حتى يبقى منطق إعادة المحاولة في ImageGenerator واحداً لكل الخلفيات.
+    """
+    name = "base"
+
+    async def start(self):
+        """تهيئة الاتصالات"""
+
+    async def close(self):
+        """إغلاق الاتصالات"""
+
+    @abc.abstractmethod
+    def post(self, model_id: str, payload: Dict[str, Any], timeout: aiohttp.ClientTimeout):
+        """إرسال طلب توليد لنموذج"""
+
+    @abc.abstractmethod
+    async def probe(self, model_id: str, timeout: aiohttp.ClientTimeout) -> Optional[bool]:
+        """فحص خفيف: True محمّل، False بارد، None تعذر الفحص"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الخلفية"""
+        return {"backend": self.name}
+
+class HuggingFaceBackend(InferenceBackend):
+    """
+    واجهة HuggingFace Inference API
+    """
+    name = "huggingface"
+    base_url = "https://api-inference.huggingface.co"
+
+    def __init__(self, token: str, http_client: HTTPClientPool):
+        self.http_client = http_client
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+
+    async def start(self):
+        await self.http_client.start()
+
+    async def close(self):
+        await self.http_client.close()
+
+    def post(self, model_id: str, payload: Dict[str, Any], timeout: aiohttp.ClientTimeout):
+        session = self.http_client.get_session()
+        return session.post(f"{self.base_url}/models/{model_id}", headers=self.headers, json=payload, timeout=timeout)
+
+    async def probe(self, model_id: str, timeout: aiohttp.ClientTimeout) -> Optional[bool]:
+        session = self.http_client.get_session()
+        async with session.get(f"{self.base_url}/status/{model_id}", headers=self.headers, timeout=timeout) as response:
+            if response.status != 200:
+                return None
+            status = await response.json(content_type=None)
+        return bool(status.get("loaded"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "http_pool": self.http_client.get_stats()}
+
+class _Replica:
+    """نسخة خدمة واحدة مع مجمع اتصالاتها وحالتها"""
+    def __init__(self, url: str, http_client: HTTPClientPool):
+        self.url = url.rstrip("/")
+        self.http_client = http_client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.avg_latency: Optional[float] = None
+        self.stats = {
+            "requests": 0,
+            "failures": 0,
+            "ejections": 0
+        }
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+class _ReplicaRequest:
+    """مدير سياق يتتبع الطلبات الجارية ونتيجتها لكل نسخة"""
+    def __init__(self, backend: "HTTPReplicaBackend", replica: _Replica, request_context):
+        self.backend = backend
+        self.replica = replica
+        self.request_context = request_context
+        self.started_at = 0.0
+        self.response = None
+
+    async def __aenter__(self):
+        self.replica.outstanding += 1
+        self.replica.stats["requests"] += 1
+        self.started_at = time.monotonic()
+        try:
+            self.response = await self.request_context.__aenter__()
+        except BaseException:
+            self.replica.outstanding -= 1
+            self.backend._record(self.replica, ok=False)
+            raise
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.replica.outstanding -= 1
+        ok = exc_type is None and self.response.status < 500
+        self.backend._record(self.replica, ok=ok, latency=time.monotonic() - self.started_at)
+        return await self.request_context.__aexit__(exc_type, exc, tb)
+
+class HTTPReplicaBackend(InferenceBackend):
+    """
+    خدمة توليد مستضافة ذاتياً على عدة نسخ
+
+    تُختار النسخة ذات أقل عدد من الطلبات الجارية بين النسخ السليمة، وتُستبعد
+    النسخة مؤقتاً بعد عدد من الإخفاقات المتتالية. لكل نسخة مجمع اتصالات خاص.
+    """
+    name = "http"
+
+    def __init__(
+        self,
+        replicas: List[str],
+        pool_factory,
+        path: str = "/models/{model}",
+        api_key: str = "",
+        failure_threshold: int = 3,
+        eject_seconds: float = 30.0
+    ):
+        if not replicas:
+            raise ValueError("يجب تحديد نسخة واحدة على الأقل لخلفية HTTP")
+
+        self.replicas = [_Replica(url, pool_factory()) for url in replicas]
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self._turn = 0
+
+    async def start(self):
+        for replica in self.replicas:
+            await replica.http_client.start()
+
+    async def close(self):
+        for replica in self.replicas:
+            await replica.http_client.close()
+
+    def select(self) -> _Replica:
+        """اختيار النسخة السليمة ذات أقل طلبات جارية (بالتناوب عند التساوي)"""
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas if replica.healthy(now)]
+        if not candidates:
+            # كل النسخ مستبعدة: المحاولة مع أقربها للعودة بدلاً من الرفض
+            return min(self.replicas, key=lambda replica: replica.ejected_until)
+
+        self._turn += 1
+        count = len(candidates)
+        ordered = candidates[self._turn % count:] + candidates[:self._turn % count]
+        return min(ordered, key=lambda replica: replica.outstanding)
+
+    def _record(self, replica: _Replica, ok: bool, latency: Optional[float] = None):
+        if ok:
+            replica.consecutive_failures = 0
+            if latency is not None:
+                replica.avg_latency = latency if replica.avg_latency is None else 0.8 * replica.avg_latency + 0.2 * latency
+            return
+
+        replica.stats["failures"] += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.failure_threshold:
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+            replica.consecutive_failures = 0
+            replica.stats["ejections"] += 1
+            logger.warning(f"تم استبعاد النسخة {replica.url} لمدة {self.eject_seconds} ثانية")
+
+    def post(self, model_id: str, payload: Dict[str, Any], timeout: aiohttp.ClientTimeout):
+        replica = self.select()
+        session = replica.http_client.get_session()
+        url = replica.url + self.path.format(model=model_id)
+        return _ReplicaRequest(self, replica, session.post(url, headers=self.headers, json=payload, timeout=timeout))
+
+    async def probe(self, model_id: str, timeout: aiohttp.ClientTimeout) -> Optional[bool]:
+        """
+        فحص /health لكل النسخ وتحديث حالتها؛ النموذج دافئ إذا استجابت نسخة واحدة بنجاح،
+        وبارد إذا ردت النسخ بحالة غير ناجحة، و None إذا تعذر الوصول لكل النسخ
+        """
+        async def probe_replica(replica: _Replica) -> Optional[bool]:
+            try:
+                session = replica.http_client.get_session()
+                async with session.get(f"{replica.url}/health", timeout=timeout) as response:
+                    ok = response.status == 200
+            except Exception:
+                ok = None
+            self._record(replica, ok=bool(ok))
+            return ok
+
+        results = await asyncio.gather(*(probe_replica(replica) for replica in self.replicas))
+        if any(result is True for result in results):
+            return True
+        if any(result is False for result in results):
+            return False
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "backend": self.name,
+            "replicas": [
+                {
+                    **replica.stats,
+                    "url": replica.url,
+                    "healthy": replica.healthy(now),
+                    "outstanding": replica.outstanding,
+                    "avg_latency_ms": round(replica.avg_latency * 1000, 1) if replica.avg_latency else None,
+                    "http_pool": replica.http_client.get_stats()
+                }
+                for replica in self.replicas
+            ]
+        }
+
+def _render_stub_image(seed_text: str, width: int, height: int) -> bytes:
+    """صورة PNG ثابتة لنفس المدخلات (تدرج لوني مشتق من hash الطلب)"""
+    digest = hashlib.sha256(seed_text.encode('utf-8')).digest()
+    start, end = digest[:3], digest[3:6]
+    image = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        ratio = y / max(1, height - 1)
+        color = tuple(int(a + (b - a) * ratio) for a, b in zip(start, end))
+        draw.line([(0, y), (width, y)], fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class _StubResponse:
+    """استجابة محلية بواجهة aiohttp"""
+    def __init__(self, body: bytes):
+        self.status = 200
+        self.headers = {"content-type": "image/png"}
+        self._body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return ""
+
+class _StubRequest:
+    def __init__(self, backend: "StubBackend", model_id: str, payload: Dict[str, Any]):
+        self.backend = backend
+        self.model_id = model_id
+        self.payload = payload
+
+    async def __aenter__(self):
+        return await self.backend._respond(self.model_id, self.payload)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class StubBackend(InferenceBackend):
+    """
+    خلفية محلية تعيد صوراً حتمية دون شبكة، لاختبار الحمل على كامل المسار
+    """
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.stats = {"requests": 0}
+
+    async def _respond(self, model_id: str, payload: Dict[str, Any]) -> _StubResponse:
+        self.stats["requests"] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+        parameters = payload.get("parameters", {})
+        seed_text = f"{model_id}|{payload.get('inputs')}|{parameters.get('seed')}"
+        body = await asyncio.to_thread(
+            _render_stub_image, seed_text,
+            int(parameters.get("width", 512)), int(parameters.get("height", 512))
+        )
+        return _StubResponse(body)
+
+    def post(self, model_id: str, payload: Dict[str, Any], timeout: aiohttp.ClientTimeout):
+        return _StubRequest(self, model_id, payload)
+
+    async def probe(self, model_id: str, timeout: aiohttp.ClientTimeout) -> Optional[bool]:
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.stats, "latency_ms": self.latency * 1000}
+
+def create_backend(config, http_client: HTTPClientPool) -> InferenceBackend:
+    """
+    إنشاء خلفية التوليد المحددة في الإعدادات (huggingface أو http أو stub)
+    """
+    if config.inference_backend == "http":
+        return HTTPReplicaBackend(
+            replicas=config.inference_replicas,
+            pool_factory=lambda: HTTPClientPool.from_config(config),
+            path=config.inference_path,
+            api_key=config.inference_api_key,
+            failure_threshold=config.replica_failure_threshold,
+            eject_seconds=config.replica_eject_seconds
+        )
+    if config.inference_backend == "stub":
+        return StubBackend(latency_ms=config.stub_latency_ms)
+    return HuggingFaceBackend(config.huggingface_token, http_client)
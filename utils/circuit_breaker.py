@@ -0,0 +1,150 @@
+import math
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+class AllBackendsOpen(Exception):
+    """
+    قواطع كل النماذج في سلسلة البدائل مفتوحة
+    """
+    status_code = 503
+
+    def __init__(self, models: List[str], retry_after: int):
+        self.models = models
+        self.retry_after = retry_after
+        super().__init__(f"قواطع الدائرة مفتوحة لكل النماذج ({', '.join(models)})، أعد المحاولة بعد {retry_after} ثانية")
+
+class CircuitBreaker:
+    """
+    قاطع دائرة لنموذج واحد بحالات closed و open و half_open
+
+    يفتح عندما تتجاوز نسبة الفشل في النافذة الزمنية الحد المسموح، ويبقى مفتوحاً
+    مدة open_seconds ثم يسمح بطلبات تجريبية محدودة (half_open) قبل الإغلاق.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: float = 0.5,
+        min_requests: int = 5,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_max: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max = half_open_max
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._outcomes: deque = deque()
+        self._half_open_in_flight = 0
+        self.stats = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0
+        }
+
+    @classmethod
+    def from_config(cls, name: str, config) -> "CircuitBreaker":
+        """إنشاء قاطع من إعدادات التطبيق"""
+        return cls(
+            name,
+            failure_threshold=config.breaker_failure_threshold,
+            min_requests=config.breaker_min_requests,
+            window_seconds=config.breaker_window_seconds,
+            open_seconds=config.breaker_open_seconds
+        )
+
+    def _trim(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> float:
+        """نسبة الفشل في النافذة الحالية"""
+        self._trim(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / len(self._outcomes)
+
+    def retry_after(self) -> int:
+        """الثواني المتبقية حتى يسمح القاطع بطلب تجريبي (1 على الأقل)"""
+        remaining = 0.0
+        if self.state == self.OPEN:
+            remaining = self.open_seconds - (time.monotonic() - self.opened_at)
+        return max(1, math.ceil(remaining))
+
+    def allow(self) -> bool:
+        """هل يُسمح بإرسال طلب لهذا النموذج الآن"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.stats["rejected"] += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+            logger.info(f"قاطع الدائرة للنموذج {self.name} في وضع التجربة")
+
+        if self.state == self.HALF_OPEN:
+            if self._half_open_in_flight >= self.half_open_max:
+                self.stats["rejected"] += 1
+                return False
+            self._half_open_in_flight += 1
+
+        return True
+
+    def record_success(self):
+        """تسجيل نجاح"""
+        self.stats["successes"] += 1
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+            logger.info(f"تم إغلاق قاطع الدائرة للنموذج {self.name}")
+        self._record(True)
+
+    def record_failure(self):
+        """تسجيل فشل وفتح القاطع عند تجاوز الحد"""
+        self.stats["failures"] += 1
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+
+        self._record(False)
+        if len(self._outcomes) >= self.min_requests and self.error_rate() >= self.failure_threshold:
+            self._open()
+
+    def cancel(self):
+        """إلغاء طلب مسموح لم تُعرف نتيجته (مثل رفضه قبل الإرسال)"""
+        if self.state == self.HALF_OPEN and self._half_open_in_flight > 0:
+            self._half_open_in_flight -= 1
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        self._trim(now)
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+        self.stats["opened"] += 1
+        logger.warning(f"تم فتح قاطع الدائرة للنموذج {self.name}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """حالة القاطع ونسبة الفشل"""
+        return {
+            **self.stats,
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "window_requests": len(self._outcomes)
+        }
@@ -4,6 +4,8 @@ import logging
 from typing import Optional, Dict, Any
 from dataclasses import dataclass
 
+from utils.encoders import is_supported
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -29,11 +31,105 @@ class Config:
     output_dir: str = "output"
     max_storage_mb: int = 1000
     auto_cleanup_days: int = 30
+    storage_rescan_seconds: int = 0  # صفر لتعطيل إعادة المسح الدورية
+    
+    # صيغة ملفات الإخراج: png أو jpeg أو webp أو avif
+    output_format: str = "png"
+    output_quality: int = 90
+    output_lossless: bool = False
+    output_effort: int = 6  # 0-9: ملف أصغر مقابل وقت معالج أكثر
+    jpeg_progressive: bool = True
+    
+    # النسخ المصغرة للمعرض (/image/{filename}?w=256)
+    thumbnail_sizes: list = None
+    thumbnail_eager_sizes: list = None  # تُولد مع حفظ الصورة
+    thumbnail_format: str = "webp"
+    thumbnail_quality: int = 80
     
     # إعدادات API
     rate_limit_per_minute: int = 10
     timeout_seconds: int = 60
     
+    # إعدادات اتصال HTTP بخدمة التوليد
+    http_pool_limit: int = 100
+    http_pool_limit_per_host: int = 20
+    http_keepalive_seconds: int = 30
+    http_dns_cache_ttl: int = 300
+    
+    # خلفية التوليد: huggingface أو http (نسخ مستضافة ذاتياً) أو stub (صور محلية حتمية)
+    inference_backend: str = "huggingface"
+    inference_replicas: list = None
+    inference_path: str = "/models/{model}"
+    inference_api_key: str = ""
+    replica_failure_threshold: int = 3
+    replica_eject_seconds: int = 30
+    stub_latency_ms: int = 0
+    
+    # إعدادات كاش النتائج
+    enable_result_cache: bool = True
+    result_cache_max_entries: int = 128
+    result_cache_max_memory_mb: int = 256
+    result_cache_disk: bool = True
+    # خارج مجلد الإخراج: الكاش يحفظ الصور الخام بلا علامة مائية فلا يجب نشره
+    result_cache_dir: str = "cache"
+    result_cache_max_disk_mb: int = 1024
+    
+    # إعدادات مجمع معالجة الصور (thread أو process)
+    worker_pool_mode: str = "thread"
+    worker_pool_size: int = 4
+    worker_pool_queue: int = 32
+    
+    # إعدادات طابور المهام غير المتزامنة
+    job_workers: int = 2
+    job_queue_size: int = 100
+    job_result_ttl_seconds: int = 3600
+    job_timeout_seconds: int = 300
+    
+    # إعدادات التحكم بالقبول لكل نموذج
+    admission_max_concurrency: int = 4
+    admission_max_queue: int = 16
+    
+    # حد التزامن التكيفي (AIMD) نحو خدمة التوليد، والحد الأعلى هو admission_max_concurrency
+    adaptive_concurrency: bool = True
+    upstream_min_concurrency: int = 1
+    upstream_initial_concurrency: int = 2
+    upstream_latency_tolerance: float = 2.0
+    
+    # قواطع الدائرة وسلسلة النماذج البديلة (النموذج -> قائمة البدائل بالترتيب)
+    model_fallbacks: dict = None
+    breaker_failure_threshold: float = 0.5
+    breaker_min_requests: int = 5
+    breaker_window_seconds: int = 60
+    breaker_open_seconds: int = 30
+    
+    # إعادة المحاولة (تحترم estimated_time و Retry-After من الخدمة)
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 2.0
+    retry_max_delay: float = 30.0
+    retry_jitter: float = 0.2
+    retry_max_loading_waits: int = 5
+    
+    # الإبقاء دافئاً: فحص دوري للنماذج وتسخين الباردة منها (0 للتعطيل)
+    keep_warm_models: list = None
+    keep_warm_interval_seconds: int = 300
+    keep_warm_probe_timeout: int = 10
+    keep_warm_warmup_timeout: int = 120
+    
+    # طلبات التحوط: محاولة ثانية بعد تجاوز النسبة المئوية hedge_percentile من زمن الاستجابة
+    enable_hedging: bool = False
+    hedge_percentile: float = 0.95
+    hedge_max_ratio: float = 0.1
+    hedge_min_samples: int = 20
+    hedge_target: str = "same"  # same أو fallback
+    
+    # التنويعات المتوازية (/generate/variations)
+    variations_concurrency: int = 2
+    max_variations: int = 6
+    
+    # دفعات التوليد (/generate/batch)
+    batch_concurrency: int = 4
+    batch_max_items: int = 10000
+    
     # إعدادات الأمان
     allowed_file_types: list = None
     max_prompt_length: int = 500
@@ -48,7 +144,24 @@ class Config:
         self.load_from_file()
         
         if self.allowed_file_types is None:
-            self.allowed_file_types = ['.png', '.jpg', '.jpeg']
+            self.allowed_file_types = ['.png', '.jpg', '.jpeg', '.webp', '.avif']
+        
+        if self.inference_replicas is None:
+            self.inference_replicas = []
+        
+        if self.thumbnail_sizes is None:
+            self.thumbnail_sizes = [128, 256, 512]
+        
+        if self.thumbnail_eager_sizes is None:
+            self.thumbnail_eager_sizes = [256]
+        
+        if self.keep_warm_models is None:
+            self.keep_warm_models = ["stable-diffusion-xl"]
+        
+        if self.model_fallbacks is None:
+            self.model_fallbacks = {
+                "stable-diffusion-xl": ["stable-diffusion-2", "realistic"]
+            }
     
     def load_from_env(self):
         """تحميل الإعدادات من متغيرات البيئة"""
@@ -65,12 +178,169 @@ class Config:
             self.output_dir = os.getenv('OUTPUT_DIR')
         if os.getenv('MAX_STORAGE_MB'):
             self.max_storage_mb = int(os.getenv('MAX_STORAGE_MB'))
+        if os.getenv('STORAGE_RESCAN_SECONDS'):
+            self.storage_rescan_seconds = int(os.getenv('STORAGE_RESCAN_SECONDS'))
+        
+        # صيغة ملفات الإخراج
+        if os.getenv('OUTPUT_FORMAT'):
+            self.output_format = os.getenv('OUTPUT_FORMAT').lower()
+        if os.getenv('OUTPUT_QUALITY'):
+            self.output_quality = int(os.getenv('OUTPUT_QUALITY'))
+        if os.getenv('OUTPUT_LOSSLESS'):
+            self.output_lossless = os.getenv('OUTPUT_LOSSLESS').lower() == 'true'
+        if os.getenv('OUTPUT_EFFORT'):
+            self.output_effort = int(os.getenv('OUTPUT_EFFORT'))
+        if os.getenv('JPEG_PROGRESSIVE'):
+            self.jpeg_progressive = os.getenv('JPEG_PROGRESSIVE').lower() == 'true'
+        
+        # النسخ المصغرة
+        if os.getenv('THUMBNAIL_SIZES'):
+            self.thumbnail_sizes = [int(size) for size in os.getenv('THUMBNAIL_SIZES').split(',') if size.strip()]
+        if os.getenv('THUMBNAIL_EAGER_SIZES') is not None:
+            self.thumbnail_eager_sizes = [int(size) for size in os.getenv('THUMBNAIL_EAGER_SIZES').split(',') if size.strip()]
+        if os.getenv('THUMBNAIL_FORMAT'):
+            self.thumbnail_format = os.getenv('THUMBNAIL_FORMAT').lower()
+        if os.getenv('THUMBNAIL_QUALITY'):
+            self.thumbnail_quality = int(os.getenv('THUMBNAIL_QUALITY'))
         
         # إعدادات API
         if os.getenv('RATE_LIMIT_PER_MINUTE'):
             self.rate_limit_per_minute = int(os.getenv('RATE_LIMIT_PER_MINUTE'))
         if os.getenv('TIMEOUT_SECONDS'):
             self.timeout_seconds = int(os.getenv('TIMEOUT_SECONDS'))
+        
+        # إعدادات اتصال HTTP
+        if os.getenv('HTTP_POOL_LIMIT'):
+            self.http_pool_limit = int(os.getenv('HTTP_POOL_LIMIT'))
+        if os.getenv('HTTP_POOL_LIMIT_PER_HOST'):
+            self.http_pool_limit_per_host = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST'))
+        if os.getenv('HTTP_KEEPALIVE_SECONDS'):
+            self.http_keepalive_seconds = int(os.getenv('HTTP_KEEPALIVE_SECONDS'))
+        if os.getenv('HTTP_DNS_CACHE_TTL'):
+            self.http_dns_cache_ttl = int(os.getenv('HTTP_DNS_CACHE_TTL'))
+        
+        # خلفية التوليد
+        if os.getenv('INFERENCE_BACKEND'):
+            self.inference_backend = os.getenv('INFERENCE_BACKEND')
+        if os.getenv('INFERENCE_REPLICAS'):
+            self.inference_replicas = [url.strip() for url in os.getenv('INFERENCE_REPLICAS').split(',') if url.strip()]
+        if os.getenv('INFERENCE_PATH'):
+            self.inference_path = os.getenv('INFERENCE_PATH')
+        self.inference_api_key = os.getenv('INFERENCE_API_KEY', self.inference_api_key)
+        if os.getenv('REPLICA_FAILURE_THRESHOLD'):
+            self.replica_failure_threshold = int(os.getenv('REPLICA_FAILURE_THRESHOLD'))
+        if os.getenv('REPLICA_EJECT_SECONDS'):
+            self.replica_eject_seconds = int(os.getenv('REPLICA_EJECT_SECONDS'))
+        if os.getenv('STUB_LATENCY_MS'):
+            self.stub_latency_ms = int(os.getenv('STUB_LATENCY_MS'))
+        
+        # إعدادات كاش النتائج
+        if os.getenv('ENABLE_RESULT_CACHE'):
+            self.enable_result_cache = os.getenv('ENABLE_RESULT_CACHE').lower() == 'true'
+        if os.getenv('RESULT_CACHE_MAX_ENTRIES'):
+            self.result_cache_max_entries = int(os.getenv('RESULT_CACHE_MAX_ENTRIES'))
+        if os.getenv('RESULT_CACHE_MAX_MEMORY_MB'):
+            self.result_cache_max_memory_mb = int(os.getenv('RESULT_CACHE_MAX_MEMORY_MB'))
+        if os.getenv('RESULT_CACHE_DISK'):
+            self.result_cache_disk = os.getenv('RESULT_CACHE_DISK').lower() == 'true'
+        if os.getenv('RESULT_CACHE_DIR'):
+            self.result_cache_dir = os.getenv('RESULT_CACHE_DIR')
+        if os.getenv('RESULT_CACHE_MAX_DISK_MB'):
+            self.result_cache_max_disk_mb = int(os.getenv('RESULT_CACHE_MAX_DISK_MB'))
+        
+        # إعدادات مجمع المعالجة
+        if os.getenv('WORKER_POOL_MODE'):
+            self.worker_pool_mode = os.getenv('WORKER_POOL_MODE')
+        if os.getenv('WORKER_POOL_SIZE'):
+            self.worker_pool_size = int(os.getenv('WORKER_POOL_SIZE'))
+        if os.getenv('WORKER_POOL_QUEUE'):
+            self.worker_pool_queue = int(os.getenv('WORKER_POOL_QUEUE'))
+        
+        # إعدادات طابور المهام
+        if os.getenv('JOB_WORKERS'):
+            self.job_workers = int(os.getenv('JOB_WORKERS'))
+        if os.getenv('JOB_QUEUE_SIZE'):
+            self.job_queue_size = int(os.getenv('JOB_QUEUE_SIZE'))
+        if os.getenv('JOB_RESULT_TTL_SECONDS'):
+            self.job_result_ttl_seconds = int(os.getenv('JOB_RESULT_TTL_SECONDS'))
+        if os.getenv('JOB_TIMEOUT_SECONDS'):
+            self.job_timeout_seconds = int(os.getenv('JOB_TIMEOUT_SECONDS'))
+        
+        # إعدادات التحكم بالقبول
+        if os.getenv('ADMISSION_MAX_CONCURRENCY'):
+            self.admission_max_concurrency = int(os.getenv('ADMISSION_MAX_CONCURRENCY'))
+        if os.getenv('ADMISSION_MAX_QUEUE'):
+            self.admission_max_queue = int(os.getenv('ADMISSION_MAX_QUEUE'))
+        if os.getenv('ADAPTIVE_CONCURRENCY'):
+            self.adaptive_concurrency = os.getenv('ADAPTIVE_CONCURRENCY').lower() == 'true'
+        if os.getenv('UPSTREAM_MIN_CONCURRENCY'):
+            self.upstream_min_concurrency = int(os.getenv('UPSTREAM_MIN_CONCURRENCY'))
+        if os.getenv('UPSTREAM_INITIAL_CONCURRENCY'):
+            self.upstream_initial_concurrency = int(os.getenv('UPSTREAM_INITIAL_CONCURRENCY'))
+        if os.getenv('UPSTREAM_LATENCY_TOLERANCE'):
+            self.upstream_latency_tolerance = float(os.getenv('UPSTREAM_LATENCY_TOLERANCE'))
+        
+        # قواطع الدائرة والبدائل (مثال: stable-diffusion-xl>stable-diffusion-2>realistic;anime>realistic)
+        if os.getenv('MODEL_FALLBACKS'):
+            self.model_fallbacks = {}
+            for chain in os.getenv('MODEL_FALLBACKS').split(';'):
+                models = [name.strip() for name in chain.split('>') if name.strip()]
+                if models:
+                    self.model_fallbacks[models[0]] = models[1:]
+        if os.getenv('BREAKER_FAILURE_THRESHOLD'):
+            self.breaker_failure_threshold = float(os.getenv('BREAKER_FAILURE_THRESHOLD'))
+        if os.getenv('BREAKER_MIN_REQUESTS'):
+            self.breaker_min_requests = int(os.getenv('BREAKER_MIN_REQUESTS'))
+        if os.getenv('BREAKER_WINDOW_SECONDS'):
+            self.breaker_window_seconds = int(os.getenv('BREAKER_WINDOW_SECONDS'))
+        if os.getenv('BREAKER_OPEN_SECONDS'):
+            self.breaker_open_seconds = int(os.getenv('BREAKER_OPEN_SECONDS'))
+        
+        # إعادة المحاولة
+        if os.getenv('RETRY_MAX_ATTEMPTS'):
+            self.retry_max_attempts = int(os.getenv('RETRY_MAX_ATTEMPTS'))
+        if os.getenv('RETRY_BASE_DELAY'):
+            self.retry_base_delay = float(os.getenv('RETRY_BASE_DELAY'))
+        if os.getenv('RETRY_MAX_DELAY'):
+            self.retry_max_delay = float(os.getenv('RETRY_MAX_DELAY'))
+        if os.getenv('RETRY_JITTER'):
+            self.retry_jitter = float(os.getenv('RETRY_JITTER'))
+        if os.getenv('RETRY_MAX_LOADING_WAITS'):
+            self.retry_max_loading_waits = int(os.getenv('RETRY_MAX_LOADING_WAITS'))
+        
+        # الإبقاء دافئاً
+        if os.getenv('KEEP_WARM_MODELS') is not None:
+            self.keep_warm_models = [name.strip() for name in os.getenv('KEEP_WARM_MODELS').split(',') if name.strip()]
+        if os.getenv('KEEP_WARM_INTERVAL_SECONDS'):
+            self.keep_warm_interval_seconds = int(os.getenv('KEEP_WARM_INTERVAL_SECONDS'))
+        if os.getenv('KEEP_WARM_PROBE_TIMEOUT'):
+            self.keep_warm_probe_timeout = int(os.getenv('KEEP_WARM_PROBE_TIMEOUT'))
+        if os.getenv('KEEP_WARM_WARMUP_TIMEOUT'):
+            self.keep_warm_warmup_timeout = int(os.getenv('KEEP_WARM_WARMUP_TIMEOUT'))
+        
+        # التنويعات المتوازية
+        if os.getenv('VARIATIONS_CONCURRENCY'):
+            self.variations_concurrency = int(os.getenv('VARIATIONS_CONCURRENCY'))
+        if os.getenv('MAX_VARIATIONS'):
+            self.max_variations = int(os.getenv('MAX_VARIATIONS'))
+        
+        # دفعات التوليد
+        if os.getenv('BATCH_CONCURRENCY'):
+            self.batch_concurrency = int(os.getenv('BATCH_CONCURRENCY'))
+        if os.getenv('BATCH_MAX_ITEMS'):
+            self.batch_max_items = int(os.getenv('BATCH_MAX_ITEMS'))
+        
+        # طلبات التحوط
+        if os.getenv('ENABLE_HEDGING'):
+            self.enable_hedging = os.getenv('ENABLE_HEDGING').lower() == 'true'
+        if os.getenv('HEDGE_PERCENTILE'):
+            self.hedge_percentile = float(os.getenv('HEDGE_PERCENTILE'))
+        if os.getenv('HEDGE_MAX_RATIO'):
+            self.hedge_max_ratio = float(os.getenv('HEDGE_MAX_RATIO'))
+        if os.getenv('HEDGE_MIN_SAMPLES'):
+            self.hedge_min_samples = int(os.getenv('HEDGE_MIN_SAMPLES'))
+        if os.getenv('HEDGE_TARGET'):
+            self.hedge_target = os.getenv('HEDGE_TARGET')
     
     def load_from_file(self, config_file: str = "config.json"):
         """تحميل الإعدادات من ملف JSON"""
@@ -102,8 +372,70 @@ class Config:
                 "output_dir": self.output_dir,
                 "max_storage_mb": self.max_storage_mb,
                 "auto_cleanup_days": self.auto_cleanup_days,
+                "storage_rescan_seconds": self.storage_rescan_seconds,
                 "rate_limit_per_minute": self.rate_limit_per_minute,
                 "timeout_seconds": self.timeout_seconds,
+                "http_pool_limit": self.http_pool_limit,
+                "http_pool_limit_per_host": self.http_pool_limit_per_host,
+                "http_keepalive_seconds": self.http_keepalive_seconds,
+                "http_dns_cache_ttl": self.http_dns_cache_ttl,
+                "inference_backend": self.inference_backend,
+                "inference_replicas": self.inference_replicas,
+                "inference_path": self.inference_path,
+                "replica_failure_threshold": self.replica_failure_threshold,
+                "replica_eject_seconds": self.replica_eject_seconds,
+                "stub_latency_ms": self.stub_latency_ms,
+                "enable_result_cache": self.enable_result_cache,
+                "result_cache_max_entries": self.result_cache_max_entries,
+                "result_cache_max_memory_mb": self.result_cache_max_memory_mb,
+                "result_cache_disk": self.result_cache_disk,
+                "result_cache_dir": self.result_cache_dir,
+                "result_cache_max_disk_mb": self.result_cache_max_disk_mb,
+                "worker_pool_mode": self.worker_pool_mode,
+                "worker_pool_size": self.worker_pool_size,
+                "worker_pool_queue": self.worker_pool_queue,
+                "job_workers": self.job_workers,
+                "job_queue_size": self.job_queue_size,
+                "job_result_ttl_seconds": self.job_result_ttl_seconds,
+                "job_timeout_seconds": self.job_timeout_seconds,
+                "admission_max_concurrency": self.admission_max_concurrency,
+                "admission_max_queue": self.admission_max_queue,
+                "adaptive_concurrency": self.adaptive_concurrency,
+                "upstream_min_concurrency": self.upstream_min_concurrency,
+                "upstream_initial_concurrency": self.upstream_initial_concurrency,
+                "upstream_latency_tolerance": self.upstream_latency_tolerance,
+                "model_fallbacks": self.model_fallbacks,
+                "breaker_failure_threshold": self.breaker_failure_threshold,
+                "breaker_min_requests": self.breaker_min_requests,
+                "breaker_window_seconds": self.breaker_window_seconds,
+                "breaker_open_seconds": self.breaker_open_seconds,
+                "retry_max_attempts": self.retry_max_attempts,
+                "retry_base_delay": self.retry_base_delay,
+                "retry_max_delay": self.retry_max_delay,
+                "retry_jitter": self.retry_jitter,
+                "retry_max_loading_waits": self.retry_max_loading_waits,
+                "keep_warm_models": self.keep_warm_models,
+                "keep_warm_interval_seconds": self.keep_warm_interval_seconds,
+                "keep_warm_probe_timeout": self.keep_warm_probe_timeout,
+                "keep_warm_warmup_timeout": self.keep_warm_warmup_timeout,
+                "enable_hedging": self.enable_hedging,
+                "hedge_percentile": self.hedge_percentile,
+                "hedge_max_ratio": self.hedge_max_ratio,
+                "hedge_min_samples": self.hedge_min_samples,
+                "hedge_target": self.hedge_target,
+                "variations_concurrency": self.variations_concurrency,
+                "max_variations": self.max_variations,
+                "batch_concurrency": self.batch_concurrency,
+                "batch_max_items": self.batch_max_items,
+                "output_format": self.output_format,
+                "output_quality": self.output_quality,
+                "output_lossless": self.output_lossless,
+                "output_effort": self.output_effort,
+                "jpeg_progressive": self.jpeg_progressive,
+                "thumbnail_sizes": self.thumbnail_sizes,
+                "thumbnail_eager_sizes": self.thumbnail_eager_sizes,
+                "thumbnail_format": self.thumbnail_format,
+                "thumbnail_quality": self.thumbnail_quality,
                 "allowed_file_types": self.allowed_file_types,
                 "max_prompt_length": self.max_prompt_length,
                 "enable_watermark": self.enable_watermark,
@@ -124,9 +456,16 @@ class Config:
         warnings = []
         
         # التحقق من توكن HuggingFace
-        if not self.huggingface_token:
+        if self.inference_backend == "huggingface" and not self.huggingface_token:
             errors.append("HuggingFace token is required")
         
+        # التحقق من خلفية التوليد
+        if self.inference_backend not in ("huggingface", "http", "stub"):
+            errors.append("Inference backend must be 'huggingface', 'http' or 'stub'")
+        
+        if self.inference_backend == "http" and not self.inference_replicas:
+            errors.append("At least one inference replica is required for the http backend")
+        
         # التحقق من أبعاد الصور
         if self.default_width <= 0 or self.default_height <= 0:
             errors.append("Image dimensions must be positive")
@@ -145,6 +484,53 @@ class Config:
         if self.max_storage_mb <= 0:
             errors.append("Max storage must be positive")
         
+        # التحقق من إعدادات مجمع المعالجة
+        if self.worker_pool_mode not in ("thread", "process"):
+            errors.append("Worker pool mode must be 'thread' or 'process'")
+        
+        if self.worker_pool_size <= 0 or self.worker_pool_queue < 0:
+            errors.append("Worker pool size must be positive")
+        
+        if self.admission_max_concurrency <= 0 or self.admission_max_queue < 0:
+            errors.append("Admission concurrency must be positive")
+        
+        if not 0 < self.upstream_min_concurrency <= self.admission_max_concurrency:
+            errors.append("Upstream min concurrency must be between 1 and admission_max_concurrency")
+        
+        if self.retry_max_attempts <= 0 or not 0 <= self.retry_jitter < 1:
+            errors.append("Retry attempts must be positive and jitter between 0 and 1")
+        
+        if self.hedge_target not in ("same", "fallback"):
+            errors.append("Hedge target must be 'same' or 'fallback'")
+        
+        if not 0 < self.hedge_percentile < 1:
+            errors.append("Hedge percentile must be between 0 and 1")
+        
+        # كاش القرص يحفظ صوراً بلا علامة مائية، فلا يجب أن يكون داخل مجلد الإخراج المنشور
+        cache_path = os.path.abspath(self.result_cache_dir)
+        output_path = os.path.abspath(self.output_dir)
+        if os.path.commonpath([cache_path, output_path]) == output_path:
+            errors.append("Result cache directory must be outside output_dir")
+        
+        # التحقق من صيغة الإخراج
+        if self.output_format not in ("png", "jpeg", "jpg", "webp", "avif"):
+            errors.append("Output format must be 'png', 'jpeg', 'webp' or 'avif'")
+        elif not is_supported(self.output_format):
+            # avif يتطلب Pillow مبنياً مع libavif
+            errors.append(f"Output format '{self.output_format}' is not supported by the installed Pillow")
+        
+        if not is_supported(self.thumbnail_format):
+            errors.append(f"Thumbnail format '{self.thumbnail_format}' is not supported by the installed Pillow")
+        
+        if not 1 <= self.output_quality <= 100 or not 0 <= self.output_effort <= 9:
+            errors.append("Output quality must be between 1 and 100 and effort between 0 and 9")
+        
+        if not self.thumbnail_sizes or any(size <= 0 for size in self.thumbnail_sizes):
+            errors.append("Thumbnail sizes must be positive")
+        
+        if any(size not in self.thumbnail_sizes for size in self.thumbnail_eager_sizes):
+            warnings.append("Eager thumbnail sizes not in thumbnail_sizes are ignored")
+        
         # التحقق من مجلد الإخراج
         try:
             if not os.path.exists(self.output_dir):
@@ -162,6 +548,8 @@ class Config:
         """الحصول على ملخص الإعدادات"""
         return {
             "huggingface_configured": bool(self.huggingface_token),
+            "inference_backend": self.inference_backend,
+            "inference_replicas": len(self.inference_replicas),
             "default_image_size": f"{self.default_width}x{self.default_height}",
             "max_image_size": f"{self.max_width}x{self.max_height}",
             "default_quality": {
@@ -171,15 +559,35 @@ class Config:
             "storage": {
                 "output_dir": self.output_dir,
                 "max_storage_mb": self.max_storage_mb,
-                "auto_cleanup_days": self.auto_cleanup_days
+                "auto_cleanup_days": self.auto_cleanup_days,
+                "storage_rescan_seconds": self.storage_rescan_seconds,
+                "output_format": self.output_format,
+                "output_quality": self.output_quality,
+                "output_effort": self.output_effort,
+                "thumbnail_sizes": self.thumbnail_sizes,
+                "thumbnail_eager_sizes": self.thumbnail_eager_sizes
             },
             "api_limits": {
                 "rate_limit_per_minute": self.rate_limit_per_minute,
                 "timeout_seconds": self.timeout_seconds
             },
+            "http_pool": {
+                "limit": self.http_pool_limit,
+                "limit_per_host": self.http_pool_limit_per_host,
+                "keepalive_seconds": self.http_keepalive_seconds,
+                "dns_cache_ttl": self.http_dns_cache_ttl
+            },
+            "admission": {
+                "max_concurrency": self.admission_max_concurrency,
+                "max_queue": self.admission_max_queue,
+                "adaptive": self.adaptive_concurrency
+            },
+            "model_fallbacks": self.model_fallbacks,
             "features": {
                 "watermark": self.enable_watermark,
-                "metadata": self.enable_metadata
+                "metadata": self.enable_metadata,
+                "result_cache": self.enable_result_cache,
+                "hedging": self.enable_hedging
             }
         }
 
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    """
+    تجاوز الميزانية الزمنية المخصصة للطلب
+    """
+    def __init__(self, step: str, budget: float):
+        self.step = step
+        self.budget = budget
+        super().__init__(f"تم تجاوز المهلة ({budget} ثانية) عند الخطوة: {step}")
+
+class Deadline:
+    """
+    ميزانية زمنية شاملة لطلب واحد يتم تمريرها عبر جميع الخطوات
+    """
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_seconds
+
+    def remaining(self) -> float:
+        """الوقت المتبقي بالثواني"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """الوقت المنقضي منذ بداية الطلب"""
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        """هل انتهت الميزانية"""
+        return self.remaining() <= 0
+
+    def check(self, step: str, min_remaining: float = 0.0):
+        """
+        التحقق من وجود وقت كافٍ قبل بدء خطوة
+        """
+        if self.remaining() <= min_remaining:
+            logger.warning(f"لا يوجد وقت كافٍ للخطوة {step} (المتبقي {self.remaining():.2f} ثانية)")
+            raise DeadlineExceeded(step, self.budget)
+
+    async def sleep(self, delay: float, step: str):
+        """
+        الانتظار فقط إذا كانت الميزانية تسمح بما بعده
+        """
+        if delay >= self.remaining():
+            raise DeadlineExceeded(step, self.budget)
+        await asyncio.sleep(delay)
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """
+        مهلة خطوة واحدة مقيدة بالوقت المتبقي
+        """
+        remaining = self.remaining()
+        return min(remaining, cap) if cap is not None else remaining
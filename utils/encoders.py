@@ -0,0 +1,145 @@
+import os
+import logging
+import mimetypes
+from typing import Optional, Dict, Any
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# الصيغة: (اسم PIL، الامتداد، نوع MIME، ميزة PIL المطلوبة إن وُجدت)
+OUTPUT_FORMATS = {
+    "png": ("PNG", ".png", "image/png", None),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg", None),
+    "webp": ("WEBP", ".webp", "image/webp", "webp"),
+    "avif": ("AVIF", ".avif", "image/avif", "avif"),
+}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.avif')
+
+def mime_type_for(filename: str) -> str:
+    """نوع MIME من امتداد الملف (mimetypes لا يعرف avif في كل الإصدارات)"""
+    extension = os.path.splitext(filename)[1].lower()
+    for _, format_extension, mime_type, _ in OUTPUT_FORMATS.values():
+        if extension == format_extension:
+            return mime_type
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+def is_supported(image_format: str) -> bool:
+    """هل يدعم Pillow المثبت ترميز هذه الصيغة"""
+    image_format = image_format.lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    spec = OUTPUT_FORMATS.get(image_format)
+    if spec is None:
+        return False
+    return spec[3] is None or bool(features.check(spec[3]))
+
+def available_format(image_format: str, fallback: str = "png") -> str:
+    """
+    الصيغة نفسها إن كان Pillow المثبت يرمّزها، وإلا البديل مع تحذير
+
+    AVIF يحتاج Pillow مبنياً مع libavif، فلا يتوقف تشغيل التطبيق بسبب الإعدادات.
+    """
+    # الصيغ غير المعروفة تمر كما هي ليرفضها OutputEncoder برسالته المعتادة
+    if image_format.lower() not in (*OUTPUT_FORMATS, "jpg") or is_supported(image_format):
+        return image_format
+    logger.warning(f"ترميز {image_format} غير متوفر في Pillow المثبت، سيتم استخدام {fallback}")
+    return fallback
+
+class OutputEncoder:
+    """
+    صيغة ملف الإخراج ومعاملات الترميز
+
+    effort من 0 إلى 9 موحد لكل الصيغ: compress_level في PNG و method في WebP
+    و speed (بالعكس) في AVIF و optimize في JPEG. الجهد الأعلى ملف أصغر ووقت معالج أكثر.
+    """
+    def __init__(
+        self,
+        image_format: str = "png",
+        quality: int = 90,
+        lossless: bool = False,
+        effort: int = 6,
+        progressive: bool = True
+    ):
+        image_format = image_format.lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in OUTPUT_FORMATS:
+            raise ValueError(f"صيغة الإخراج غير مدعومة: {image_format}")
+        if not is_supported(image_format):
+            raise ValueError(f"ترميز {image_format} غير متوفر في Pillow المثبت")
+        if not 1 <= quality <= 100:
+            raise ValueError("جودة الترميز يجب أن تكون بين 1 و 100")
+        if not 0 <= effort <= 9:
+            raise ValueError("جهد الترميز يجب أن يكون بين 0 و 9")
+
+        self.image_format = image_format
+        self.quality = quality
+        self.lossless = lossless
+        self.effort = effort
+        self.progressive = progressive
+
+    @classmethod
+    def from_config(cls, config) -> "OutputEncoder":
+        """إنشاء المرمّز من إعدادات التطبيق"""
+        return cls(
+            image_format=available_format(config.output_format),
+            quality=config.output_quality,
+            lossless=config.output_lossless,
+            effort=config.output_effort,
+            progressive=config.jpeg_progressive
+        )
+
+    def with_overrides(
+        self,
+        image_format: Optional[str] = None,
+        quality: Optional[int] = None,
+        lossless: Optional[bool] = None,
+        effort: Optional[int] = None
+    ) -> "OutputEncoder":
+        """نسخة بمعاملات الطلب، والقيم غير المحددة من الإعدادات"""
+        return OutputEncoder(
+            image_format=image_format if image_format is not None else self.image_format,
+            quality=quality if quality is not None else self.quality,
+            lossless=lossless if lossless is not None else self.lossless,
+            effort=effort if effort is not None else self.effort,
+            progressive=self.progressive
+        )
+
+    @property
+    def pil_format(self) -> str:
+        return OUTPUT_FORMATS[self.image_format][0]
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS[self.image_format][1]
+
+    @property
+    def mime_type(self) -> str:
+        return OUTPUT_FORMATS[self.image_format][2]
+
+    def save_params(self) -> Dict[str, Any]:
+        """معاملات Image.save للصيغة المحددة"""
+        if self.image_format == "png":
+            return {"compress_level": self.effort}
+        if self.image_format == "jpeg":
+            return {"quality": self.quality, "optimize": self.effort > 0, "progressive": self.progressive}
+        if self.image_format == "webp":
+            return {"quality": self.quality, "lossless": self.lossless, "method": round(self.effort * 6 / 9)}
+        return {"quality": self.quality, "speed": 10 - self.effort}
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        """JPEG لا يدعم الشفافية، فيتم التحويل إلى RGB عند الحاجة"""
+        if self.image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            return image.convert("RGB")
+        return image
+
+    def describe(self) -> Dict[str, Any]:
+        """وصف المعاملات لمفاتيح الدمج والإحصائيات"""
+        return {
+            "format": self.image_format,
+            "quality": self.quality,
+            "lossless": self.lossless,
+            "effort": self.effort,
+            "progressive": self.progressive
+        }
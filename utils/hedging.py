@@ -0,0 +1,143 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Awaitable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class HedgePolicy:
+    """
+    إرسال محاولة ثانية (تحوط) عندما تتأخر الأولى عن نسبة مئوية من زمن الاستجابة
+
+    أول نتيجة صالحة تفوز ويتم إلغاء الأخرى، ونسبة التحوط محدودة بـ max_ratio
+    حتى لا يتضاعف الحمل على خدمة التوليد وقت البطء العام.
+    """
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.95,
+        max_ratio: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self._latencies: Dict[str, deque] = {}
+        self._window = window
+        self.stats = {
+            "requests": 0,
+            "hedges_fired": 0,
+            "hedges_won": 0,
+            "hedges_capped": 0
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "HedgePolicy":
+        """إنشاء سياسة التحوط من إعدادات التطبيق"""
+        return cls(
+            enabled=config.enable_hedging,
+            percentile=config.hedge_percentile,
+            max_ratio=config.hedge_max_ratio,
+            min_samples=config.hedge_min_samples
+        )
+
+    def record_latency(self, key: str, latency: float):
+        """تسجيل زمن محاولة ناجحة"""
+        samples = self._latencies.get(key)
+        if samples is None:
+            samples = deque(maxlen=self._window)
+            self._latencies[key] = samples
+        samples.append(latency)
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """مدة الانتظار قبل التحوط، أو None عند عدم توفر عينات كافية"""
+        samples = self._latencies.get(key)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return ordered[index]
+
+    def _can_hedge(self) -> bool:
+        return (self.stats["hedges_fired"] + 1) <= self.max_ratio * self.stats["requests"]
+
+    async def run(
+        self,
+        key: str,
+        primary: Callable[[], Awaitable[Optional[T]]],
+        hedge: Callable[[], Awaitable[Optional[T]]],
+        on_hedge: Optional[Callable[[], None]] = None
+    ) -> Optional[T]:
+        """
+        تنفيذ المحاولة الأولى مع تحوط عند تأخرها؛ أول نتيجة غير None تفوز
+        """
+        self.stats["requests"] += 1
+        started_at = time.monotonic()
+        delay = self.hedge_delay(key)
+
+        first = asyncio.ensure_future(primary())
+        tasks = {first: "primary"}
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done:
+                    if self._can_hedge():
+                        self.stats["hedges_fired"] += 1
+                        logger.info(f"إرسال طلب تحوط بعد {delay:.1f} ثانية: {key}")
+                        if on_hedge is not None:
+                            on_hedge()
+                        tasks[asyncio.ensure_future(hedge())] = "hedge"
+                    else:
+                        self.stats["hedges_capped"] += 1
+
+            pending = set(tasks)
+            errors = []
+            empty = False
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    result = task.result()
+                    if result is None:
+                        empty = True
+                        continue
+
+                    if tasks[task] == "hedge":
+                        self.stats["hedges_won"] += 1
+                    self.record_latency(key, time.monotonic() - started_at)
+                    return result
+
+            if errors and not empty:
+                raise errors[0]
+            return None
+
+        finally:
+            # إلغاء المحاولة الخاسرة وانتظار تحرير مواردها
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        عدد مرات التحوط والفوز
+        """
+        fired = self.stats["hedges_fired"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hedge_rate": round(fired / self.stats["requests"], 4) if self.stats["requests"] else 0.0,
+            "hedge_win_rate": round(self.stats["hedges_won"] / fired, 4) if fired else 0.0,
+            "hedge_delay_seconds": {
+                key: round(self.hedge_delay(key), 3) for key in self._latencies if self.hedge_delay(key) is not None
+            }
+        }
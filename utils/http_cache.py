@@ -0,0 +1,159 @@
+import os
+import re
+import hashlib
+import logging
+from typing import Optional, Callable, Iterator, Tuple, Mapping
+
+from starlette.responses import Response, FileResponse, StreamingResponse
+from starlette.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.types import Scope
+
+from utils.encoders import IMAGE_EXTENSIONS, mime_type_for
+
+logger = logging.getLogger(__name__)
+
+# أسماء الملفات فريدة ولا يتغير محتواها بعد الحفظ، فيمكن تخزينها مؤقتاً بلا إعادة تحقق
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+class RangeNotSatisfiable(Exception):
+    """نطاق البايتات المطلوب خارج حجم الملف"""
+
+def strong_etag(content_hash: str) -> str:
+    """ETag قوي من hash المحتوى المخزن"""
+    return f'"{content_hash}"'
+
+def stat_etag(stat_result: os.stat_result) -> str:
+    """ETag من وقت التعديل والحجم للملفات التي لا يوجد لها hash مخزن"""
+    base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return f'"{hashlib.md5(base.encode()).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """مقارنة If-None-Match مع ETag (مقارنة ضعيفة كما في RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+def parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    نطاق بايتات واحد (start, end) شامل، أو None لإرجاع الملف كاملاً
+
+    النطاقات المتعددة تُعامل كطلب كامل، وهو سلوك مسموح في HTTP.
+    """
+    if not range_header:
+        return None
+    match = _RANGE_PATTERN.fullmatch(range_header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # آخر N بايت
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, file_size - length), file_size - 1
+
+    start = int(first)
+    end = min(int(last), file_size - 1) if last else file_size - 1
+    if start >= file_size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+def _iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    """قراءة جزء من الملف على دفعات (تعمل في threadpool عبر StreamingResponse)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def cached_file_response(
+    path: str,
+    request_headers: Mapping[str, str],
+    etag: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL
+) -> Response:
+    """
+    استجابة ملف مع ETag و Cache-Control ودعم If-None-Match (304) و Range (206)
+    """
+    stat_result = stat_result or os.stat(path)
+    etag = etag or stat_etag(stat_result)
+    media_type = mime_type_for(path)
+    headers = {
+        "etag": etag,
+        "cache-control": cache_control,
+        "accept-ranges": "bytes"
+    }
+
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range: النطاق صالح فقط إذا لم يتغير الملف منذ النسخة التي لدى العميل
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, stat_result.st_size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat_result.st_size}"})
+
+    if byte_range is None:
+        return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
+
+    start, end = byte_range
+    headers.update({
+        "content-range": f"bytes {start}-{end}/{stat_result.st_size}",
+        "content-length": str(end - start + 1)
+    })
+    return StreamingResponse(_iter_file(path, start, end), status_code=206, headers=headers, media_type=media_type)
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles مع ETag من hash المحتوى المخزن وترويسات immutable ودعم Range
+
+    تُقدَّم ملفات الصور فقط؛ ملفات مثل metadata.jsonl تتغير وليست للنشر فتُرجع 404.
+    """
+    def __init__(self, *args, etag_lookup: Optional[Callable[[str], Optional[str]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.etag_lookup = etag_lookup
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200
+    ) -> Response:
+        # صفحات 404 (html=True) تبقى بالسلوك الافتراضي
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        if not str(full_path).lower().endswith(IMAGE_EXTENSIONS):
+            raise HTTPException(status_code=404)
+
+        etag = None
+        relative_path = os.path.relpath(full_path, self.directory)
+        if self.etag_lookup is not None and os.sep not in relative_path:
+            content_hash = self.etag_lookup(relative_path)
+            if content_hash:
+                etag = strong_etag(content_hash)
+
+        return cached_file_response(str(full_path), Headers(scope=scope), etag=etag, stat_result=stat_result)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class HTTPClientPool:
+    """
+    جلسة HTTP مشتركة طويلة العمر مع إعادة استخدام الاتصالات
+    """
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: int = 30,
+        dns_cache_ttl: int = 300
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: set = set()
+
+        # إحصائيات التجميع
+        self.stats = {
+            "requests": 0,
+            "in_flight": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "sessions_created": 0
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "HTTPClientPool":
+        """إنشاء المجمع من إعدادات التطبيق"""
+        return cls(
+            limit=config.http_pool_limit,
+            limit_per_host=config.http_pool_limit_per_host,
+            keepalive_timeout=config.http_keepalive_seconds,
+            dns_cache_ttl=config.http_dns_cache_ttl
+        )
+
+    async def start(self):
+        """إنشاء الجلسة عند بدء التطبيق"""
+        self.get_session()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        الحصول على الجلسة المشتركة (يتم إنشاؤها عند أول استخدام)
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._release_session()
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[self._build_trace_config()]
+            )
+            self._loop = loop
+            self.stats["sessions_created"] += 1
+            logger.info(
+                f"تم إنشاء جلسة HTTP مشتركة (limit={self.limit}, limit_per_host={self.limit_per_host})"
+            )
+
+        return self._session
+
+    def _release_session(self):
+        """
+        التخلص من جلسة مرتبطة بحلقة أحداث سابقة قبل إنشاء جلسة جديدة
+
+        لا يمكن انتظار close() من حلقة أخرى: إن كانت الحلقة القديمة تعمل يُجدول الإغلاق
+        عليها، وإلا تُفصل الجلسة ويُغلق موصلها في مهمة على الحلقة الحالية.
+        """
+        session, old_loop = self._session, self._loop
+        self._session = None
+        self._loop = None
+        if session is None or session.closed:
+            return
+
+        if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), old_loop)
+            return
+
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            self._closing.add(asyncio.get_running_loop().create_task(self._close_connector(connector)))
+
+    async def _close_connector(self, connector: aiohttp.BaseConnector):
+        """إغلاق موصل جلسة مفصولة دون أن يوقف فشله الجلسة الجديدة"""
+        try:
+            await connector.close()
+        except Exception as e:
+            # اتصالات حلقة أحداث مغلقة لا يمكن إغلاقها بشكل نظيف
+            logger.debug(f"تعذر إغلاق اتصالات الجلسة السابقة: {str(e)}")
+        finally:
+            self._closing.discard(asyncio.current_task())
+
+    async def close(self):
+        """إغلاق الجلسة عند إيقاف التطبيق"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("تم إغلاق جلسة HTTP المشتركة")
+        self._session = None
+        self._loop = None
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        """
+        تتبع أحداث الاتصال لحساب إحصائيات التجميع
+        """
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+
+        async def on_request_done(session, ctx, params):
+            self.stats["in_flight"] -= 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats["connections_reused"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.stats["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.stats["dns_cache_misses"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_done)
+        trace_config.on_request_exception.append(on_request_done)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+
+        return trace_config
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات مجمع الاتصالات
+        """
+        acquired = self.stats["connections_created"] + self.stats["connections_reused"]
+
+        return {
+            **self.stats,
+            "session_open": self._session is not None and not self._session.closed,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "reuse_ratio": round(self.stats["connections_reused"] / acquired, 3) if acquired > 0 else 0
+        }
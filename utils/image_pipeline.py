@@ -0,0 +1,70 @@
+import io
+import hashlib
+import logging
+from typing import Optional, Tuple, Dict, Any
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+class ImagePipeline:
+    """
+    حامل الصورة الواحدة عبر مراحل التحقق والعلامة المائية والترميز
+
+    يتم فك ترميز البكسلات مرة واحدة فقط، ويُحسب الـ hash من المخزن المرمّز في الذاكرة
+    """
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.image: Optional[Image.Image] = None
+        self.size: Optional[Tuple[int, int]] = None
+        self.source_format: Optional[str] = None
+        self.encoded: Optional[bytes] = None
+        self.output_format: Optional[str] = None
+        self.file_hash: Optional[str] = None
+        self.model: Optional[str] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        عند النقل إلى مجمع العمليات تُرسل البيانات الخام فقط بدلاً من البكسلات
+        """
+        state = self.__dict__.copy()
+        state["image"] = None
+        return state
+
+    def probe(self) -> Tuple[Tuple[int, int], Optional[str]]:
+        """
+        قراءة الترويسة فقط (الأبعاد والتنسيق) دون فك ترميز البكسلات
+        """
+        if self.image is None:
+            self.image = Image.open(io.BytesIO(self.raw))
+            self.size = self.image.size
+            self.source_format = self.image.format
+        return self.size, self.source_format
+
+    def decode(self) -> Image.Image:
+        """
+        فك ترميز البكسلات (مرة واحدة)
+        """
+        self.probe()
+        self.image.load()
+        return self.image
+
+    def encode(self, image_format: str = 'PNG', **params) -> bytes:
+        """
+        ترميز الصورة في مخزن بالذاكرة وحساب الـ hash منه
+        """
+        image = self.decode()
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **params)
+
+        self.encoded = buffer.getvalue()
+        self.output_format = image_format
+        self.size = image.size
+        self.file_hash = hashlib.md5(self.encoded).hexdigest()
+        return self.encoded
+
+    def release(self):
+        """
+        تحرير البكسلات والبيانات الكبيرة بعد الكتابة على القرص
+        """
+        self.image = None
+        self.encoded = None
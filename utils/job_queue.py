@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """
+    امتلاء طابور المهام
+    """
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"طابور المهام ممتلئ، أعد المحاولة بعد {retry_after} ثانية")
+
+class Job:
+    """
+    مهمة توليد غير متزامنة
+    """
+    def __init__(self, payload: Any, priority: int = 0):
+        self.id = str(uuid.uuid4())
+        self.payload = payload
+        self.priority = priority
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+
+    @property
+    def finished(self) -> bool:
+        """هل انتهت المهمة (بنجاح أو فشل)"""
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تمثيل المهمة للاستجابة"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "error_status": self.error_status
+        }
+
+class JobQueue:
+    """
+    طابور أولويات محدود مع مجموعة عمال داخل العملية
+    """
+    def __init__(
+        self,
+        handler: Callable[[Job], Awaitable[Dict[str, Any]]],
+        workers: int = 2,
+        max_queue: int = 100,
+        result_ttl: int = 3600
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+
+        self.jobs: Dict[str, Job] = {}
+        # المهام المنتهية بترتيب انتهائها، فالحذف يفحص الأقدم فقط
+        self._finished: deque = deque()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sequence = itertools.count()
+        self._running = 0
+        self._avg_duration = 30.0
+
+        # مستمعون لتغير حالة المهام: listener(job, event, data)
+        self.listeners: List[Callable[[Job, str, Dict[str, Any]], None]] = []
+
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0
+        }
+
+    async def start(self):
+        """تشغيل العمال عند بدء التطبيق"""
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        """إنشاء الطابور والعمال على حلقة الأحداث الحالية"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"تم تشغيل {self.workers} عامل لطابور المهام")
+
+    async def stop(self):
+        """إيقاف العمال عند إيقاف التطبيق"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def estimate_wait(self) -> int:
+        """تقدير زمن الانتظار بالثواني للمهمة التالية"""
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return max(1, int((depth + self._running) * self._avg_duration / self.workers))
+
+    def submit(self, payload: Any, priority: int = 0) -> Job:
+        """
+        إضافة مهمة للطابور (الأولوية الأعلى تُنفذ أولاً)
+        """
+        self._ensure_workers()
+        self._evict_expired()
+
+        if self._queue.full():
+            self.stats["rejected"] += 1
+            raise QueueFull(self.estimate_wait())
+
+        job = Job(payload, priority)
+        self.jobs[job.id] = job
+        self._queue.put_nowait((-priority, next(self._sequence), job.id))
+        self.stats["submitted"] += 1
+        self._notify(job, "queued", {"queue_position": self._queue.qsize()})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """الحصول على مهمة بالمعرف"""
+        return self.jobs.get(job_id)
+
+    def _notify(self, job: Job, event: str, data: Dict[str, Any]):
+        """إبلاغ المستمعين بتغير حالة المهمة"""
+        for listener in self.listeners:
+            try:
+                listener(job, event, data)
+            except Exception as e:
+                logger.error(f"خطأ في مستمع طابور المهام: {str(e)}")
+
+    def _evict_expired(self):
+        """حذف نتائج المهام المنتهية الأقدم من مدة الاحتفاظ"""
+        now = time.time()
+        while self._finished:
+            finished_at, job_id = self._finished[0]
+            if now - finished_at < self.result_ttl:
+                break
+            self._finished.popleft()
+            self.jobs.pop(job_id, None)
+
+    async def _worker(self, index: int):
+        """حلقة عامل واحد"""
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None:
+                self._queue.task_done()
+                continue
+
+            job.status = "running"
+            job.started_at = time.time()
+            self._running += 1
+            self._notify(job, "running", {})
+
+            try:
+                job.result = await self.handler(job)
+                job.status = "completed"
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "تم إيقاف الخادم قبل اكتمال المهمة"
+                self._notify(job, job.status, {"result": None, "error": job.error})
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = getattr(e, "detail", None) or str(e)
+                job.error_status = getattr(e, "status_code", None)
+                self.stats["failed"] += 1
+                logger.error(f"فشل تنفيذ المهمة {job.id}: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                self._finished.append((job.finished_at, job.id))
+                self._running -= 1
+                self._queue.task_done()
+
+            # متوسط متحرك لمدة التنفيذ لتقدير Retry-After
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - job.started_at)
+            self._notify(job, job.status, {"result": job.result, "error": job.error})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الطابور
+        """
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "retained_jobs": len(self.jobs),
+            "avg_duration_seconds": round(self._avg_duration, 2)
+        }
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+class ModelHealth:
+    """
+    حالة كل نموذج (warm أو cold أو error) وآخر زمن استجابة معروف
+
+    تُحدَّث من الطلبات الحقيقية ومن فحوصات الإبقاء دافئاً معاً.
+    """
+    def __init__(self):
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, model: str) -> Dict[str, Any]:
+        entry = self._models.get(model)
+        if entry is None:
+            entry = {
+                "state": "unknown",
+                "last_latency_ms": None,
+                "last_seen": None,
+                "last_probe": None,
+                "last_error": None
+            }
+            self._models[model] = entry
+        return entry
+
+    def mark_warm(self, model: str, latency: Optional[float] = None):
+        """النموذج محمّل ويستجيب"""
+        entry = self._entry(model)
+        entry["state"] = "warm"
+        entry["last_seen"] = time.time()
+        entry["last_error"] = None
+        if latency is not None:
+            entry["last_latency_ms"] = round(latency * 1000, 1)
+
+    def mark_cold(self, model: str):
+        """النموذج غير محمّل لدى الخدمة"""
+        entry = self._entry(model)
+        entry["state"] = "cold"
+        entry["last_seen"] = time.time()
+
+    def mark_error(self, model: str, error: str):
+        """تعذر الوصول للنموذج"""
+        entry = self._entry(model)
+        entry["state"] = "error"
+        entry["last_error"] = error
+
+    def mark_probed(self, model: str):
+        """تسجيل وقت آخر فحص"""
+        self._entry(model)["last_probe"] = time.time()
+
+    def state(self, model: str) -> str:
+        """حالة النموذج الحالية"""
+        return self._entry(model)["state"]
+
+    def snapshot(self, models: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """نسخة من حالة النماذج"""
+        names = models if models is not None else list(self._models)
+        return {name: dict(self._entry(name)) for name in names}
+
+class KeepWarmScheduler:
+    """
+    فحص دوري خفيف لمجموعة من النماذج، وإرسال طلب تسخين صغير فقط للنموذج البارد
+    """
+    def __init__(self, generator, models: List[str], interval: float = 300.0):
+        self.generator = generator
+        self.models = [name for name in models if name in generator.models]
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "cycles": 0,
+            "probes": 0,
+            "warmups": 0,
+            "failures": 0
+        }
+
+    @classmethod
+    def from_config(cls, generator, config) -> "KeepWarmScheduler":
+        """إنشاء المجدول من إعدادات التطبيق"""
+        return cls(generator, config.keep_warm_models, config.keep_warm_interval_seconds)
+
+    def start(self):
+        """تشغيل حلقة الفحص في الخلفية"""
+        if self.models and self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"تم تشغيل الإبقاء دافئاً للنماذج: {', '.join(self.models)}")
+
+    async def stop(self):
+        """إيقاف حلقة الفحص"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """دورة واحدة: فحص الحالة لكل النماذج ثم تسخين الباردة منها"""
+        self.stats["cycles"] += 1
+        await asyncio.gather(*(self._keep_warm(name) for name in self.models))
+
+    async def _keep_warm(self, name: str):
+        try:
+            self.stats["probes"] += 1
+            loaded = await self.generator.probe_model(name)
+            if loaded is False:
+                self.stats["warmups"] += 1
+                if not await self.generator.warm_model(name):
+                    self.stats["failures"] += 1
+            elif loaded is None:
+                self.stats["failures"] += 1
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.error(f"خطأ في الإبقاء دافئاً للنموذج {name}: {str(e)}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        حالة النماذج لـ /health
+        """
+        return {
+            "models": self.generator.health.snapshot(list(self.generator.models)),
+            "keep_warm": {
+                **self.stats,
+                "models": self.models,
+                "interval_seconds": self.interval,
+                "running": self._task is not None and not self._task.done()
+            }
+        }
@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class MetadataStore:
+    """
+    سجل بيانات وصفية بالإلحاق فقط (JSONL) مع ضغط دوري
+
+    كل حفظ أو حذف يضيف سطراً واحداً، فلا تزداد تكلفة الكتابة مع حجم المعرض،
+    وانقطاع التشغيل أثناء الكتابة لا يفقد إلا السطر الأخير غير المكتمل.
+    """
+    def __init__(
+        self,
+        output_dir: str,
+        log_name: str = "metadata.jsonl",
+        legacy_name: str = "metadata.json",
+        compact_ratio: float = 2.0,
+        min_compact_records: int = 1000,
+        fsync: bool = False
+    ):
+        self.log_path = os.path.join(output_dir, log_name)
+        self.legacy_path = os.path.join(output_dir, legacy_name)
+        self.compact_ratio = compact_ratio
+        self.min_compact_records = min_compact_records
+        self.fsync = fsync
+
+        self._file = None
+        self._log_records = 0
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        إعادة بناء البيانات من السجل، أو استيراد metadata.json عند أول تشغيل
+        """
+        entries: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(self.log_path):
+            self._repair_tail()
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"تم تجاهل سطر تالف في سجل البيانات الوصفية: {line_number}")
+                        continue
+
+                    self._log_records += 1
+                    if record.get("op") == "put":
+                        entries[record["id"]] = record["data"]
+                    elif record.get("op") == "del":
+                        entries.pop(record["id"], None)
+
+        elif os.path.exists(self.legacy_path):
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            self.compact(entries)
+            logger.info(f"تم استيراد {len(entries)} سجل من {self.legacy_path}")
+
+        return entries
+
+    def _repair_tail(self):
+        """قص السطر الأخير غير المكتمل بعد انقطاع مفاجئ"""
+        with open(self.log_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+
+            # البحث عن آخر سطر مكتمل
+            position = size - 1
+            while position > 0:
+                chunk_start = max(0, position - 4096)
+                f.seek(chunk_start)
+                chunk = f.read(position - chunk_start)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    f.truncate(chunk_start + newline + 1)
+                    break
+                position = chunk_start
+            else:
+                f.truncate(0)
+
+            logger.warning("تم قص سطر غير مكتمل من سجل البيانات الوصفية")
+
+    def _append(self, record: Dict[str, Any]):
+        """إلحاق سجل واحد بنهاية الملف"""
+        if self._file is None:
+            self._file = open(self.log_path, 'a', encoding='utf-8')
+
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._log_records += 1
+
+    def put(self, image_id: str, data: Dict[str, Any]):
+        """حفظ أو تحديث بيانات صورة"""
+        self._append({"op": "put", "id": image_id, "data": data})
+
+    def delete(self, image_id: str):
+        """حذف بيانات صورة"""
+        self._append({"op": "del", "id": image_id})
+
+    def compact(self, entries: Dict[str, Dict[str, Any]]):
+        """
+        إعادة كتابة السجل بالسجلات الحية فقط (ملف مؤقت ثم استبدال ذري)
+        """
+        self.close()
+
+        temp_path = f"{self.log_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for image_id, data in entries.items():
+                f.write(json.dumps({"op": "put", "id": image_id, "data": data}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.log_path)
+
+        self._log_records = len(entries)
+
+    def maybe_compact(self, entries: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        الضغط عندما تتجاوز السجلات المحذوفة أو المكررة الحد المسموح
+        """
+        threshold = max(self.min_compact_records, int(len(entries) * self.compact_ratio))
+        if self._log_records > threshold:
+            self.compact(entries)
+            logger.info(f"تم ضغط سجل البيانات الوصفية إلى {len(entries)} سجل")
+            return True
+        return False
+
+    def close(self):
+        """إغلاق ملف السجل"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات السجل"""
+        return {
+            "log_path": self.log_path,
+            "log_records": self._log_records,
+            "log_size_bytes": os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# دالة إبلاغ التقدم: progress(event, **data)
+ProgressCallback = Callable[..., None]
+
+TERMINAL_EVENTS = ("completed", "failed")
+
+def report(progress: Optional[ProgressCallback], event: str, **data):
+    """
+    إبلاغ حدث تقدم إن وُجد مستمع، دون أن يؤثر خطأ المستمع على التوليد
+    """
+    if progress is None:
+        return
+    try:
+        progress(event, **data)
+    except Exception as e:
+        logger.error(f"خطأ في إبلاغ التقدم: {str(e)}")
+
+class ProgressBroker:
+    """
+    ناشر أحداث دورة حياة التوليد للمشتركين عبر SSE أو WebSocket
+    """
+    def __init__(self, max_channels: int = 1000, history_limit: int = 50):
+        self.max_channels = max_channels
+        self.history_limit = history_limit
+        self._channels: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _channel(self, channel_id: str) -> Dict[str, Any]:
+        """الحصول على قناة أو إنشاؤها مع إخراج الأقدم عند تجاوز الحد"""
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = {"history": [], "subscribers": set()}
+            self._channels[channel_id] = channel
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        return channel
+
+    def has_channel(self, channel_id: str) -> bool:
+        """هل توجد قناة بهذا المعرف"""
+        return channel_id in self._channels
+
+    def publish(self, channel_id: str, event: str, **data):
+        """
+        نشر حدث لجميع المشتركين مع حفظه في سجل القناة للمشتركين المتأخرين
+        """
+        message = {"event": event, "timestamp": time.time(), **data}
+        channel = self._channel(channel_id)
+
+        channel["history"].append(message)
+        if len(channel["history"]) > self.history_limit:
+            del channel["history"][0]
+
+        for queue in list(channel["subscribers"]):
+            queue.put_nowait(message)
+
+    def reporter(self, channel_id: str) -> ProgressCallback:
+        """دالة إبلاغ مرتبطة بقناة واحدة"""
+        return lambda event, **data: self.publish(channel_id, event, **data)
+
+    async def stream(self, channel_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        بث أحداث القناة (يبدأ بالسجل السابق) حتى حدث نهائي؛ None تعني نبضة إبقاء الاتصال
+        """
+        channel = self._channel(channel_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        for message in channel["history"]:
+            queue.put_nowait(message)
+        channel["subscribers"].add(queue)
+
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+                yield message
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            channel["subscribers"].discard(queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات القنوات والمشتركين"""
+        return {
+            "channels": len(self._channels),
+            "subscribers": sum(len(channel["subscribers"]) for channel in self._channels.values())
+        }
@@ -0,0 +1,231 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    كاش نتائج التوليد بمستويين: ذاكرة (LRU محدودة) وقرص (محدود بالحجم، الأقدم استخداماً يُحذف أولاً)
+
+    البيانات المخزنة هي رد الخدمة الخام بلا علامة مائية، فيجب أن يكون مجلد القرص
+    خارج مجلد الإخراج المنشور.
+    """
+    def __init__(
+        self,
+        cache_dir: str,
+        max_entries: int = 128,
+        max_memory_mb: int = 256,
+        enable_disk: bool = True,
+        max_disk_mb: int = 1024
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.enable_disk = enable_disk
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        
+        # حجم مستوى القرص يُحسب عند أول كتابة ثم يُحدّث تدريجياً
+        self._disk_bytes: Optional[int] = None
+        # الكتابة على القرص قد تجري في خيوط متعددة عبر asyncio.to_thread
+        self._disk_lock = threading.Lock()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0
+        }
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        negative_prompt: str,
+        width: int,
+        height: int,
+        num_inference_steps: int,
+        guidance_scale: float,
+        seed: int
+    ) -> str:
+        """
+        إنشاء مفتاح ثابت من معاملات التوليد
+        """
+        params = {
+            "model": model,
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "width": int(width),
+            "height": int(height),
+            "num_inference_steps": int(num_inference_steps),
+            "guidance_scale": float(guidance_scale),
+            "seed": int(seed)
+        }
+        encoded = json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        """مسار الملف المقابل للمفتاح على القرص"""
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        البحث عن نتيجة محفوظة (الذاكرة أولاً ثم القرص)
+        """
+        data = self._lookup_memory(key)
+        if data is not None:
+            return data
+        return self._record_disk_lookup(key, self._read_disk(key) if self.enable_disk else None)
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        """
+        مثل get لكن قراءة القرص تجري في خيط منفصل حتى لا تحجب حلقة الأحداث
+        """
+        data = self._lookup_memory(key)
+        if data is not None:
+            return data
+        disk_data = await asyncio.to_thread(self._read_disk, key) if self.enable_disk else None
+        return self._record_disk_lookup(key, disk_data)
+
+    def put(self, key: str, data: bytes):
+        """
+        حفظ نتيجة في الذاكرة وعلى القرص
+        """
+        self._remember(key, data)
+        self.stats["stores"] += 1
+        if self.enable_disk:
+            self._write_disk(key, data)
+
+    async def put_async(self, key: str, data: bytes):
+        """
+        مثل put لكن الكتابة على القرص تجري في خيط منفصل
+        """
+        self._remember(key, data)
+        self.stats["stores"] += 1
+        if self.enable_disk:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def _lookup_memory(self, key: str) -> Optional[bytes]:
+        """البحث في مستوى الذاكرة"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+        return data
+
+    def _record_disk_lookup(self, key: str, data: Optional[bytes]) -> Optional[bytes]:
+        """تسجيل نتيجة البحث في القرص ورفع الموجود إلى الذاكرة"""
+        if data is None:
+            self.stats["misses"] += 1
+            return None
+        self._remember(key, data)
+        self.stats["disk_hits"] += 1
+        return data
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        """قراءة ملف الكاش من القرص (عملية حاجبة)"""
+        try:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # تحديث وقت الاستخدام حتى يُحذف الأقل استخداماً أولاً
+                os.utime(path)
+                return data
+        except Exception as e:
+            logger.error(f"خطأ في قراءة الكاش من القرص: {str(e)}")
+        return None
+
+    def _write_disk(self, key: str, data: bytes):
+        """كتابة ملف الكاش على القرص وتطبيق حد الحجم (عملية حاجبة)"""
+        try:
+            with self._disk_lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._disk_path(key)
+                previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+                temp_path = f"{path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+                
+                if self._disk_bytes is None:
+                    self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+                else:
+                    self._disk_bytes += len(data) - previous_size
+                self._enforce_disk_limit()
+        except Exception as e:
+            logger.error(f"خطأ في كتابة الكاش على القرص: {str(e)}")
+
+    def _scan_disk(self):
+        """ملفات الكاش على القرص: (وقت آخر استخدام، الحجم، المسار)"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _enforce_disk_limit(self):
+        """حذف الملفات الأقدم استخداماً حتى يعود الحجم تحت الحد"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        for _, size, path in sorted(self._scan_disk()):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+                self.stats["disk_evictions"] += 1
+            except OSError as e:
+                logger.warning(f"تعذر حذف ملف الكاش {path}: {str(e)}")
+
+    def _remember(self, key: str, data: bytes):
+        """إضافة إلى مستوى الذاكرة مع إخراج الأقدم عند تجاوز الحدود"""
+        if len(data) > self.max_memory_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """تفريغ مستوى الذاكرة"""
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الكاش مع نسب الإصابة والإخفاق
+        """
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+
+        return {
+            **self.stats,
+            "hits": hits,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 3) if lookups > 0 else 0,
+            "miss_rate": round(self.stats["misses"] / lookups, 3) if lookups > 0 else 0,
+            "memory_entries": len(self._memory),
+            "memory_size_mb": round(self._memory_bytes / (1024 * 1024), 2),
+            "disk_size_mb": round(self._disk_bytes / (1024 * 1024), 2) if self._disk_bytes is not None else None
+        }
@@ -0,0 +1,95 @@
+import json
+import random
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class UpstreamRejected(Exception):
+    """
+    رفض نهائي من خدمة التوليد (4xx غير 429): الطلب نفسه غير صالح، فلا تفيد إعادته
+    لا على النموذج نفسه ولا على البدائل
+    """
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(f"رفضت خدمة التوليد الطلب ({status_code}): {detail}")
+
+class RetryPolicy:
+    """
+    حساب مدة الانتظار بين المحاولات من تلميحات الخدمة (estimated_time و Retry-After)
+
+    عند غياب التلميح يُستخدم تراجع أسي محدود، ويضاف تشويش عشوائي حتى لا تعود
+    الطلبات المتزامنة في اللحظة نفسها. انتظار تحميل النموذج لا يستهلك محاولة.
+    """
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 30.0,
+        jitter: float = 0.2,
+        loading_default: float = 20.0,
+        max_loading_waits: int = 5
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.loading_default = loading_default
+        self.max_loading_waits = max_loading_waits
+
+    @classmethod
+    def from_config(cls, config) -> "RetryPolicy":
+        """إنشاء سياسة إعادة المحاولة من إعدادات التطبيق"""
+        return cls(
+            max_attempts=config.retry_max_attempts,
+            base_delay=config.retry_base_delay,
+            max_delay=config.retry_max_delay,
+            jitter=config.retry_jitter,
+            max_loading_waits=config.retry_max_loading_waits
+        )
+
+    @staticmethod
+    def parse_estimated_time(text: str) -> Optional[float]:
+        """قراءة estimated_time من رد JSON إن وُجد"""
+        try:
+            value = json.loads(text).get("estimated_time")
+            return float(value) if value is not None else None
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """قراءة Retry-After بالثواني أو كتاريخ HTTP"""
+        if not value:
+            return None
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def backoff(self, attempt: int) -> float:
+        """تراجع أسي مع تشويش للمحاولة رقم attempt (تبدأ من صفر)"""
+        return self._jittered(min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def retry_delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        """مدة الانتظار قبل إعادة المحاولة؛ التلميح من الخدمة يُحترم ولا يُختصر"""
+        if hint is None:
+            return self.backoff(attempt)
+        return hint * random.uniform(1.0, 1.0 + self.jitter)
+
+    def loading_delay(self, estimated: Optional[float]) -> float:
+        """مدة انتظار تحميل النموذج حسب تقدير الخدمة"""
+        if estimated is None:
+            estimated = self.loading_default
+        return max(1.0, estimated) * random.uniform(1.0, 1.0 + self.jitter)
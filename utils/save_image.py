@@ -1,20 +1,142 @@
 import os
-import io
+import math
+import functools
 import json
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, Union, List
 from PIL import Image, ImageDraw, ImageFont
 import hashlib
 import re
+import base64
+import bisect
+
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.worker_pool import WorkerPool, WorkerPoolFull
+from utils.image_pipeline import ImagePipeline
+from utils.metadata_store import MetadataStore
+from utils.progress import ProgressCallback, report
+from utils.encoders import OutputEncoder, IMAGE_EXTENSIONS
+from utils.thumbnails import ThumbnailCache, render_thumbnail
 
 logger = logging.getLogger(__name__)
 
+WATERMARK_TEXT = "Generated by Prompt2Image"
+WATERMARK_FONT = "arial.ttf"
+WATERMARK_FONT_SIZE = 16
+WATERMARK_MARGIN = 5
+
+@functools.lru_cache(maxsize=8)
+def _load_font(name: str, size: int) -> ImageFont.ImageFont:
+    """تحميل الخط مرة واحدة، مع الرجوع للخط الافتراضي عند عدم توفره"""
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=8)
+def _watermark_tile(font_name: str, font_size: int) -> Image.Image:
+    """
+    رسم العلامة المائية (خلفية شبه شفافة ونص) مرة واحدة لكل خط وحجم
+
+    النص ثابت لا يعتمد على الوصف، فتكلفة العلامة لكل صورة هي دمج هذه البلاطة فقط.
+    """
+    font = _load_font(font_name, font_size)
+    text_width = int(math.ceil(ImageDraw.Draw(Image.new('RGBA', (1, 1))).textlength(WATERMARK_TEXT, font=font)))
+    text_height = 20
+    
+    tile = Image.new('RGBA', (text_width + 10, text_height + 10), (0, 0, 0, 128))
+    ImageDraw.Draw(tile).text((5, 5), WATERMARK_TEXT, font=font, fill=(255, 255, 255, 200))
+    return tile
+
+def _render_image_file(
+    pipeline: ImagePipeline,
+    filepath: str,
+    add_watermark: bool,
+    prompt: str,
+    encoder: Optional[OutputEncoder] = None,
+    thumbnails: Optional[List[Tuple[str, int]]] = None,
+    thumbnail_encoder: Optional[OutputEncoder] = None
+) -> Tuple[Tuple[int, int], str, int]:
+    """
+    فك الترميز وإضافة العلامة المائية والترميز والكتابة على القرص (تعمل داخل مجمع المعالجة)
+    """
+    image = pipeline.decode()
+    
+    if add_watermark:
+        pipeline.image = ImageSaver._add_watermark(image, prompt)
+    
+    # الترميز في الذاكرة بالصيغة المطلوبة ثم كتابة المخزن نفسه على القرص
+    encoder = encoder or OutputEncoder()
+    pipeline.image = encoder.prepare(pipeline.image)
+    encoded = pipeline.encode(encoder.pil_format, **encoder.save_params())
+    with open(filepath, 'wb') as f:
+        f.write(encoded)
+    
+    # النسخ المصغرة من البكسلات نفسها في الذاكرة دون إعادة قراءة الملف
+    for target_path, width in thumbnails or []:
+        if pipeline.image.width > width:
+            render_thumbnail(pipeline.image, target_path, width, thumbnail_encoder)
+    
+    size, file_hash, file_size = pipeline.size, pipeline.file_hash, len(encoded)
+    pipeline.release()
+    
+    return size, file_hash, file_size
+
+def _empty_counters() -> Dict[str, Any]:
+    """عدادات تخزين فارغة"""
+    return {"total_files": 0, "total_bytes": 0, "by_model": {}, "by_day": {}}
+
+def _count_file(counters: Dict[str, Any], model: Optional[str], day: str, file_size: int, sign: int = 1):
+    """إضافة ملف إلى العدادات (أو طرحه عند sign=-1)"""
+    counters["total_files"] += sign
+    counters["total_bytes"] += sign * file_size
+    
+    for group, key in (("by_model", model or "unknown"), ("by_day", day or "unknown")):
+        bucket = counters[group].setdefault(key, {"files": 0, "bytes": 0})
+        bucket["files"] += sign
+        bucket["bytes"] += sign * file_size
+        if bucket["files"] <= 0:
+            del counters[group][key]
+
+def _scan_storage(output_dir: str, tracked: Dict[str, Tuple[Optional[str], str]]) -> Dict[str, Any]:
+    """
+    مسح كامل لمجلد الإخراج لإعادة حساب العدادات (تعمل داخل مجمع المعالجة)
+    """
+    counters = _empty_counters()
+    
+    for entry in os.scandir(output_dir):
+        if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        stat = entry.stat()
+        model, day = tracked.get(entry.name, (None, datetime.fromtimestamp(stat.st_mtime).date().isoformat()))
+        _count_file(counters, model, day, stat.st_size)
+    
+    return counters
+
 class ImageSaver:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(
+        self,
+        output_dir: str = "output",
+        worker_pool: Optional[WorkerPool] = None,
+        encoder: Optional[OutputEncoder] = None,
+        thumbnails: Optional[ThumbnailCache] = None
+    ):
         self.output_dir = output_dir
-        self.metadata_file = os.path.join(output_dir, "metadata.json")
+        
+        # صيغة الإخراج الافتراضية، ويمكن تجاوزها لكل طلب
+        self.encoder = encoder or OutputEncoder()
         self.ensure_output_dir()
+        
+        # سجل البيانات الوصفية بالإلحاق فقط
+        self.metadata_store = MetadataStore(output_dir)
+        self.metadata_file = self.metadata_store.log_path
+        
+        # مجمع المعالجة لأعمال PIL والقرص خارج حلقة الأحداث
+        self.worker_pool = worker_pool or WorkerPool()
+        
+        # النسخ المصغرة للمعرض (اختيارية)
+        self.thumbnails = thumbnails
         self.load_metadata()
     
     def ensure_output_dir(self):
@@ -26,61 +148,163 @@ class ImageSaver:
     def load_metadata(self):
         """تحميل بيانات الصور المحفوظة"""
         try:
-            if os.path.exists(self.metadata_file):
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    self.metadata = json.load(f)
-            else:
-                self.metadata = {}
+            self.metadata = self.metadata_store.load()
         except Exception as e:
             logger.error(f"خطأ في تحميل البيانات الوصفية: {str(e)}")
             self.metadata = {}
+        
+        self._backfill_file_sizes()
+        self._build_indexes()
+        self._build_counters()
+    
+    def _backfill_file_sizes(self):
+        """
+        إضافة حجم الملف للسجلات القديمة مرة واحدة حتى تُبنى العدادات دون مسح المجلد لاحقاً
+        """
+        for image_id, metadata in self.metadata.items():
+            if metadata.get("file_size") is not None:
+                continue
+            filepath = os.path.join(self.output_dir, metadata.get("filename", ""))
+            if os.path.isfile(filepath):
+                metadata["file_size"] = os.path.getsize(filepath)
+                self.metadata_store.put(image_id, metadata)
+    
+    def _build_counters(self):
+        """
+        بناء عدادات التخزين من البيانات الوصفية المحملة
+        """
+        self.storage_counters = _empty_counters()
+        self._pending_changes: Optional[List[Tuple[Optional[str], str, int, int]]] = None
+        for metadata in self.metadata.values():
+            self._count_metadata(metadata, 1)
+    
+    def _count_metadata(self, metadata: Dict[str, Any], sign: int):
+        """تحديث العدادات لصورة واحدة"""
+        change = (
+            metadata.get("model"),
+            (metadata.get("created_at") or "")[:10],
+            metadata.get("file_size") or 0,
+            sign
+        )
+        _count_file(self.storage_counters, *change)
+        # أثناء المسح في الخلفية تُسجل التغييرات لإعادة تطبيقها على نتيجته
+        if self._pending_changes is not None:
+            self._pending_changes.append(change)
+    
+    def _build_indexes(self):
+        """
+        بناء فهارس المعرض المرتبة حسب تاريخ الإنشاء (مرة واحدة عند التحميل)
+        """
+        self._indexes: Dict[str, List[Tuple[str, str]]] = {}
+        self._filename_index: Dict[str, str] = {}
+        
+        for image_id, metadata in self.metadata.items():
+            entry = (metadata.get("created_at", ""), image_id)
+            for key in self._index_keys(metadata):
+                self._indexes.setdefault(key, []).append(entry)
+            self._filename_index[metadata.get("filename", "")] = image_id
+        
+        for entries in self._indexes.values():
+            entries.sort()
+    
+    @staticmethod
+    def _index_keys(metadata: Dict[str, Any]) -> List[str]:
+        """مفاتيح الفهارس التي تنتمي إليها الصورة (الكل، النموذج، الأبعاد)"""
+        keys = [""]
+        if metadata.get("model"):
+            keys.append(f"model:{metadata['model']}")
+        size = metadata.get("size")
+        if isinstance(size, dict) and "width" in size and "height" in size:
+            keys.append(f"size:{size['width']}x{size['height']}")
+        return keys
+    
+    def _index_add(self, image_id: str, metadata: Dict[str, Any]):
+        """إضافة صورة إلى الفهارس"""
+        entry = (metadata.get("created_at", ""), image_id)
+        for key in self._index_keys(metadata):
+            bisect.insort(self._indexes.setdefault(key, []), entry)
+        self._filename_index[metadata.get("filename", "")] = image_id
+    
+    def _index_remove(self, image_id: str, metadata: Dict[str, Any]):
+        """إزالة صورة من الفهارس"""
+        entry = (metadata.get("created_at", ""), image_id)
+        for key in self._index_keys(metadata):
+            entries = self._indexes.get(key)
+            if not entries:
+                continue
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+        if self._filename_index.get(metadata.get("filename", "")) == image_id:
+            del self._filename_index[metadata.get("filename", "")]
     
     def save_metadata(self):
-        """حفظ البيانات الوصفية"""
+        """حفظ جميع البيانات الوصفية (ضغط السجل إلى السجلات الحية)"""
         try:
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+            self.metadata_store.compact(self.metadata)
         except Exception as e:
             logger.error(f"خطأ في حفظ البيانات الوصفية: {str(e)}")
     
+    def close(self):
+        """إغلاق سجل البيانات الوصفية"""
+        self.metadata_store.close()
+    
     async def save_image(
         self, 
-        image_data: bytes, 
+        image_data: Union[bytes, ImagePipeline], 
         prompt: str, 
         image_id: str,
         add_watermark: bool = True,
-        save_metadata: bool = True
+        save_metadata: bool = True,
+        deadline: Optional[Deadline] = None,
+        model: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+        encoder: Optional[OutputEncoder] = None
     ) -> Optional[str]:
         """
         حفظ الصورة مع البيانات الوصفية
         """
         try:
-            # تحويل البيانات إلى صورة
-            image = Image.open(io.BytesIO(image_data))
+            if deadline is not None:
+                deadline.check("save")
+            
+            encoder = encoder or self.encoder
             
-            # إنشاء اسم الملف
-            filename = self._generate_filename(prompt, image_id)
+            # إنشاء اسم الملف بامتداد صيغة الإخراج
+            filename = self._generate_filename(prompt, image_id, encoder.extension)
             filepath = os.path.join(self.output_dir, filename)
             
-            # إضافة العلامة المائية إذا كان مطلوباً
-            if add_watermark:
-                image = self._add_watermark(image, prompt)
+            # استخدام الصورة المفككة مسبقاً إن وُجدت
+            pipeline = image_data if isinstance(image_data, ImagePipeline) else ImagePipeline(image_data)
             
-            # حفظ الصورة
-            image.save(filepath, format='PNG', quality=95)
+            # فك الترميز والعلامة المائية والحفظ والنسخ المصغرة داخل مجمع المعالجة
+            report(progress, "encoding")
+            thumbnails = self.thumbnails.eager_targets(filename) if self.thumbnails else None
+            size, file_hash, file_size = await self.worker_pool.run(
+                _render_image_file, pipeline, filepath, add_watermark, prompt, encoder,
+                thumbnails, self.thumbnails.encoder if self.thumbnails else None
+            )
+            if add_watermark:
+                report(progress, "watermarked")
             
             # حفظ البيانات الوصفية
             if save_metadata:
-                self._save_image_metadata(filename, prompt, image_id, image.size)
+                self._save_image_metadata(
+                    filename, prompt, image_id, size, file_hash,
+                    model=model, file_size=file_size, image_format=encoder.image_format
+                )
             
             logger.info(f"تم حفظ الصورة: {filename}")
+            report(progress, "saved", filename=filename)
             return filename
-            
+        
+        except (DeadlineExceeded, WorkerPoolFull):
+            raise
         except Exception as e:
             logger.error(f"خطأ في حفظ الصورة: {str(e)}")
             return None
     
-    def _generate_filename(self, prompt: str, image_id: str) -> str:
+    def _generate_filename(self, prompt: str, image_id: str, extension: str = ".png") -> str:
         """
         إنشاء اسم ملف فريد ووصفي
         """
@@ -98,7 +322,7 @@ class ImageSaver:
         # إضافة جزء من معرف الصورة
         short_id = image_id[:8]
         
-        filename = f"{timestamp}_{clean_prompt}_{short_id}.png"
+        filename = f"{timestamp}_{clean_prompt}_{short_id}{extension}"
         
         # التأكد من عدم وجود ملف بنفس الاسم
         counter = 1
@@ -110,55 +334,43 @@ class ImageSaver:
         
         return filename
     
-    def _add_watermark(self, image: Image.Image, prompt: str) -> Image.Image:
+    @staticmethod
+    def _add_watermark(image: Image.Image, prompt: str) -> Image.Image:
         """
         إضافة علامة مائية للصورة
         """
         try:
-            # إنشاء نسخة من الصورة
-            watermarked = image.copy()
-            
-            # إنشاء طبقة شفافة للعلامة المائية
-            watermark_layer = Image.new('RGBA', watermarked.size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(watermark_layer)
-            
-            # إعدادات النص
-            try:
-                # محاولة استخدام خط مخصص
-                font = ImageFont.truetype("arial.ttf", 16)
-            except:
-                # استخدام الخط الافتراضي
-                font = ImageFont.load_default()
+            # الصورة مملوكة لمسار المعالجة فلا حاجة لنسخها
+            watermarked = image if image.mode == 'RGB' else image.convert('RGB')
+            tile = _watermark_tile(WATERMARK_FONT, WATERMARK_FONT_SIZE)
             
-            # نص العلامة المائية
-            watermark_text = "Generated by Prompt2Image"
-            prompt_text = prompt[:50] + "..." if len(prompt) > 50 else prompt
+            # موضع العلامة (في الأسفل من اليمين)
+            x = watermarked.width - tile.width - WATERMARK_MARGIN
+            y = watermarked.height - tile.height - WATERMARK_MARGIN
+            box = (x, y, x + tile.width, y + tile.height)
             
-            # حساب موضع النص
-            text_width = draw.textlength(watermark_text, font=font)
-            text_height = 20
+            # دمج العلامة مع منطقة الزاوية فقط ثم إعادتها في المكان نفسه
+            region = watermarked.crop(box).convert('RGBA')
+            region.alpha_composite(tile)
+            watermarked.paste(region.convert('RGB'), box)
             
-            # موضع النص (في الأسفل من اليمين)
-            x = watermarked.width - text_width - 10
-            y = watermarked.height - text_height - 10
-            
-            # رسم خلفية شفافة للنص
-            draw.rectangle([x-5, y-5, x + text_width + 5, y + text_height + 5], 
-                          fill=(0, 0, 0, 128))
-            
-            # رسم النص
-            draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, 200))
-            
-            # دمج طبقة العلامة المائية مع الصورة
-            watermarked = Image.alpha_composite(watermarked.convert('RGBA'), watermark_layer)
-            
-            return watermarked.convert('RGB')
+            return watermarked
             
         except Exception as e:
             logger.error(f"خطأ في إضافة العلامة المائية: {str(e)}")
             return image
     
-    def _save_image_metadata(self, filename: str, prompt: str, image_id: str, size: tuple):
+    def _save_image_metadata(
+        self,
+        filename: str,
+        prompt: str,
+        image_id: str,
+        size: tuple,
+        file_hash: Optional[str] = None,
+        model: Optional[str] = None,
+        file_size: Optional[int] = None,
+        image_format: Optional[str] = None
+    ):
         """
         حفظ البيانات الوصفية للصورة
         """
@@ -167,13 +379,24 @@ class ImageSaver:
                 "filename": filename,
                 "prompt": prompt,
                 "image_id": image_id,
+                "model": model,
                 "size": {"width": size[0], "height": size[1]},
+                "file_size": file_size,
+                "format": image_format,
                 "created_at": datetime.now().isoformat(),
-                "file_hash": self._calculate_file_hash(filename)
+                "file_hash": file_hash if file_hash is not None else self._calculate_file_hash(filename)
             }
             
+            previous = self.metadata.get(image_id)
+            if previous is not None:
+                self._index_remove(image_id, previous)
+                self._count_metadata(previous, -1)
+            
             self.metadata[image_id] = metadata
-            self.save_metadata()
+            self._index_add(image_id, metadata)
+            self._count_metadata(metadata, 1)
+            self.metadata_store.put(image_id, metadata)
+            self.metadata_store.maybe_compact(self.metadata)
             
         except Exception as e:
             logger.error(f"خطأ في حفظ البيانات الوصفية: {str(e)}")
@@ -203,6 +426,99 @@ class ImageSaver:
         """
         return self.metadata
     
+    def find_image_id(self, filename: str) -> Optional[str]:
+        """
+        البحث عن معرف الصورة من اسم الملف
+        """
+        return self._filename_index.get(filename)
+    
+    def get_file_hash(self, filename: str) -> Optional[str]:
+        """
+        hash المحتوى المحسوب عند الحفظ (لـ ETag) دون قراءة الملف
+        """
+        image_id = self._filename_index.get(filename)
+        if image_id is None:
+            return None
+        return self.metadata.get(image_id, {}).get("file_hash")
+    
+    @staticmethod
+    def _encode_cursor(entry: Tuple[str, str]) -> str:
+        """ترميز موضع الصفحة كنص معتم"""
+        return base64.urlsafe_b64encode(json.dumps(list(entry)).encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        """فك ترميز موضع الصفحة"""
+        try:
+            created_at, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return str(created_at), str(image_id)
+        except Exception:
+            raise ValueError("مؤشر الصفحة غير صالح")
+    
+    def get_gallery_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        model: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        صفحة من المعرض (الأحدث أولاً) من الفهرس المرتب دون مسح المجلد
+        """
+        # اختيار أضيق فهرس متاح ثم تطبيق بقية المرشحات أثناء القراءة
+        if model:
+            key = f"model:{model}"
+        elif width and height:
+            key = f"size:{width}x{height}"
+        else:
+            key = ""
+        entries = self._indexes.get(key, [])
+        
+        end = len(entries)
+        if cursor:
+            end = bisect.bisect_left(entries, self._decode_cursor(cursor))
+        
+        images = []
+        position = end - 1
+        last_entry = None
+        while position >= 0 and len(images) < limit:
+            entry = entries[position]
+            position -= 1
+            
+            metadata = self.metadata.get(entry[1])
+            if metadata is None:
+                continue
+            
+            size = metadata.get("size") or {}
+            if width and size.get("width") != width:
+                continue
+            if height and size.get("height") != height:
+                continue
+            
+            images.append({
+                "image_id": entry[1],
+                "filename": metadata["filename"],
+                "url": f"/output/{metadata['filename']}",
+                "thumbnail_url": self.thumbnails.url_for(metadata["filename"]) if self.thumbnails else None,
+                "created_at": metadata.get("created_at"),
+                "size": metadata.get("file_size"),
+                "width": size.get("width"),
+                "height": size.get("height"),
+                "model": metadata.get("model"),
+                "prompt": metadata.get("prompt")
+            })
+            last_entry = entry
+        
+        next_cursor = None
+        if position >= 0 and last_entry is not None:
+            next_cursor = self._encode_cursor(last_entry)
+        
+        return {
+            "images": images,
+            "next_cursor": next_cursor
+        }
+    
     def delete_image(self, image_id: str) -> bool:
         """
         حذف صورة ومعلوماتها
@@ -212,13 +528,17 @@ class ImageSaver:
                 filename = self.metadata[image_id]["filename"]
                 filepath = os.path.join(self.output_dir, filename)
                 
-                # حذف الملف
+                # حذف الملف ونسخه المصغرة
                 if os.path.exists(filepath):
                     os.remove(filepath)
+                if self.thumbnails:
+                    self.thumbnails.delete(filename)
                 
                 # حذف البيانات الوصفية
+                self._index_remove(image_id, self.metadata[image_id])
+                self._count_metadata(self.metadata[image_id], -1)
                 del self.metadata[image_id]
-                self.save_metadata()
+                self.metadata_store.delete(image_id)
                 
                 logger.info(f"تم حذف الصورة: {filename}")
                 return True
@@ -261,25 +581,52 @@ class ImageSaver:
     
     def get_storage_info(self) -> Dict[str, Any]:
         """
-        معلومات عن المساحة المستخدمة
+        معلومات عن المساحة المستخدمة (قراءة مباشرة من العدادات المحدثة تدريجياً)
         """
         try:
-            total_size = 0
-            file_count = 0
-            
-            for filename in os.listdir(self.output_dir):
-                filepath = os.path.join(self.output_dir, filename)
-                if os.path.isfile(filepath) and filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    total_size += os.path.getsize(filepath)
-                    file_count += 1
+            counters = self.storage_counters
+            total_size = counters["total_bytes"]
+            file_count = counters["total_files"]
             
             return {
                 "total_files": file_count,
                 "total_size_bytes": total_size,
                 "total_size_mb": round(total_size / (1024 * 1024), 2),
-                "average_size_mb": round((total_size / file_count) / (1024 * 1024), 2) if file_count > 0 else 0
+                "average_size_mb": round((total_size / file_count) / (1024 * 1024), 2) if file_count > 0 else 0,
+                "by_model": counters["by_model"],
+                "by_day": counters["by_day"]
             }
             
         except Exception as e:
             logger.error(f"خطأ في الحصول على معلومات التخزين: {str(e)}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+    
+    async def reconcile_storage(self) -> Dict[str, Any]:
+        """
+        مسح المجلد في الخلفية لتصحيح أي انحراف في العدادات (ملفات حُذفت أو أضيفت يدوياً)
+        """
+        tracked = {
+            metadata.get("filename", ""): (metadata.get("model"), (metadata.get("created_at") or "")[:10])
+            for metadata in list(self.metadata.values())
+        }
+        before_files = self.storage_counters["total_files"]
+        before_bytes = self.storage_counters["total_bytes"]
+        
+        # الحفظ والحذف المتزامنان مع المسح لا يجب أن يضيعا عند استبدال العدادات
+        self._pending_changes = []
+        try:
+            counters = await self.worker_pool.run(_scan_storage, self.output_dir, tracked)
+            changes = self._pending_changes
+        finally:
+            self._pending_changes = None
+        
+        drift_files = counters["total_files"] - before_files
+        drift_bytes = counters["total_bytes"] - before_bytes
+        if drift_files or drift_bytes:
+            logger.warning(f"تم تصحيح عدادات التخزين: فرق {drift_files} ملف و {drift_bytes} بايت")
+        
+        # بلا await بين إعادة التطبيق والاستبدال، فلا يتداخل تحديث آخر
+        for change in changes:
+            _count_file(counters, *change)
+        self.storage_counters = counters
+        return {"drift_files": drift_files, "drift_bytes": drift_bytes}
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+# نماذج بيانات طلبات التوليد، مشتركة بين الـ API وأداة الدفعات
+class ImageRequest(BaseModel):
+    # الطلبات غير الصالحة تُرفض هنا (422) بدل إرسالها لخدمة التوليد
+    prompt: str = Field(..., min_length=1)
+    negative_prompt: Optional[str] = None
+    width: Optional[int] = Field(512, gt=0)
+    height: Optional[int] = Field(512, gt=0)
+    num_inference_steps: Optional[int] = Field(20, gt=0)
+    guidance_scale: Optional[float] = 7.5
+    seed: Optional[int] = None
+    model: Optional[str] = "stable-diffusion-xl"
+    # صيغة الملف ومعاملات الترميز (القيم غير المحددة من الإعدادات)
+    output_format: Optional[str] = None  # png أو jpeg أو webp أو avif
+    output_quality: Optional[int] = None
+    output_lossless: Optional[bool] = None
+    output_effort: Optional[int] = None
+
+class VariationsRequest(ImageRequest):
+    count: int = 4
+
+class JobRequest(ImageRequest):
+    priority: int = 0  # الأولوية الأعلى تُنفذ أولاً
+
+class ImageResponse(BaseModel):
+    success: bool
+    message: str
+    image_id: Optional[str] = None
+    image_url: Optional[str] = None
+    filename: Optional[str] = None
+    prompt: Optional[str] = None
+    model: Optional[str] = None  # النموذج الذي خدم الطلب فعلياً
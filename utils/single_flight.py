@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Dict, Any, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    دمج الطلبات المتطابقة المتزامنة في استدعاء واحد مشترك
+    """
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "leaders": 0,
+            "coalesced": 0
+        }
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        تنفيذ factory مرة واحدة لكل مفتاح، وانتظار النتيجة نفسها لبقية الطلبات
+        """
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"تم دمج طلب مطابق قيد التنفيذ: {key[:12]}")
+
+        # الحماية من الإلغاء حتى لا يؤدي انقطاع عميل واحد إلى إلغاء العمل المشترك
+        return await asyncio.shield(task)
+
+    def is_in_flight(self, key: str) -> bool:
+        """هل يوجد استدعاء جارٍ لهذا المفتاح"""
+        return key in self._inflight
+
+    def _forget(self, key: str, task: asyncio.Future):
+        """إزالة المهمة المنتهية من قائمة الطلبات الجارية"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # تعليم الاستثناء كمقروء إذا لم يبق أحد ينتظر النتيجة
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات الدمج
+        """
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "upstream_calls_saved": self.stats["coalesced"]
+        }
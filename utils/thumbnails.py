@@ -0,0 +1,178 @@
+import os
+import re
+import glob
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+from PIL import Image
+
+from utils.encoders import OutputEncoder, available_format
+from utils.single_flight import SingleFlight
+from utils.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+def render_thumbnail(image: Image.Image, target_path: str, width: int, encoder: OutputEncoder) -> int:
+    """
+    تصغير الصورة إلى العرض المطلوب مع الحفاظ على النسبة وكتابتها بشكل ذري
+    """
+    height = max(1, round(image.height * width / image.width))
+    thumbnail = encoder.prepare(image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0))
+
+    # الكتابة في ملف مؤقت ثم الاستبدال حتى لا يُقرأ ملف ناقص من القرص
+    temp_path = f"{target_path}.tmp"
+    thumbnail.save(temp_path, format=encoder.pil_format, **encoder.save_params())
+    os.replace(temp_path, target_path)
+    return os.path.getsize(target_path)
+
+def _render_from_file(source_path: str, target_path: str, width: int, encoder: OutputEncoder) -> Tuple[Optional[int], int]:
+    """
+    تصغير من ملف الصورة الأصلي (تعمل داخل مجمع المعالجة)
+
+    تعيد (حجم النسخة أو None إذا لم تكن الصورة أعرض من المطلوب، عرض الأصل).
+    """
+    with Image.open(source_path) as image:
+        original_width = image.width
+        if original_width <= width:
+            return None, original_width
+        # فك ترميز مصغر مباشرة لصيغ مثل JPEG بدلاً من البكسلات الكاملة
+        image.draft('RGB', (width, max(1, round(image.height * width / image.width))))
+        image.load()
+        return render_thumbnail(image, target_path, width, encoder), original_width
+
+class ThumbnailCache:
+    """
+    نسخ مصغرة للصور تُولد مرة واحدة في مجمع المعالجة وتُحفظ بجانب الأصل
+
+    العرض المطلوب يُقرّب لأقرب مقاس مسموح حتى لا تتضخم النسخ بعرض عشوائي لكل طلب.
+    """
+    def __init__(
+        self,
+        output_dir: str = "output",
+        worker_pool: Optional[WorkerPool] = None,
+        sizes: Optional[List[int]] = None,
+        eager_sizes: Optional[List[int]] = None,
+        encoder: Optional[OutputEncoder] = None,
+        max_known_widths: int = 10000
+    ):
+        self.directory = os.path.join(output_dir, "thumbs")
+        os.makedirs(self.directory, exist_ok=True)
+        self.worker_pool = worker_pool or WorkerPool()
+        self.sizes = sorted(sizes or [128, 256, 512])
+        self.eager_sizes = [size for size in (eager_sizes if eager_sizes is not None else [256]) if size in self.sizes]
+        self.encoder = encoder or OutputEncoder(image_format="webp", quality=80, effort=4)
+        self._flight = SingleFlight()
+        # عرض الأصل لكل صورة، حتى لا يُرسل طلب ?w= أعرض منها لمجمع المعالجة في كل مرة
+        self._original_widths: "OrderedDict[str, int]" = OrderedDict()
+        self.max_known_widths = max_known_widths
+        self.stats = {
+            "hits": 0,
+            "generated": 0,
+            "originals": 0,
+            "errors": 0
+        }
+
+    @classmethod
+    def from_config(cls, config, worker_pool: Optional[WorkerPool] = None, output_dir: Optional[str] = None) -> "ThumbnailCache":
+        """إنشاء كاش النسخ المصغرة من إعدادات التطبيق"""
+        return cls(
+            output_dir=output_dir or config.output_dir,
+            worker_pool=worker_pool,
+            sizes=config.thumbnail_sizes,
+            eager_sizes=config.thumbnail_eager_sizes,
+            encoder=OutputEncoder(image_format=available_format(config.thumbnail_format, "png"), quality=config.thumbnail_quality, effort=4)
+        )
+
+    def snap_width(self, width: int) -> int:
+        """أصغر مقاس مسموح لا يقل عن العرض المطلوب (أو أكبر مقاس)"""
+        if width <= 0:
+            raise ValueError("عرض النسخة المصغرة يجب أن يكون موجباً")
+        for size in self.sizes:
+            if size >= width:
+                return size
+        return self.sizes[-1]
+
+    def path_for(self, filename: str, width: int) -> str:
+        """مسار النسخة المصغرة لصورة بعرض محدد"""
+        stem = os.path.splitext(filename)[0]
+        return os.path.join(self.directory, f"{stem}_w{width}{self.encoder.extension}")
+
+    def url_for(self, filename: str, width: Optional[int] = None) -> str:
+        """رابط النسخة المصغرة (الافتراضي أول مقاس يُولد مسبقاً)"""
+        if width is None:
+            width = self.eager_sizes[0] if self.eager_sizes else self.sizes[0]
+        return f"/image/{filename}?w={width}"
+
+    def eager_targets(self, filename: str) -> List[Tuple[str, int]]:
+        """النسخ التي تُولد مع حفظ الصورة: (المسار، العرض)"""
+        return [(self.path_for(filename, size), size) for size in self.eager_sizes]
+
+    async def get(self, source_path: str, filename: str, width: int) -> str:
+        """
+        مسار الملف المناسب للعرض المطلوب: النسخة المصغرة من القرص، أو توليدها مرة واحدة،
+        أو الأصل إذا لم يكن أعرض من المطلوب
+        """
+        width = self.snap_width(width)
+        target_path = self.path_for(filename, width)
+
+        original_width = self._original_widths.get(filename)
+        if original_width is not None and original_width <= width:
+            self._original_widths.move_to_end(filename)
+            self.stats["originals"] += 1
+            return source_path
+
+        if os.path.exists(target_path):
+            self.stats["hits"] += 1
+            return target_path
+
+        try:
+            # الطلبات المتزامنة للنسخة نفسها تشترك في توليد واحد
+            generated, original_width = await self._flight.do(
+                target_path,
+                lambda: self.worker_pool.run(_render_from_file, source_path, target_path, width, self.encoder)
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"خطأ في توليد النسخة المصغرة: {str(e)}")
+            return source_path
+
+        self._remember_width(filename, original_width)
+        if generated is None:
+            self.stats["originals"] += 1
+            return source_path
+
+        self.stats["generated"] += 1
+        return target_path
+
+    def _remember_width(self, filename: str, original_width: int):
+        """حفظ عرض الأصل مع إخراج الأقدم استخداماً عند تجاوز الحد"""
+        self._original_widths[filename] = original_width
+        self._original_widths.move_to_end(filename)
+        while len(self._original_widths) > self.max_known_widths:
+            self._original_widths.popitem(last=False)
+
+    def delete(self, filename: str) -> int:
+        """حذف كل النسخ المصغرة لصورة"""
+        self._original_widths.pop(filename, None)
+        stem = os.path.splitext(filename)[0]
+        pattern = re.compile(rf"{re.escape(stem)}_w\d+\.\w+")
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(stem)}_w*")):
+            if not pattern.fullmatch(os.path.basename(path)):
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"تعذر حذف النسخة المصغرة {path}: {str(e)}")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات النسخ المصغرة"""
+        return {
+            **self.stats,
+            "sizes": self.sizes,
+            "eager_sizes": self.eager_sizes,
+            "known_widths": len(self._original_widths),
+            "format": self.encoder.image_format
+        }
@@ -0,0 +1,130 @@
+import asyncio
+import time
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Dict, Any, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class WorkerPoolFull(Exception):
+    """
+    امتلاء طابور مجمع المعالجة
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        super().__init__(f"مجمع المعالجة ممتلئ ({capacity} مهمة)")
+
+def _timed_call(func: Callable, args: Tuple) -> Tuple[float, float, Any]:
+    """
+    تنفيذ الدالة مع تسجيل وقت البدء والانتهاء (قابلة للتسلسل لمجمع العمليات)
+    """
+    started_at = time.time()
+    result = func(*args)
+    return started_at, time.time(), result
+
+class WorkerPool:
+    """
+    مجمع خيوط أو عمليات لتنفيذ أعمال المعالجة والقرص خارج حلقة الأحداث
+    """
+    def __init__(self, mode: str = "thread", max_workers: int = 4, max_queue: int = 32):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"نوع مجمع غير مدعوم: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.capacity = max_workers + max_queue
+
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "peak_pending": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "WorkerPool":
+        """إنشاء المجمع من إعدادات التطبيق"""
+        return cls(
+            mode=config.worker_pool_mode,
+            max_workers=config.worker_pool_size,
+            max_queue=config.worker_pool_queue
+        )
+
+    def _get_executor(self) -> Executor:
+        """إنشاء المنفذ عند أول استخدام"""
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="image-worker"
+                )
+            logger.info(f"تم إنشاء مجمع المعالجة ({self.mode}, workers={self.max_workers}, queue={self.max_queue})")
+        return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        تنفيذ دالة متزامنة في المجمع، مع الرفض الفوري عند امتلاء الطابور
+        """
+        if self._pending >= self.capacity:
+            self.stats["rejected"] += 1
+            logger.warning(f"تم رفض مهمة: مجمع المعالجة ممتلئ ({self._pending}/{self.capacity})")
+            raise WorkerPoolFull(self.capacity)
+
+        self._pending += 1
+        self.stats["submitted"] += 1
+        self.stats["peak_pending"] = max(self.stats["peak_pending"], self._pending)
+        submitted_at = time.time()
+
+        try:
+            loop = asyncio.get_running_loop()
+            started_at, finished_at, result = await loop.run_in_executor(
+                self._get_executor(), _timed_call, func, args
+            )
+            self.stats["completed"] += 1
+            self.stats["total_wait_ms"] += max(0.0, started_at - submitted_at) * 1000
+            self.stats["total_run_ms"] += (finished_at - started_at) * 1000
+            return result
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        """إيقاف المجمع عند إيقاف التطبيق"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        إحصائيات المجمع ودرجة تشبعه
+        """
+        completed = self.stats["completed"]
+        running = min(self._pending, self.max_workers)
+
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "running": running,
+            "queued": self._pending - running,
+            "saturation": round(self._pending / self.capacity, 3) if self.capacity > 0 else 0,
+            "submitted": self.stats["submitted"],
+            "completed": completed,
+            "failed": self.stats["failed"],
+            "rejected": self.stats["rejected"],
+            "peak_pending": self.stats["peak_pending"],
+            "avg_wait_ms": round(self.stats["total_wait_ms"] / completed, 2) if completed > 0 else 0,
+            "avg_run_ms": round(self.stats["total_run_ms"] / completed, 2) if completed > 0 else 0
+        }